@@ -0,0 +1,58 @@
+"""
+Bootstrap Django for the standalone benchmark scripts.
+
+Every benchmark runs against a throwaway SQLite file so it never touches
+``db.sqlite3``. Run them from the project root, e.g.
+``python -m benchmarks.pricing``.
+"""
+import atexit
+import os
+import shutil
+import tempfile
+
+
+def setup(db_name='benchmark.sqlite3', options=None):
+    """
+    Configure Django against a fresh, migrated SQLite database and return
+    its path. ``options`` is merged into the database ``OPTIONS``. Set
+    ``DB_PROFILE`` in the environment to benchmark another database profile.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecommerce_site.settings')
+    os.environ.setdefault('SECRET_KEY', 'benchmark-only')
+
+    import django
+    from django.conf import settings
+
+    workdir = tempfile.mkdtemp(prefix='ecommerce-bench-')
+    atexit.register(shutil.rmtree, workdir, ignore_errors=True)
+    db_path = os.path.join(workdir, db_name)
+    # Every alias (the production profile adds a replica) points at the same file
+    for database in settings.DATABASES.values():
+        database['NAME'] = db_path
+        database.setdefault('OPTIONS', {}).update(options or {})
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+    return db_path
+
+
+def report(title, rows):
+    """
+    Print a small aligned table of ``(label, value)`` rows.
+    """
+    print(title)
+    width = max(len(label) for label, _ in rows)
+    for label, value in rows:
+        print(f"  {label.ljust(width)}  {value}")
+
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile of ``values`` (``pct`` between 0 and 100).
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
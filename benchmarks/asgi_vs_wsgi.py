@@ -0,0 +1,147 @@
+"""
+Compare the sync views under a threaded WSGI server with the async views
+under ASGI when many slow clients are connected at once.
+
+    python -m benchmarks.asgi_vs_wsgi --clients 200 --threads 16 --client-delay 0.2
+
+Both handlers run in-process with ``--clients`` clients issuing requests
+at once. A slow client is simulated by holding the response for
+``--client-delay`` seconds before the connection is released: under WSGI
+that holds one of the ``--threads`` worker threads, under ASGI it is an
+``await`` that leaves the event loop free for other requests. Latency is
+measured from the moment a client sends its request, so time spent waiting
+for a free WSGI thread counts.
+"""
+import argparse
+import asyncio
+import io
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from benchmarks import _django
+
+
+def seed(products):
+    from cart.models import Product
+
+    Product.objects.bulk_create([
+        Product(name=f'Product {i}', price=Decimal('9.99'), stock=100) for i in range(products)
+    ])
+    return list(Product.objects.values_list('id', flat=True))
+
+
+def paths(product_ids, requests):
+    targets = ['/'] + [f'/cart/products/{product_id}/' for product_id in product_ids[:20]]
+    return [targets[i % len(targets)] for i in range(requests)]
+
+
+def use_urlconf(urlconf):
+    from django.conf import settings
+    from django.urls import clear_url_caches
+
+    settings.ROOT_URLCONF = urlconf
+    clear_url_caches()
+
+
+def run_wsgi(request_paths, clients, threads, client_delay):
+    from django.core.handlers.wsgi import WSGIHandler
+
+    handler = WSGIHandler()
+    workers = threading.Semaphore(threads)
+
+    def request(path):
+        environ = {
+            'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '',
+            'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+            'wsgi.input': io.BytesIO(), 'wsgi.url_scheme': 'http', 'wsgi.errors': io.StringIO(),
+        }
+        start = time.perf_counter()
+        statuses = []
+        with workers:
+            body = b''.join(handler(environ, lambda status, headers: statuses.append(status)))
+            # The worker thread stays busy until the slow client has read the body
+            time.sleep(client_delay)
+        assert statuses[0].startswith('200') and body
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        latencies = list(pool.map(request, request_paths))
+    return latencies, time.perf_counter() - start
+
+
+def run_asgi(request_paths, clients, client_delay):
+    from django.core.handlers.asgi import ASGIHandler
+
+    handler = ASGIHandler()
+
+    async def request(path, connections):
+        async with connections:
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+                'method': 'GET', 'path': path, 'raw_path': path.encode(), 'query_string': b'',
+                'headers': [(b'host', b'testserver')], 'server': ('testserver', 80), 'scheme': 'http',
+            }
+            statuses = []
+            start = time.perf_counter()
+
+            async def receive():
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    statuses.append(message['status'])
+                elif not message.get('more_body'):
+                    await asyncio.sleep(client_delay)
+
+            await handler(scope, receive, send)
+            assert statuses == [200]
+            return time.perf_counter() - start
+
+    async def main():
+        connections = asyncio.Semaphore(clients)
+        return await asyncio.gather(*(request(path, connections) for path in request_paths))
+
+    start = time.perf_counter()
+    latencies = asyncio.run(main())
+    return latencies, time.perf_counter() - start
+
+
+def summarize(latencies, elapsed):
+    p95 = _django.percentile(latencies, 95)
+    return (
+        f"{len(latencies) / elapsed:8.1f} req/s   "
+        f"median {statistics.median(latencies) * 1000:7.1f}ms   p95 {p95 * 1000:7.1f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--clients', type=int, default=200, help="concurrent client connections")
+    parser.add_argument('--threads', type=int, default=16, help="WSGI worker threads")
+    parser.add_argument('--client-delay', type=float, default=0.2, help="seconds each client takes to read")
+    parser.add_argument('--products', type=int, default=500)
+    args = parser.parse_args()
+
+    _django.setup()
+    from django.conf import settings
+    settings.ALLOWED_HOSTS = ['testserver']
+    request_paths = paths(seed(args.products), args.requests)
+
+    use_urlconf('ecommerce_site.urls')
+    wsgi = run_wsgi(request_paths, args.clients, args.threads, args.client_delay)
+    use_urlconf('ecommerce_site.asgi_urls')
+    asgi = run_asgi(request_paths, args.clients, args.client_delay)
+
+    _django.report(f"{args.requests} requests, {args.clients} clients, {args.client_delay * 1000:.0f}ms slow reads", [
+        (f'WSGI sync views ({args.threads} threads)', summarize(*wsgi)),
+        ('ASGI async views', summarize(*asgi)),
+    ])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Compare lock contention between the development and production database
+profiles under the concurrent shopping load of ``benchmarks.load``.
+
+    python -m benchmarks.db_contention --users 20 --iterations 5
+
+Each profile runs in its own process against a fresh database. The report
+shows, per view, the requests that failed with "database is locked" and
+the p95 latency of the ones that succeeded.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks import _django
+
+
+PROFILES = ('development', 'production')
+
+
+def run_profile(profile, load_args):
+    with tempfile.NamedTemporaryFile(suffix='.json') as output:
+        subprocess.run(
+            [sys.executable, '-m', 'benchmarks.load', *load_args, '--output', output.name],
+            env={**os.environ, 'DB_PROFILE': profile}, check=True, stdout=subprocess.DEVNULL,
+        )
+        with open(output.name) as result:
+            return json.load(result)
+
+
+def locked(stats):
+    return sum(count for error, count in stats['error_types'].items() if 'locked' in error)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--iterations', type=int, default=5)
+    args = parser.parse_args()
+
+    load_args = ['--users', str(args.users), '--iterations', str(args.iterations)]
+    results = {profile: run_profile(profile, load_args) for profile in PROFILES}
+
+    rows = []
+    for view in sorted(results['development']['views']):
+        cells = []
+        for profile in PROFILES:
+            stats = results[profile]['views'].get(view)
+            if stats:
+                cells.append(f"{profile}: {locked(stats):4d} locked / {stats['requests'] + stats['errors']:4d}, p95 {stats['p95_ms']}ms")
+        rows.append((view, '   '.join(cells)))
+    rows.append(('total time', '   '.join(
+        f"{profile}: {results[profile]['duration_s']:.1f}s" for profile in PROFILES
+    )))
+    _django.report(f"Lock contention, {args.users} users x {args.iterations} checkouts", rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+"""
+Load test for the shopping flow: many simulated users browse, fill a cart,
+apply a discount, check out and look at their orders, all through the real
+URL routes.
+
+    python -m benchmarks.load --users 20 --iterations 5 --output load.json
+    python -m benchmarks.load --compare load.json
+
+Every request goes through the full middleware stack via the test client,
+against a throwaway SQLite database. For each view the run reports
+throughput, p50/p95/p99 latency, SQL queries per request and errors, and
+``--output`` writes the same numbers as JSON. ``--compare`` prints the
+change against an earlier JSON result.
+"""
+import argparse
+import json
+import platform
+import random
+import threading
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+from benchmarks import _django
+
+
+DISCOUNT_CODE = 'LOAD10'
+
+
+def seed(users, products):
+    from django.contrib.auth.models import User
+    from cart.models import Product, Cart, DiscountCode
+
+    rng = random.Random(42)
+    Product.objects.bulk_create([
+        Product(name=f'Product {i}', price=Decimal(rng.randint(100, 20000)) / 100, stock=1_000_000)
+        for i in range(products)
+    ])
+    DiscountCode.objects.create(code=DISCOUNT_CODE, discount_percent=10, usage_limit=0)
+    accounts = [User(username=f'shopper{i}') for i in range(users)]
+    for account in accounts:
+        account.set_unusable_password()
+    User.objects.bulk_create(accounts)
+    accounts = list(User.objects.filter(username__startswith='shopper'))
+    Cart.objects.bulk_create([Cart(user=account, name='Cart', is_active=True) for account in accounts])
+    return accounts, list(Product.objects.values_list('id', flat=True))
+
+
+class Recorder:
+    """
+    Collects latency and query count per view from all client threads.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(lambda: defaultdict(int))
+
+    def request(self, name, send, expected=(200, 302)):
+        from django.db import connection
+
+        queries = []
+
+        def count(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(count):
+                response = send()
+            error = None if response.status_code in expected else f'HTTP {response.status_code}'
+        except Exception as exc:
+            error = f'{type(exc).__name__}: {exc}'
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            if error:
+                self.errors[name][error] += 1
+            else:
+                self.samples[name].append((elapsed, len(queries)))
+
+    def results(self, duration):
+        views = {}
+        for name in sorted(set(self.samples) | set(self.errors)):
+            latencies = [elapsed * 1000 for elapsed, _ in self.samples[name]]
+            queries = [count for _, count in self.samples[name]]
+            views[name] = {
+                'requests': len(latencies),
+                'errors': sum(self.errors[name].values()),
+                'error_types': dict(self.errors[name]),
+                'throughput_rps': round(len(latencies) / duration, 2),
+                'p50_ms': _round(_django.percentile(latencies, 50)),
+                'p95_ms': _round(_django.percentile(latencies, 95)),
+                'p99_ms': _round(_django.percentile(latencies, 99)),
+                'queries_mean': _round(sum(queries) / len(queries) if queries else None),
+                'queries_max': max(queries, default=None),
+            }
+        return views
+
+
+def _round(value):
+    return None if value is None else round(value, 2)
+
+
+def shopper(user, product_ids, iterations, lines, recorder, seed_value):
+    from django.db import connection
+    from django.test import Client
+    from django.urls import reverse
+
+    rng = random.Random(seed_value)
+    client = Client()
+    client.force_login(user)
+    try:
+        for _ in range(iterations):
+            for product_id in rng.sample(product_ids, lines):
+                url = reverse('add_to_cart', args=[product_id])
+                recorder.request('add_to_cart', lambda: client.post(url, {'quantity': rng.randint(1, 3)}))
+            recorder.request('cart_detail', lambda: client.get(reverse('cart_detail')))
+            recorder.request('apply_discount', lambda: client.post(reverse('apply_discount'), {'code': DISCOUNT_CODE}))
+            recorder.request('checkout', lambda: client.post(reverse('checkout')))
+            recorder.request('order_history', lambda: client.get(reverse('order_history')))
+            # Checkout deactivates the cart; start the next round with a fresh one
+            recorder.request('create_cart', lambda: client.post(reverse('create_cart'), {'name': 'Cart'}))
+    finally:
+        connection.close()
+
+
+def run(users, product_ids, iterations, lines):
+    recorder = Recorder()
+    threads = [
+        threading.Thread(target=shopper, args=(user, product_ids, iterations, lines, recorder, index))
+        for index, user in enumerate(users)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - start
+    return recorder.results(duration), duration
+
+
+def compare(current, previous):
+    """
+    Return ``(label, value)`` rows with the change of each view's p95 and
+    query count against an earlier result.
+    """
+    rows = []
+    for name, stats in current['views'].items():
+        before = previous['views'].get(name)
+        if not before or not before['p95_ms'] or stats['p95_ms'] is None:
+            continue
+        change = (stats['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100
+        rows.append((name, (
+            f"p95 {before['p95_ms']:.1f} -> {stats['p95_ms']:.1f}ms ({change:+.0f}%)   "
+            f"queries {before['queries_mean']} -> {stats['queries_mean']}"
+        )))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20, help="concurrent simulated users")
+    parser.add_argument('--iterations', type=int, default=5, help="checkouts per user")
+    parser.add_argument('--lines', type=int, default=4, help="products added per checkout")
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--compare', help="JSON file from an earlier run to compare against")
+    args = parser.parse_args()
+
+    # Concurrent writers wait for the SQLite lock instead of failing at once
+    _django.setup(options={'timeout': 30})
+    import django
+    from django.conf import settings
+    settings.ALLOWED_HOSTS = ['testserver']
+
+    users, product_ids = seed(args.users, args.products)
+    views, duration = run(users, product_ids, args.iterations, args.lines)
+    result = {
+        'benchmark': 'load',
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': settings.DATABASES['default']['ENGINE'],
+            'db_profile': settings.DB_PROFILE,
+        },
+        'parameters': {
+            'users': args.users, 'iterations': args.iterations,
+            'lines': args.lines, 'products': args.products,
+        },
+        'duration_s': round(duration, 3),
+        'views': views,
+    }
+
+    _django.report(f"{args.users} users x {args.iterations} checkouts in {duration:.1f}s", [
+        (name, (
+            f"{stats['throughput_rps']:7.1f} req/s   p50 {stats['p50_ms']}ms   p95 {stats['p95_ms']}ms   "
+            f"p99 {stats['p99_ms']}ms   queries {stats['queries_mean']} (max {stats['queries_max']})   "
+            f"errors {stats['errors']}"
+        ))
+        for name, stats in views.items()
+    ])
+    if args.compare:
+        with open(args.compare) as previous:
+            rows = compare(result, json.load(previous))
+        if rows:
+            _django.report(f"Compared with {args.compare}", rows)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(result, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Micro-benchmark of cart totals: the integer-cents ``Money`` path in
+``cart.pricing`` against the ``Decimal`` arithmetic it replaced.
+
+    python -m benchmarks.money --carts 5000 --lines 8 --repeat 5
+
+All prices are in memory, so this measures only the arithmetic. The
+``Decimal`` path is timed as it was (tax never rounded) and with the
+rounding the ``Money`` path applies, which is also the reference the
+``Money`` totals are checked against to the cent.
+"""
+import argparse
+import random
+import time
+from decimal import ROUND_HALF_UP, Decimal
+
+from benchmarks import _django
+
+
+CENT = Decimal('0.01')
+
+
+def make_lines(carts, lines, products, rng):
+    prices = {product_id: Decimal(rng.randint(1, 50000)) / 100 for product_id in range(products)}
+    cart_lines = [
+        (cart_id, product_id, rng.randint(1, 5))
+        for cart_id in range(carts)
+        for product_id in rng.sample(range(products), lines)
+    ]
+    discounts = {cart_id: Decimal(rng.choice([0, 5, 10, 12.5, 15, 33])) for cart_id in range(carts)}
+    return cart_lines, prices, discounts
+
+
+def decimal_totals(lines, prices, discounts, rounded=False):
+    """
+    The ``Decimal`` pricing path, optionally rounding like the Money path.
+    """
+    from cart.pricing import FLAT_SHIPPING_RATE, FREE_SHIPPING_THRESHOLD, HUNDRED, TAX_RATE
+
+    subtotals = {}
+    for cart_id, product_id, quantity in lines:
+        subtotals[cart_id] = subtotals.get(cart_id, Decimal('0.00')) + prices[product_id] * quantity
+    totals = {}
+    for cart_id, subtotal in subtotals.items():
+        discount = subtotal * (discounts.get(cart_id, 0) / HUNDRED)
+        if rounded:
+            discount = discount.quantize(CENT, ROUND_HALF_UP)
+        after_discount = subtotal - discount
+        tax = after_discount * TAX_RATE
+        if rounded:
+            tax = tax.quantize(CENT, ROUND_HALF_UP)
+        shipping = Decimal('0.00') if after_discount >= FREE_SHIPPING_THRESHOLD else FLAT_SHIPPING_RATE
+        totals[cart_id] = after_discount + tax + shipping
+    return totals
+
+
+def money_totals(lines, prices, discounts):
+    from cart.pricing import price_carts
+
+    return {cart_id: totals.final_total for cart_id, totals in price_carts(lines, discounts, prices=prices).items()}
+
+
+def best_of(repeat, func, *args):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        times.append(time.perf_counter() - start)
+    return result, min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--carts', type=int, default=5000)
+    parser.add_argument('--lines', type=int, default=8)
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    _django.setup()
+    lines, prices, discounts = make_lines(args.carts, args.lines, args.products, random.Random(42))
+
+    _, legacy_time = best_of(args.repeat, decimal_totals, lines, prices, discounts)
+    reference, rounded_time = best_of(args.repeat, decimal_totals, lines, prices, discounts, True)
+    money, money_time = best_of(args.repeat, money_totals, lines, prices, discounts)
+    mismatches = sum(1 for cart_id, total in reference.items() if money[cart_id].to_decimal() != total)
+
+    _django.report(f"Totals for {args.carts} carts x {args.lines} lines (best of {args.repeat})", [
+        ('Decimal, unrounded', f"{legacy_time * 1000:.1f}ms"),
+        ('Decimal, rounded', f"{rounded_time * 1000:.1f}ms"),
+        ('Money (int cents)', f"{money_time * 1000:.1f}ms"),
+        ('speed-up', f"{rounded_time / money_time:.1f}x vs rounded Decimal"),
+        ('mismatched totals', str(mismatches)),
+    ])
+
+
+if __name__ == '__main__':
+    main()
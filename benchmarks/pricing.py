@@ -0,0 +1,98 @@
+"""
+Compare the batch pricing engine with the per-cart loop the views used to run.
+
+    python -m benchmarks.pricing --carts 2000 --lines 8
+"""
+import argparse
+import random
+import time
+from decimal import ROUND_HALF_UP, Decimal
+
+from benchmarks import _django
+
+
+CENT = Decimal('0.01')
+
+
+def seed(carts, lines, products):
+    from django.contrib.auth.models import User
+    from cart.models import Product, Cart, CartItem
+
+    rng = random.Random(42)
+    Product.objects.bulk_create([
+        Product(name=f'Product {i}', price=Decimal(rng.randint(100, 20000)) / 100, stock=1000)
+        for i in range(products)
+    ])
+    product_ids = list(Product.objects.values_list('id', flat=True))
+    user = User.objects.create_user(username='bench')
+    Cart.objects.bulk_create([Cart(user=user, name=f'Cart {i}', is_active=False) for i in range(carts)])
+    cart_ids = list(Cart.objects.values_list('id', flat=True))
+    CartItem.objects.bulk_create([
+        CartItem(cart_id=cart_id, product_id=product_id, quantity=rng.randint(1, 5))
+        for cart_id in cart_ids
+        for product_id in rng.sample(product_ids, lines)
+    ], batch_size=5000)
+    return cart_ids
+
+
+def per_view(cart_ids):
+    """
+    The pre-engine code path: one cart at a time, lazy product per line.
+    """
+    from cart.models import Cart, CartItem
+    from cart.pricing import TAX_RATE, FREE_SHIPPING_THRESHOLD, FLAT_SHIPPING_RATE
+
+    results = {}
+    for cart in Cart.objects.filter(id__in=cart_ids):
+        total_price = Decimal('0.00')
+        for item in CartItem.objects.filter(cart=cart):
+            total_price += item.product.price * item.quantity
+        price_after_discount = total_price
+        tax_amount = price_after_discount * TAX_RATE
+        if price_after_discount >= FREE_SHIPPING_THRESHOLD:
+            shipping_cost = Decimal('0.00')
+        else:
+            shipping_cost = FLAT_SHIPPING_RATE
+        results[cart.id] = price_after_discount + tax_amount + shipping_cost
+    return results
+
+
+def batched(cart_ids):
+    from cart.models import CartItem
+    from cart.pricing import price_carts
+
+    lines = CartItem.objects.filter(cart_id__in=cart_ids).values_list('cart_id', 'product_id', 'quantity')
+    return {cart_id: totals.final_total.to_decimal() for cart_id, totals in price_carts(lines.iterator()).items()}
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--carts', type=int, default=2000)
+    parser.add_argument('--lines', type=int, default=8)
+    parser.add_argument('--products', type=int, default=1000)
+    args = parser.parse_args()
+
+    _django.setup()
+    cart_ids = seed(args.carts, args.lines, args.products)
+
+    legacy, legacy_time = timed(per_view, cart_ids)
+    engine, engine_time = timed(batched, cart_ids)
+    # The engine rounds tax to the cent; the old path left it unrounded
+    legacy = {cart_id: total.quantize(CENT, ROUND_HALF_UP) for cart_id, total in legacy.items()}
+    assert legacy == engine, "pricing engine disagrees with the per-view path"
+
+    _django.report(f"Pricing {args.carts} carts x {args.lines} lines", [
+        ('per-view loop', f"{legacy_time:.3f}s"),
+        ('batch engine', f"{engine_time:.3f}s"),
+        ('speed-up', f"{legacy_time / engine_time:.1f}x"),
+    ])
+
+
+if __name__ == '__main__':
+    main()
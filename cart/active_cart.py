@@ -0,0 +1,104 @@
+"""
+Resolve the logged-in user's active cart without a query on most requests.
+
+The session keeps a pointer ``[user_id, cart_id, version]`` to the active
+cart. ``version`` is a per-user value in the cache that is bumped whenever
+the user's active cart may have changed: on every switch here, and by a
+signal whenever a ``Cart`` is saved or deleted. A pointer with the current
+version is trusted as is; any other pointer is rebuilt from the database.
+The result is kept on the request, so each request resolves it at most
+once and only if something asks for it.
+
+The ``is_active`` column stays the source of truth and its partial unique
+index still allows one active cart per user.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from .models import Cart
+
+
+SESSION_KEY = 'active_cart'
+_UNRESOLVED = object()
+
+
+def _version_key(user_id):
+    return f'cart:active:{user_id}'
+
+
+def cart_version(user_id):
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate(user_id):
+    """
+    Make every session's pointer to the user's active cart stale.
+    """
+    cache.set(_version_key(user_id), time.time_ns(), None)
+
+
+def _pointed_cart(user, cart_id):
+    # Built from the pointer alone; other fields load on first access
+    cart = Cart.from_db(DEFAULT_DB_ALIAS, ['id', 'user_id', 'is_active'], [cart_id, user.pk, True])
+    cart.user = user
+    return cart
+
+
+def get_active_cart(request):
+    """
+    Return the user's active cart, or None for guests and users without one.
+    """
+    user = request.user
+    if not user.is_authenticated:
+        return None
+    resolved = getattr(request, '_active_cart', (None, _UNRESOLVED))
+    if resolved[0] == user.pk:
+        return resolved[1]
+
+    version = cart_version(user.pk)
+    pointer = request.session.get(SESSION_KEY)
+    if pointer and pointer[0] == user.pk and pointer[2] == version:
+        cart_id = pointer[1]
+    else:
+        cart_id = Cart.objects.filter(user=user, is_active=True).values_list('id', flat=True).first()
+        request.session[SESSION_KEY] = [user.pk, cart_id, version]
+    cart = None if cart_id is None else _pointed_cart(user, cart_id)
+    request._active_cart = (user.pk, cart)
+    return cart
+
+
+def switch_cart(request, cart):
+    """
+    Make ``cart``, one of the user's carts, the active one. Only the
+    previously active row and ``cart`` are written.
+    """
+    user = request.user
+    with transaction.atomic():
+        # The partial unique index finds the one active row directly
+        Cart.objects.filter(user=user, is_active=True).exclude(id=cart.id).update(is_active=False)
+        Cart.objects.filter(id=cart.id, user=user).update(is_active=True)
+        transaction.on_commit(lambda: invalidate(user.pk))
+    invalidate(user.pk)
+    cart.is_active = True
+    request.session[SESSION_KEY] = [user.pk, cart.id, cart_version(user.pk)]
+    request._active_cart = (user.pk, cart)
+    return cart
+
+
+def forget_cart(request):
+    """
+    Record that the user no longer has an active cart, as after checkout.
+    The session is rewritten here rather than left to the version bump, so
+    the next request cannot resolve to the cart that was just ordered.
+    """
+    user = request.user
+    invalidate(user.pk)
+    request.session[SESSION_KEY] = [user.pk, None, cart_version(user.pk)]
+    request._active_cart = (user.pk, None)
@@ -1,7 +1,96 @@
 from django.contrib import admin
-from .models import Product, Cart, CartItem, DiscountCode
+from .models import Product, Cart, CartItem, DiscountCode, Order, OrderItem, Task
+from .pagination import EstimatedCountPaginator
+from . import search
 
-admin.site.register(Product)
-admin.site.register(Cart)
-admin.site.register(CartItem)
-admin.site.register(DiscountCode)
\ No newline at end of file
+
+class ScalableAdmin(admin.ModelAdmin):
+    """
+    Changelist defaults for tables with millions of rows: no unbounded
+    COUNT(*), and searches that are exact matches on indexed columns.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+
+@admin.register(Product)
+class ProductAdmin(ScalableAdmin):
+    list_display = ('id', 'name', 'sku', 'price', 'stock', 'reserved')
+    search_fields = ('sku__exact',)
+    search_help_text = "Words of the product name, or an exact SKU."
+    readonly_fields = ('reserved',)
+
+    def get_search_results(self, request, queryset, search_term):
+        # Names go through the full-text index instead of LIKE '%term%'
+        by_sku, _ = super().get_search_results(request, queryset, search_term)
+        if not search_term:
+            return by_sku, False
+        return by_sku | search.filter_products(queryset, search_term), False
+
+    def save_model(self, request, obj, form, change):
+        # Writing back the reserved count loaded with the form would undo
+        # holds taken or released in the meantime
+        if change:
+            obj.save(update_fields=[field.attname for field in obj._meta.concrete_fields
+                                    if not field.primary_key and field.name != 'reserved'])
+        else:
+            obj.save()
+
+
+@admin.register(Cart)
+class CartAdmin(ScalableAdmin):
+    list_display = ('id', 'name', 'user', 'is_active')
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+    search_fields = ('user__username__exact',)
+    search_help_text = "Exact username."
+
+
+@admin.register(CartItem)
+class CartItemAdmin(ScalableAdmin):
+    list_display = ('id', 'cart', 'product', 'quantity')
+    list_select_related = ('cart__user', 'product')
+    raw_id_fields = ('cart', 'product')
+    search_fields = ('cart__user__username__exact',)
+    search_help_text = "Exact username of the cart owner."
+
+
+@admin.register(DiscountCode)
+class DiscountCodeAdmin(ScalableAdmin):
+    list_display = ('code', 'discount_percent', 'is_active', 'expires_at', 'times_used', 'usage_limit')
+    list_filter = ('is_active',)
+    search_fields = ('code__exact',)
+    search_help_text = "Exact code."
+
+
+class OrderItemInline(admin.TabularInline):
+    # Placed lines are a record of the sale, shown read-only; this also
+    # spares a lookup per line that raw-id widgets would need for labels
+    model = OrderItem
+    fields = ('product', 'quantity', 'price_at_purchase')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('order', 'product')
+
+
+@admin.register(Order)
+class OrderAdmin(ScalableAdmin):
+    list_display = ('id', 'user', 'created_at', 'item_count', 'final_total', 'discount_code')
+    list_select_related = ('user', 'discount_code')
+    raw_id_fields = ('user', 'discount_code')
+    search_fields = ('user__username__exact',)
+    search_help_text = "Exact username."
+    inlines = [OrderItemInline]
+
+
+@admin.register(Task)
+class TaskAdmin(ScalableAdmin):
+    list_display = ('id', 'name', 'queue', 'status', 'attempts', 'run_after', 'finished_at')
+    list_filter = ('status',)
@@ -0,0 +1,178 @@
+import json
+from decimal import Decimal
+
+from django.db import transaction
+from django.http import JsonResponse
+from django.views.decorators.http import require_http_methods
+
+from .models import Product, CartItem, CartSummary
+from .pricing import price_breakdown
+from . import active_cart, reservations, summary
+
+
+OPERATIONS = ('add', 'set', 'remove')
+MAX_OPERATIONS = 500
+
+
+class VersionConflict(Exception):
+    pass
+
+
+def _error(status, **payload):
+    return JsonResponse(payload, status=status)
+
+
+def _parse_operations(body):
+    """
+    Validate the request body and return ``(version, operations, errors)``.
+    """
+    try:
+        data = json.loads(body or b'{}')
+    except ValueError:
+        return None, [], ["Request body is not valid JSON."]
+    if not isinstance(data, dict):
+        return None, [], ["Request body must be a JSON object."]
+
+    version = data.get('version')
+    errors = []
+    if version is not None and (not isinstance(version, int) or isinstance(version, bool)):
+        errors.append("'version' must be an integer.")
+
+    operations = data.get('operations')
+    if not isinstance(operations, list) or not operations:
+        return version, [], errors + ["'operations' must be a non-empty list."]
+    if len(operations) > MAX_OPERATIONS:
+        return version, [], errors + [f"At most {MAX_OPERATIONS} operations are allowed."]
+
+    parsed = []
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict) or operation.get('op') not in OPERATIONS:
+            errors.append(f"Operation {index}: 'op' must be one of {', '.join(OPERATIONS)}.")
+            continue
+        product_id = operation.get('product_id')
+        quantity = operation.get('quantity', 1 if operation['op'] == 'add' else 0)
+        if not isinstance(product_id, int) or isinstance(product_id, bool):
+            errors.append(f"Operation {index}: 'product_id' must be an integer.")
+            continue
+        if operation['op'] != 'remove':
+            minimum = 1 if operation['op'] == 'add' else 0
+            if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < minimum:
+                errors.append(f"Operation {index}: 'quantity' must be an integer of at least {minimum}.")
+                continue
+        parsed.append((operation['op'], product_id, quantity))
+    return version, parsed, errors
+
+
+def _cart_state(cart, discount_percent):
+    cart_summary = summary.get_summary(cart)
+    items = CartItem.objects.filter(cart=cart).select_related('product').order_by('id')
+    totals = price_breakdown(cart_summary.subtotal, discount_percent)
+    return {
+        'cart': cart.id,
+        'version': cart_summary.price_version,
+        'items': [
+            {
+                'product_id': item.product_id,
+                'name': item.product.name,
+                'quantity': item.quantity,
+                'price': item.product.price,
+                'subtotal': item.product.price * item.quantity,
+            }
+            for item in items
+        ],
+        'totals': totals.as_decimals(),
+    }
+
+
+def _apply(cart, operations, version):
+    """
+    Apply ``operations`` to ``cart`` in one transaction. Raises
+    ``VersionConflict`` if the cart changed since ``version`` and
+    ``reservations.InsufficientStock`` if a quantity cannot be held.
+    Returns the product ids that do not exist.
+    """
+    with transaction.atomic():
+        existing = {item.product_id: item for item in CartItem.objects.filter(cart=cart)}
+        quantities = {product_id: item.quantity for product_id, item in existing.items()}
+        for op, product_id, quantity in operations:
+            if op == 'add':
+                quantities[product_id] = quantities.get(product_id, 0) + quantity
+            elif op == 'set':
+                quantities[product_id] = quantity
+            else:
+                quantities[product_id] = 0
+
+        changed = {
+            product_id: quantity for product_id, quantity in quantities.items()
+            if quantity != (existing[product_id].quantity if product_id in existing else 0)
+        }
+        prices = dict(Product.objects.filter(id__in=changed.keys()).values_list('id', 'price'))
+        missing = [product_id for product_id in changed if product_id not in prices]
+        if missing:
+            return missing
+        if not changed:
+            # A no-op batch still reports a stale version
+            if version is not None and not CartSummary.objects.filter(cart_id=cart.id, price_version=version).exists():
+                raise VersionConflict()
+            return []
+
+        reservations.reserve_many(reservations.cart_holder(cart.id), changed)
+
+        to_create, to_update, to_delete = [], [], []
+        quantity_delta, amount_delta = 0, Decimal('0.00')
+        for product_id, quantity in changed.items():
+            item = existing.get(product_id)
+            old_quantity = item.quantity if item else 0
+            quantity_delta += quantity - old_quantity
+            amount_delta += prices[product_id] * (quantity - old_quantity)
+            if item is None:
+                to_create.append(CartItem(cart=cart, product_id=product_id, quantity=quantity))
+            elif quantity == 0:
+                to_delete.append(item.id)
+            else:
+                item.quantity = quantity
+                to_update.append(item)
+        CartItem.objects.bulk_create(to_create)
+        CartItem.objects.bulk_update(to_update, ['quantity'])
+        CartItem.objects.filter(id__in=to_delete).delete()
+
+        # Checked last, once this transaction holds the write lock
+        if not summary.apply_delta(cart.id, quantity_delta, amount_delta, expected_version=version):
+            raise VersionConflict()
+    return []
+
+
+@require_http_methods(['GET', 'POST'])
+def cart_batch(request):
+    """
+    JSON endpoint returning the active cart (GET) or applying a batch of
+    add/set/remove operations to it in one transaction (POST).
+
+    POST body: ``{"version": 3, "operations": [{"op": "add", "product_id": 1,
+    "quantity": 2}, ...]}``. ``version`` is optional; when given, the batch
+    is rejected with 409 if the cart changed since that version.
+    """
+    if not request.user.is_authenticated:
+        return _error(401, error='authentication_required')
+    cart = active_cart.get_active_cart(request)
+    if not cart:
+        return _error(404, error='no_active_cart')
+    discount_percent = request.session.get('discount', 0)
+
+    if request.method == 'GET':
+        return JsonResponse(_cart_state(cart, discount_percent))
+
+    version, operations, errors = _parse_operations(request.body)
+    if errors:
+        return _error(400, error='invalid_request', errors=errors)
+
+    summary.get_summary(cart)
+    try:
+        missing = _apply(cart, operations, version)
+    except VersionConflict:
+        return _error(409, error='version_conflict', **_cart_state(cart, discount_percent))
+    except reservations.InsufficientStock as exc:
+        return _error(409, error='insufficient_stock', products=[product.id for product in exc.products])
+    if missing:
+        return _error(400, error='unknown_products', products=missing)
+    return JsonResponse(_cart_state(cart, discount_percent))
@@ -0,0 +1,18 @@
+from django.urls import path
+
+from . import async_views
+from .urls import urlpatterns as sync_urlpatterns
+
+
+# The cart URLs with the read-heavy views swapped for their async versions
+ASYNC_VIEWS = {
+    'product_list': async_views.product_list,
+    'product_detail': async_views.product_detail,
+    'cart_detail': async_views.cart_detail,
+    'order_history': async_views.order_history,
+}
+
+urlpatterns = [
+    path(str(pattern.pattern), ASYNC_VIEWS.get(pattern.name, pattern.callback), name=pattern.name)
+    for pattern in sync_urlpatterns
+]
@@ -0,0 +1,199 @@
+"""
+Native async versions of the read-heavy views, routed by ``cart.async_urls``
+when the site runs under ASGI.
+
+Database access goes through the async ORM. The only sync hops are
+resolving ``request.user`` (which also loads the session) and building a
+missing cart summary. Templates are rendered once everything they need is
+in the context, so rendering never touches the database.
+"""
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.contrib.auth.views import redirect_to_login
+from django.http import Http404, HttpResponseBadRequest
+from django.shortcuts import render
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .models import Product, Cart, CartItem, CartSummary, Order
+from .pagination import (
+    InvalidCursor, akeyset_page, decode_cursor, encode_cursor, keyset_queryset, page_size_from,
+)
+from .pricing import price_breakdown
+from .routing import read_only
+from .session_cart import SessionCart
+from .streaming import STREAM_CHUNK_SIZE, astream_json, astream_template
+from .views import ORDER_JSON_FIELDS, ORDER_ORDERING, PRODUCT_ORDERING
+from . import catalog, summary
+
+
+def _resolve_user(request):
+    # Evaluates the lazy user (and with it the session) so later attribute
+    # access is plain memory reads.
+    return request.user, request.user.is_authenticated
+
+
+async def _viewer(request):
+    return await sync_to_async(_resolve_user)(request)
+
+
+async def _cart_item_count(user, is_authenticated, request):
+    # Passed in the context so the cart_summary context processor's lazy
+    # query never runs while rendering.
+    if is_authenticated:
+        count = await CartSummary.objects.filter(
+            cart__user=user, cart__is_active=True
+        ).values_list('item_count', flat=True).afirst()
+        return count or 0
+    return SessionCart(request.session).total_quantity()
+
+
+@read_only
+async def product_list(request):
+    """
+    Async view to display the product catalog one keyset page at a time.
+    Pass ``?format=json`` or ``?stream=1`` to stream the whole catalog instead.
+    """
+    user, is_authenticated = await _viewer(request)
+    cursor = request.GET.get('after') or None
+    page_size = page_size_from(request)
+    try:
+        if request.GET.get('format') == 'json':
+            rows = keyset_queryset(Product.objects.all(), PRODUCT_ORDERING, cursor)
+            return astream_json(
+                rows.values('id', 'name', 'price', 'stock').aiterator(chunk_size=STREAM_CHUNK_SIZE),
+                lambda row: row,
+            )
+        if request.GET.get('stream'):
+            rows = keyset_queryset(Product.objects.all(), PRODUCT_ORDERING, cursor)
+            return astream_template(
+                request, 'cart/product_list.html',
+                {'cart_item_count': await _cart_item_count(user, is_authenticated, request)},
+                rows.aiterator(chunk_size=STREAM_CHUNK_SIZE), 'cart/includes/product_rows.html', 'products',
+            )
+        if cursor:
+            cursor = encode_cursor(decode_cursor(cursor, Product, PRODUCT_ORDERING))
+    except InvalidCursor:
+        return HttpResponseBadRequest("Invalid cursor.")
+
+    async def build_page():
+        page = await akeyset_page(Product.objects.all(), PRODUCT_ORDERING, cursor, page_size)
+        html = render_to_string('cart/includes/product_rows.html', {'products': page.items})
+        return html, page.next_cursor
+
+    products_html, next_cursor = await catalog.aget_or_build(
+        await catalog.aproduct_list_key(cursor, page_size), build_page
+    )
+    return render(request, 'cart/product_list.html', {
+        'products_html': mark_safe(products_html),
+        'next_cursor': next_cursor,
+        'cart_item_count': await _cart_item_count(user, is_authenticated, request),
+    })
+
+
+@read_only
+async def product_detail(request, product_id):
+    """
+    Async view to display the details of a single product.
+    """
+    user, is_authenticated = await _viewer(request)
+
+    async def load_product():
+        try:
+            return await Product.objects.aget(id=product_id)
+        except Product.DoesNotExist:
+            raise Http404("No Product matches the given query.")
+
+    product = await catalog.aget_or_build(await catalog.aproduct_key(product_id), load_product)
+    return render(request, 'cart/product_detail.html', {
+        'product': product,
+        'cart_item_count': await _cart_item_count(user, is_authenticated, request),
+    })
+
+
+async def cart_detail(request):
+    """
+    Async view to display items in the cart and the total price.
+    """
+    user, is_authenticated = await _viewer(request)
+    cart_products = []
+    item_count = 0
+
+    if is_authenticated:
+        carts = [cart async for cart in Cart.objects.filter(user=user)]
+        cart = next((cart for cart in carts if cart.is_active), None)
+        if cart:
+            async for item in CartItem.objects.filter(cart=cart).select_related('product'):
+                cart_products.append({
+                    'product': item.product,
+                    'quantity': item.quantity,
+                    'subtotal': item.product.price * item.quantity
+                })
+            try:
+                cart_summary = await CartSummary.objects.aget(cart_id=cart.id)
+            except CartSummary.DoesNotExist:
+                cart_summary = await sync_to_async(summary.get_summary)(cart)
+            total_price = cart_summary.subtotal
+            item_count = cart_summary.item_count
+        else:
+            total_price = Decimal('0.00')
+            messages.error(request, "No active cart found. Please select or create a cart.")
+    else:
+        carts = None
+        session_items = SessionCart(request.session).items()
+        total_price = Decimal('0.00')
+        async for product in Product.objects.filter(id__in=session_items.keys()):
+            quantity = session_items[product.id]
+            subtotal = product.price * quantity
+            total_price += subtotal
+            item_count += quantity
+            cart_products.append({
+                'product': product,
+                'quantity': quantity,
+                'subtotal': subtotal
+            })
+
+    totals = price_breakdown(total_price, request.session.get('discount', 0))
+    return render(request, 'cart/cart_detail.html', {
+        'cart_products': cart_products,
+        **totals.as_decimals(),
+        'carts': carts,
+        'cart_item_count': item_count,
+    })
+
+
+@read_only
+async def order_history(request):
+    """
+    Async view to list the user's orders, newest first.
+    Pass ``?format=json`` or ``?stream=1`` to stream the full history instead.
+    """
+    user, is_authenticated = await _viewer(request)
+    if not is_authenticated:
+        return redirect_to_login(request.get_full_path())
+    cursor = request.GET.get('after') or None
+    orders = Order.objects.filter(user=user)
+    try:
+        if request.GET.get('format') == 'json':
+            rows = keyset_queryset(orders, ORDER_ORDERING, cursor)
+            return astream_json(
+                rows.values(*ORDER_JSON_FIELDS).aiterator(chunk_size=STREAM_CHUNK_SIZE),
+                lambda row: row,
+            )
+        if request.GET.get('stream'):
+            rows = keyset_queryset(orders, ORDER_ORDERING, cursor)
+            return astream_template(
+                request, 'cart/order_history.html',
+                {'cart_item_count': await _cart_item_count(user, is_authenticated, request)},
+                rows.aiterator(chunk_size=STREAM_CHUNK_SIZE), 'cart/includes/order_rows.html', 'orders',
+            )
+        page = await akeyset_page(orders, ORDER_ORDERING, cursor, page_size_from(request))
+    except InvalidCursor:
+        return HttpResponseBadRequest("Invalid cursor.")
+    return render(request, 'cart/order_history.html', {
+        'orders': page.items,
+        'next_cursor': page.next_cursor,
+        'cart_item_count': await _cart_item_count(user, is_authenticated, request),
+    })
@@ -0,0 +1,189 @@
+"""
+Versioned cache for the product catalog.
+
+Lookups go through a small in-process LRU first and Django's cache framework
+second. Keys embed the catalog version (and the product version for single
+products), so a bump makes every older entry unreachable instead of having
+to delete it.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+CATALOG_VERSION_KEY = 'catalog:version'
+PRODUCT_VERSION_KEY = 'catalog:product:{}:version'
+
+LOCAL_CACHE_SIZE = getattr(settings, 'CATALOG_LOCAL_CACHE_SIZE', 1024)
+CACHE_TIMEOUT = getattr(settings, 'CATALOG_CACHE_TIMEOUT', 60 * 60)
+
+
+class LRUCache:
+    """
+    Thread-safe, size-bounded least-recently-used mapping.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+local_cache = LRUCache(LOCAL_CACHE_SIZE)
+
+_stats_lock = threading.Lock()
+_stats = {'local_hits': 0, 'shared_hits': 0, 'misses': 0}
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def stats():
+    """
+    Return a snapshot of the hit/miss counters.
+    """
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_stats():
+    with _stats_lock:
+        for name in _stats:
+            _stats[name] = 0
+
+
+def _new_version():
+    # Versions only have to be unique; a timestamp keeps them unique even
+    # after the shared cache lost the previous value.
+    return time.time_ns()
+
+
+def _get_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), None)
+        version = cache.get(key)
+    return version
+
+
+async def _aget_version(key):
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, _new_version(), None)
+        version = await cache.aget(key)
+    return version
+
+
+def catalog_version():
+    return _get_version(CATALOG_VERSION_KEY)
+
+
+def product_version(product_id):
+    return _get_version(PRODUCT_VERSION_KEY.format(product_id))
+
+
+async def acatalog_version():
+    return await _aget_version(CATALOG_VERSION_KEY)
+
+
+async def aproduct_version(product_id):
+    return await _aget_version(PRODUCT_VERSION_KEY.format(product_id))
+
+
+def bump_catalog_version():
+    """
+    Invalidate every cached catalog entry. Call after bulk updates that
+    bypass model signals.
+    """
+    # A plain set: incr is a read-modify-write on some backends and could
+    # lose a concurrent bump
+    cache.set(CATALOG_VERSION_KEY, _new_version(), None)
+
+
+def invalidate_products(product_ids):
+    """
+    Invalidate the cached detail entries of the given products.
+    """
+    version = _new_version()
+    cache.set_many({PRODUCT_VERSION_KEY.format(product_id): version for product_id in product_ids}, None)
+
+
+def get_or_build(key, builder):
+    """
+    Return the cached value for ``key``, calling ``builder`` on a miss.
+    """
+    value = local_cache.get(key)
+    if value is not None:
+        _count('local_hits')
+        return value
+    value = cache.get(key)
+    if value is not None:
+        _count('shared_hits')
+    else:
+        _count('misses')
+        value = builder()
+        cache.set(key, value, CACHE_TIMEOUT)
+    local_cache.set(key, value)
+    return value
+
+
+async def aget_or_build(key, builder):
+    """
+    Async version of ``get_or_build``; ``builder`` is a coroutine function.
+    """
+    value = local_cache.get(key)
+    if value is not None:
+        _count('local_hits')
+        return value
+    value = await cache.aget(key)
+    if value is not None:
+        _count('shared_hits')
+    else:
+        _count('misses')
+        value = await builder()
+        await cache.aset(key, value, CACHE_TIMEOUT)
+    local_cache.set(key, value)
+    return value
+
+
+def product_list_key(cursor=None, page_size=None):
+    return f'catalog:list:{catalog_version()}:{cursor or ""}:{page_size or ""}'
+
+
+def product_key(product_id):
+    return f'catalog:product:{product_id}:{catalog_version()}:{product_version(product_id)}'
+
+
+async def aproduct_list_key(cursor=None, page_size=None):
+    return f'catalog:list:{await acatalog_version()}:{cursor or ""}:{page_size or ""}'
+
+
+async def aproduct_key(product_id):
+    return f'catalog:product:{product_id}:{await acatalog_version()}:{await aproduct_version(product_id)}'
@@ -0,0 +1,148 @@
+from django.db import OperationalError, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .models import Product, CartItem, Order, OrderItem, StockReservation
+from .pricing import price_carts
+from . import catalog, discounts, reservations, rollups, summary, tasks
+
+
+class CheckoutError(Exception):
+    """
+    Raised when an order cannot be placed. The transaction is rolled back,
+    so no order is created and no stock is touched.
+    """
+
+
+class DiscountUnavailableError(CheckoutError):
+    """
+    Raised when the applied discount code expired or ran out of uses.
+    """
+
+    def __init__(self):
+        super().__init__("Discount code is invalid or expired.")
+
+
+class CheckoutBusyError(CheckoutError):
+    """
+    Raised when the order could not get the database write lock in time.
+    """
+
+    def __init__(self):
+        super().__init__("The shop is busy right now. Please try again.")
+
+
+class OutOfStockError(CheckoutError):
+    """
+    Raised when one or more cart lines lost the race for the remaining stock.
+    """
+
+    def __init__(self, products):
+        self.products = products
+        names = ', '.join(product.name for product in products)
+        super().__init__(f"Not enough stock available for: {names}.")
+
+
+def _decrement_stock(quantities, holder):
+    """
+    Deduct stock for every product in ``quantities`` (product_id -> quantity)
+    with a single guarded UPDATE, consuming the units ``holder`` reserved.
+    A row is only touched when enough stock is left once other holders'
+    reservations are set aside, so the update count tells us whether every
+    line won.
+    """
+    wanted = Case(
+        *[When(id=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+        output_field=IntegerField(),
+    )
+    held = reservations.held_quantity(holder)
+    updated = Product.objects.filter(
+        id__in=quantities.keys(), stock__gte=wanted
+    ).alias(held=held).filter(
+        stock__gte=F('reserved') - F('held') + wanted
+    ).update(stock=F('stock') - wanted, reserved=F('reserved') - held)
+    if updated != len(quantities):
+        short = [
+            product for product in Product.objects.filter(id__in=quantities.keys()).annotate(held=held)
+            if product.stock - product.reserved + product.held < quantities[product.id]
+        ]
+        raise OutOfStockError(short)
+    StockReservation.objects.filter(holder=holder, product_id__in=quantities.keys()).delete()
+
+
+def _place_order(user, cart, discount_code):
+    with transaction.atomic():
+        cart_items = list(CartItem.objects.filter(cart=cart).select_related('product'))
+        if not cart_items:
+            raise CheckoutError("Your cart is empty.")
+
+        discount = discounts.lookup(discount_code) if discount_code else None
+        if discount_code and (discount is None or not discounts.consume(discount)):
+            raise DiscountUnavailableError()
+
+        # Calculate totals
+        lines = [(cart.id, item.product_id, item.quantity) for item in cart_items]
+        prices = {item.product_id: item.product.price for item in cart_items}
+        discount_percents = {cart.id: discount.discount_percent} if discount else None
+        totals = price_carts(lines, discount_percents, prices=prices)[cart.id]
+
+        quantities = {}
+        for item in cart_items:
+            quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+
+        holder = reservations.cart_holder(cart.id)
+        _decrement_stock(quantities, holder)
+
+        item_count, line_summary = Order.summarize_lines(
+            (item.product_id, item.product.name, item.quantity, item.product.price) for item in cart_items
+        )
+        order = Order.objects.create(
+            user=user,
+            total_amount=totals.total_price.to_decimal(),
+            discount_code=discount,
+            tax_amount=totals.tax_amount.to_decimal(),
+            shipping_cost=totals.shipping_cost.to_decimal(),
+            final_total=totals.final_total.to_decimal(),
+            item_count=item_count,
+            line_summary=line_summary
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product=item.product,
+                quantity=item.quantity,
+                price_at_purchase=item.product.price
+            )
+            for item in cart_items
+        ])
+        # Reporting happens off the request; the task commits with the order
+        tasks.enqueue(rollups.RECORD_ORDER_TASK, {'order_id': order.id})
+
+        # Clear cart
+        CartItem.objects.filter(cart=cart).delete()
+        summary.reset(cart.id)
+        reservations.release(holder)
+        cart.is_active = False
+        cart.save(update_fields=['is_active'])
+        transaction.on_commit(lambda: catalog.invalidate_products(quantities.keys()))
+    return order
+
+
+def place_order(user, cart, discount_code=None):
+    """
+    Turn the given cart into an order in one atomic unit.
+
+    The cart lines are read in one query, the order items are bulk inserted
+    and stock is decremented with one conditional UPDATE. If any line no
+    longer has enough stock the whole order is rolled back and
+    ``OutOfStockError`` is raised. Follow-up work such as the sales rollups
+    is queued as tasks in the same transaction. A checkout that cannot get
+    the database write lock raises ``CheckoutBusyError``.
+    """
+    try:
+        return _place_order(user, cart, discount_code)
+    except OperationalError as exc:
+        # Without BEGIN IMMEDIATE (the development profile) SQLite refuses to
+        # upgrade this transaction's read lock while another one writes
+        if 'locked' not in str(exc):
+            raise
+        raise CheckoutBusyError() from exc
@@ -0,0 +1,82 @@
+"""
+ETag and Last-Modified validators for ``django.views.decorators.http.condition``.
+
+Every page embeds the header chrome (login state and cart badge), so each
+validator combines the version of the page's own data with a cheap
+per-viewer version. Pages with pending flash messages get no validator
+and are always rendered in full.
+"""
+import hashlib
+
+from django.contrib.messages import get_messages
+
+from .models import CartSummary, Order
+from .session_cart import SessionCart
+from . import active_cart, catalog
+
+
+def viewer_version(request):
+    """
+    Cheap version of everything about the viewer that shows up on a page:
+    who is logged in, the active cart's content version and the applied
+    discount.
+    """
+    discount = request.session.get('discount_code', '')
+    if request.user.is_authenticated:
+        active = active_cart.get_active_cart(request)
+        cart = active and CartSummary.objects.filter(cart_id=active.id).values_list('cart_id', 'price_version').first()
+        return f'u{request.user.pk}:{cart}:{discount}'
+    return f'g:{SessionCart(request.session).items()}:{discount}'
+
+
+def _has_pending_messages(request):
+    return len(get_messages(request)) > 0
+
+
+def make_etag(request, *parts):
+    if _has_pending_messages(request):
+        return None
+    raw = '|'.join(str(part) for part in (*parts, viewer_version(request)))
+    return hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest()
+
+
+def product_list_etag(request, *args, **kwargs):
+    return make_etag(request, 'products', catalog.catalog_version(), request.GET.urlencode())
+
+
+def product_detail_etag(request, product_id):
+    return make_etag(
+        request, 'product', product_id, catalog.catalog_version(), catalog.product_version(product_id)
+    )
+
+
+def cart_etag(request):
+    # Cart lines show product names and prices, so the catalog version counts too
+    return make_etag(request, 'cart', catalog.catalog_version())
+
+
+def _order_created_at(request, order_id):
+    if not request.user.is_authenticated:
+        return None
+    # Shared by the ETag and Last-Modified callbacks of one request
+    cached = getattr(request, '_order_created_at', None)
+    if cached is None or cached[0] != order_id:
+        created_at = Order.objects.filter(
+            id=order_id, user=request.user
+        ).values_list('created_at', flat=True).first()
+        cached = request._order_created_at = (order_id, created_at)
+    return cached[1]
+
+
+def order_etag(request, order_id):
+    # Orders never change after checkout; only their id and timestamp matter
+    created_at = _order_created_at(request, order_id)
+    if created_at is None:
+        return None
+    return make_etag(request, 'order', order_id, created_at.timestamp())
+
+
+def order_last_modified(request, order_id):
+    if _has_pending_messages(request):
+        return None
+    return _order_created_at(request, order_id)
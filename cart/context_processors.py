@@ -0,0 +1,19 @@
+from .active_cart import get_active_cart
+from .models import CartSummary
+from .session_cart import SessionCart
+
+
+def cart_summary(request):
+    """
+    Expose the number of items in the current cart for the header badge.
+    """
+    def item_count():
+        if request.user.is_authenticated:
+            cart = get_active_cart(request)
+            if cart is None:
+                return 0
+            count = CartSummary.objects.filter(cart_id=cart.id).values_list('item_count', flat=True).first()
+            return count or 0
+        return SessionCart(request.session).total_quantity()
+
+    return {'cart_item_count': item_count}
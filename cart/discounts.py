@@ -0,0 +1,75 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import DiscountCode
+
+
+CODE_INDEX_KEY = 'discounts:codes'
+CODE_KEY = 'discounts:code:{}'
+CACHE_TIMEOUT = 60 * 60
+MAX_CODE_LENGTH = DiscountCode._meta.get_field('code').max_length
+
+# Cached in place of a code that is in the index but has since disappeared
+_MISSING = 'missing'
+
+
+def _code_index():
+    """
+    Return the set of every existing code, loaded with one query and cached
+    until a DiscountCode changes.
+    """
+    codes = cache.get(CODE_INDEX_KEY)
+    if codes is None:
+        codes = frozenset(DiscountCode.objects.values_list('code', flat=True))
+        cache.set(CODE_INDEX_KEY, codes, CACHE_TIMEOUT)
+    return codes
+
+
+def lookup(code):
+    """
+    Return the DiscountCode for ``code`` or None.
+
+    Unknown codes are answered from the cached code index, so guessing
+    traffic never reaches the database; known codes are cached individually.
+    """
+    code = (code or '').strip()
+    if not code or len(code) > MAX_CODE_LENGTH or code not in _code_index():
+        return None
+    key = CODE_KEY.format(code)
+    discount = cache.get(key)
+    if discount is None:
+        discount = DiscountCode.objects.filter(code=code).first() or _MISSING
+        cache.set(key, discount, CACHE_TIMEOUT)
+    return None if discount == _MISSING else discount
+
+
+def invalidate(code=None):
+    """
+    Drop the cached code index and, if given, the entry for ``code``.
+    """
+    keys = [CODE_INDEX_KEY]
+    if code:
+        keys.append(CODE_KEY.format(code))
+    cache.delete_many(keys)
+
+
+def consume(discount):
+    """
+    Count one use of ``discount`` if it is still valid, as a single
+    conditional UPDATE so that limited codes stay exact under concurrent
+    checkouts. Returns False when the code is inactive, expired or used up.
+    """
+    now = timezone.now()
+    used = DiscountCode.objects.filter(
+        Q(expires_at__isnull=True) | Q(expires_at__gte=now),
+        # A usage_limit of 0 means unlimited, as in DiscountCode.is_valid()
+        Q(usage_limit__isnull=True) | Q(usage_limit=0) | Q(times_used__lt=F('usage_limit')),
+        pk=discount.pk,
+        is_active=True,
+    ).update(times_used=F('times_used') + 1)
+    if used:
+        # Only times_used changed, so the code index stays valid
+        transaction.on_commit(lambda: cache.delete(CODE_KEY.format(discount.code)))
+    return bool(used)
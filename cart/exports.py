@@ -0,0 +1,121 @@
+"""
+Streaming order export for finance, as CSV (one row per order line) or
+JSONL (one order per line with its lines nested).
+
+Orders are read with a server-side ``iterator()`` in id order. Their lines
+are fetched one batch at a time with a single query over the batch's id
+range, so memory stays flat however long the export is. Because rows come
+out in id order, the last order id written is the watermark for the next
+incremental export (``after_id``).
+"""
+import csv
+import json
+from datetime import datetime, time, timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .models import Order, OrderItem
+from .streaming import chunked
+
+
+EXPORT_BATCH_SIZE = 1000
+FORMATS = ('csv', 'jsonl')
+
+ORDER_FIELDS = (
+    'id', 'created_at', 'user_id', 'user__username', 'discount_code__code',
+    'total_amount', 'tax_amount', 'shipping_cost', 'final_total',
+)
+LINE_FIELDS = ('order_id', 'product_id', 'product__name', 'quantity', 'price_at_purchase')
+CSV_HEADER = (
+    'order_id', 'created_at', 'user_id', 'username', 'discount_code',
+    'total_amount', 'tax_amount', 'shipping_cost', 'final_total',
+    'product_id', 'product_name', 'quantity', 'price_at_purchase',
+)
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def export_orders(start=None, end=None, after_id=None, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Yield ``(order, lines)`` for orders placed from ``start`` to ``end``
+    (dates, both inclusive) with an id above ``after_id``, in id order.
+    ``order`` is a dict of ``ORDER_FIELDS`` and ``lines`` a list of dicts
+    of ``LINE_FIELDS``.
+    """
+    orders = Order.objects.order_by('id')
+    if start:
+        orders = orders.filter(created_at__gte=_day_start(start))
+    if end:
+        orders = orders.filter(created_at__lt=_day_start(end + timedelta(days=1)))
+    if after_id:
+        orders = orders.filter(id__gt=after_id)
+
+    for batch in chunked(orders.values(*ORDER_FIELDS).iterator(chunk_size=batch_size), batch_size):
+        lines = {order['id']: [] for order in batch}
+        # One range query per batch; lines of orders filtered out above are skipped
+        items = OrderItem.objects.filter(
+            order_id__gte=batch[0]['id'], order_id__lte=batch[-1]['id']
+        ).order_by('order_id', 'id').values(*LINE_FIELDS)
+        for item in items.iterator(chunk_size=batch_size):
+            if item['order_id'] in lines:
+                lines[item['order_id']].append(item)
+        for order in batch:
+            yield order, lines[order['id']]
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def csv_lines(orders):
+    """
+    Render ``export_orders`` output as CSV lines, one per order line. An
+    order without lines still gets one row.
+    """
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_HEADER)
+    for order, lines in orders:
+        head = [order[field] for field in ORDER_FIELDS]
+        if order['created_at']:
+            head[1] = order['created_at'].isoformat()
+        for line in lines or [{}]:
+            yield writer.writerow(head + [
+                line.get('product_id'), line.get('product__name'), line.get('quantity'),
+                line.get('price_at_purchase'),
+            ])
+
+
+def jsonl_lines(orders):
+    """
+    Render ``export_orders`` output as JSON lines, one order per line.
+    """
+    for order, lines in orders:
+        record = {
+            'id': order['id'],
+            'created_at': order['created_at'],
+            'user_id': order['user_id'],
+            'username': order['user__username'],
+            'discount_code': order['discount_code__code'],
+            'total_amount': order['total_amount'],
+            'tax_amount': order['tax_amount'],
+            'shipping_cost': order['shipping_cost'],
+            'final_total': order['final_total'],
+            'lines': [
+                {
+                    'product_id': line['product_id'],
+                    'product_name': line['product__name'],
+                    'quantity': line['quantity'],
+                    'price_at_purchase': line['price_at_purchase'],
+                }
+                for line in lines
+            ],
+        }
+        yield json.dumps(record, cls=DjangoJSONEncoder) + '\n'
+
+
+def render_lines(file_format, orders):
+    return csv_lines(orders) if file_format == 'csv' else jsonl_lines(orders)
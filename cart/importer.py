@@ -0,0 +1,162 @@
+"""
+Streaming catalog import: upsert products from CSV or JSONL by ``sku``.
+
+Rows are read one at a time and written ``batch_size`` at a time, each
+batch in its own transaction with one query to find existing SKUs, one
+``bulk_create`` and one ``bulk_update``. Memory use depends on the batch
+size, not the file size. After each batch commits, the catalog cache and
+the autocomplete cache are invalidated once and the batch's last line
+number can be saved as a checkpoint to resume from.
+"""
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.backends.base.operations import BaseDatabaseOperations
+
+from .models import Product
+from . import catalog, search, summary
+
+
+FORMATS = ('csv', 'jsonl')
+SKU_MAX_LENGTH = Product._meta.get_field('sku').max_length
+# The range Django documents as safe for PositiveIntegerField on every
+# database; SQLite's own field has no upper validator
+MAX_STOCK = BaseDatabaseOperations.integer_field_ranges['PositiveIntegerField'][1]
+# Only the first few bad rows are kept for the report
+MAX_REPORTED_ERRORS = 20
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_rows(path, file_format=None):
+    """
+    Yield ``(line_number, row dict)`` from a CSV file with a header row or
+    a JSON-lines file, picking the format from the extension by default.
+    """
+    file_format = file_format or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+    with open(path, newline='', encoding='utf-8') as source:
+        if file_format == 'csv':
+            reader = csv.DictReader(source)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_number, line in enumerate(source, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    row = None
+                yield line_number, row if isinstance(row, dict) else {}
+
+
+def clean_row(row):
+    """
+    Validate one input row and return ``(sku, name, price, stock)``.
+    """
+    sku = str(row.get('sku') or '').strip()
+    name = str(row.get('name') or '').strip()
+    if not sku or len(sku) > SKU_MAX_LENGTH:
+        raise RowError(f"'sku' must be 1 to {SKU_MAX_LENGTH} characters.")
+    if not name:
+        raise RowError("'name' is required.")
+    try:
+        price = Decimal(str(row.get('price'))).quantize(Decimal('0.01'))
+        stock = int(row.get('stock'))
+    except (InvalidOperation, TypeError, ValueError):
+        raise RowError("'price' must be a number and 'stock' an integer.")
+    if price < 0 or stock < 0:
+        raise RowError("'price' and 'stock' cannot be negative.")
+    if stock > MAX_STOCK:
+        raise RowError(f"'stock' cannot be more than {MAX_STOCK}.")
+    # The model fields check what the batch write would otherwise fail on,
+    # such as max_digits and max_length
+    return sku, _clean_field('name', name), _clean_field('price', price), _clean_field('stock', stock)
+
+
+def _clean_field(name, value):
+    try:
+        return Product._meta.get_field(name).clean(value, None)
+    except ValidationError as exc:
+        raise RowError(f"'{name}': {' '.join(exc.messages)}")
+
+
+def upsert_batch(rows):
+    """
+    Create or update the products in ``rows`` (``sku -> (name, price,
+    stock)``) in one transaction. Returns ``(created, updated)``.
+    """
+    with transaction.atomic():
+        existing = {
+            product.sku: product
+            for product in Product.objects.filter(sku__in=rows.keys()).only('id', 'sku', 'name', 'price', 'stock')
+        }
+        to_create, to_update, repriced = [], [], []
+        for sku, (name, price, stock) in rows.items():
+            product = existing.get(sku)
+            if product is None:
+                to_create.append(Product(sku=sku, name=name, price=price, stock=stock))
+            elif (product.name, product.price, product.stock) != (name, price, stock):
+                if product.price != price:
+                    repriced.append(product.id)
+                product.name, product.price, product.stock = name, price, stock
+                to_update.append(product)
+        Product.objects.bulk_create(to_create)
+        Product.objects.bulk_update(to_update, ['name', 'price', 'stock'])
+        # bulk writes skip the model signals, so do their work once per batch
+        if repriced:
+            summary.reprice_products(repriced)
+        if to_create or to_update:
+            changed = [product.id for product in to_update]
+            transaction.on_commit(lambda: _invalidate(changed))
+    return len(to_create), len(to_update)
+
+
+def _invalidate(product_ids):
+    catalog.bump_catalog_version()
+    catalog.invalidate_products(product_ids)
+    search.bump_search_version()
+
+
+def import_products(rows, batch_size=1000, start_after=0, on_batch=None):
+    """
+    Upsert products from ``(line_number, row)`` pairs, skipping lines up to
+    ``start_after``. ``on_batch(stats)`` is called after every committed
+    batch with running totals, including the last line it covered and the
+    first few invalid rows. Returns the final totals.
+    """
+    stats = {'line': start_after, 'rows': 0, 'created': 0, 'updated': 0, 'invalid': 0, 'errors': []}
+    batch = {}
+
+    def flush():
+        created, updated = upsert_batch(batch)
+        stats['created'] += created
+        stats['updated'] += updated
+        batch.clear()
+        if on_batch:
+            on_batch(stats)
+
+    for line_number, row in rows:
+        if line_number <= start_after:
+            continue
+        try:
+            sku, name, price, stock = clean_row(row)
+        except RowError as exc:
+            stats['invalid'] += 1
+            if len(stats['errors']) < MAX_REPORTED_ERRORS:
+                stats['errors'].append((line_number, str(exc)))
+        else:
+            # A SKU repeated within a batch keeps its last row
+            batch[sku] = (name, price, stock)
+        stats['rows'] += 1
+        stats['line'] = line_number
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return stats
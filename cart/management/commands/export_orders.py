@@ -0,0 +1,66 @@
+import json
+import os
+import sys
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cart.exports import EXPORT_BATCH_SIZE, FORMATS, export_orders, render_lines
+
+
+def _date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"{value} is not a date in YYYY-MM-DD format.")
+
+
+class Command(BaseCommand):
+    help = "Stream orders with their lines to a CSV or JSONL file in constant memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument('--output', help="File to write; standard output by default.")
+        parser.add_argument('--start', help="First order date to export (YYYY-MM-DD).")
+        parser.add_argument('--end', help="Last order date to export (YYYY-MM-DD).")
+        parser.add_argument('--after-id', type=int, default=0,
+                            help="Only export orders with a higher id.")
+        parser.add_argument('--since-last',
+                            help="State file holding the last exported order id; only newer orders "
+                                 "are exported and the file is updated once the export completes.")
+        parser.add_argument('--batch-size', type=int, default=EXPORT_BATCH_SIZE,
+                            help="Number of orders read per query.")
+
+    def handle(self, *args, **options):
+        state = options['since_last']
+        after_id = options['after_id']
+        if state and os.path.exists(state):
+            with open(state) as watermark:
+                after_id = max(after_id, json.load(watermark)['last_order_id'])
+
+        exported = {'orders': 0, 'last_id': after_id}
+
+        def tracked(orders):
+            for order, lines in orders:
+                exported['orders'] += 1
+                exported['last_id'] = order['id']
+                yield order, lines
+
+        orders = export_orders(
+            start=_date(options['start']) if options['start'] else None,
+            end=_date(options['end']) if options['end'] else None,
+            after_id=after_id, batch_size=options['batch_size'],
+        )
+        output = open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else sys.stdout
+        try:
+            output.writelines(render_lines(options['format'], tracked(orders)))
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+        if state:
+            partial = f'{state}.tmp'
+            with open(partial, 'w') as watermark:
+                json.dump({'last_order_id': exported['last_id']}, watermark)
+            os.replace(partial, state)
+        self.stderr.write(f"Exported {exported['orders']} orders (last order id {exported['last_id']}).")
@@ -0,0 +1,68 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cart.importer import FORMATS, import_products, read_rows
+
+
+class Command(BaseCommand):
+    help = "Stream products from a CSV or JSONL file and upsert them by SKU in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV file with a sku,name,price,stock header, or a JSONL file.")
+        parser.add_argument('--format', choices=FORMATS,
+                            help="File format; guessed from the extension by default.")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Number of products to write per transaction.")
+        parser.add_argument('--checkpoint',
+                            help="File recording the last imported line; an interrupted import resumes from it.")
+
+    def load_checkpoint(self, path, source):
+        if not path or not os.path.exists(path):
+            return 0
+        with open(path) as checkpoint:
+            state = json.load(checkpoint)
+        if state.get('source') != os.path.abspath(source):
+            raise CommandError(f"Checkpoint {path} belongs to {state.get('source')}.")
+        return state['line']
+
+    def save_checkpoint(self, path, source, line):
+        # Written to a temporary file first so a crash never leaves half a checkpoint
+        partial = f'{path}.tmp'
+        with open(partial, 'w') as checkpoint:
+            json.dump({'source': os.path.abspath(source), 'line': line}, checkpoint)
+        os.replace(partial, path)
+
+    def handle(self, *args, **options):
+        path, checkpoint = options['path'], options['checkpoint']
+        if not os.path.exists(path):
+            raise CommandError(f"{path} does not exist.")
+        start_after = self.load_checkpoint(checkpoint, path)
+        if start_after:
+            self.stdout.write(f"Resuming after line {start_after}.")
+        started = time.perf_counter()
+
+        def on_batch(stats):
+            if checkpoint:
+                self.save_checkpoint(checkpoint, path, stats['line'])
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"Line {stats['line']}: {stats['created']} created, {stats['updated']} updated, "
+                f"{stats['invalid']} invalid, {stats['rows'] / elapsed if elapsed else 0:.0f} rows/s"
+            )
+
+        stats = import_products(
+            read_rows(path, options['format']), batch_size=options['batch_size'],
+            start_after=start_after, on_batch=on_batch,
+        )
+        for line_number, error in stats['errors']:
+            self.stderr.write(f"Line {line_number}: {error}")
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {stats['rows']} rows in {elapsed:.1f}s: {stats['created']} created, "
+            f"{stats['updated']} updated, {stats['invalid']} invalid."
+        ))
+        if checkpoint and os.path.exists(checkpoint):
+            os.remove(checkpoint)
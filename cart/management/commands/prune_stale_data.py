@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from cart import retention
+
+
+TARGETS = ('carts', 'sessions', 'tasks')
+
+
+class Command(BaseCommand):
+    help = "Delete abandoned carts, expired sessions and finished tasks in small batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only', action='append', choices=TARGETS,
+                            help="Only prune this target; repeat for several.")
+        parser.add_argument('--cart-days', type=int, default=retention.CART_RETENTION_DAYS,
+                            help="Keep inactive carts changed within this many days.")
+        parser.add_argument('--task-days', type=int, default=retention.TASK_RETENTION_DAYS,
+                            help="Keep finished tasks for this many days.")
+        parser.add_argument('--batch-size', type=int, default=retention.PURGE_BATCH_SIZE,
+                            help="Number of rows to delete per transaction.")
+        parser.add_argument('--pause', type=float, default=retention.PURGE_PAUSE_SECONDS,
+                            help="Seconds to wait between batches.")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Count the rows that would be deleted without deleting them.")
+
+    def handle(self, *args, **options):
+        targets = options['only'] or TARGETS
+        if 'carts' in targets and not options['dry_run']:
+            # Gives carts that were never summarized a last change time, so
+            # the cutoff applies to them on later runs
+            built = retention.summarize_inactive_carts(options['batch_size'])
+            if built:
+                self.stdout.write(f"Summarized {built} inactive carts.")
+        querysets = {
+            'carts': retention.abandoned_carts(options['cart_days']),
+            'sessions': retention.expired_sessions(),
+            'tasks': retention.finished_tasks(options['task_days']),
+        }
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        for target in targets:
+            queryset = querysets[target]
+            if queryset is None:
+                self.stdout.write(f"Skipping {target}: not stored in the database.")
+                continue
+            started = time.perf_counter()
+            deleted = retention.purge(
+                queryset, batch_size=options['batch_size'], pause=options['pause'], dry_run=options['dry_run'],
+            )
+            elapsed = time.perf_counter() - started
+            rows = sum(deleted.values())
+            details = ', '.join(f'{count} {label}' for label, count in sorted(deleted.items())) or 'nothing'
+            self.stdout.write(
+                f"{verb} {rows} {target} rows in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:.0f} rows/s): {details}."
+            )
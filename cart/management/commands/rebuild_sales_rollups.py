@@ -0,0 +1,24 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cart.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily sales rollups from order history in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="Only rebuild days from this date on (YYYY-MM-DD).")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Number of orders to replay per batch.")
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError("--since must be a date in YYYY-MM-DD format.")
+        replayed = rebuild(since=since, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt sales rollups from {replayed} orders."))
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from cart.models import Product
+from cart.search import fts_enabled, rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product full-text search index from the product table."
+
+    def handle(self, *args, **options):
+        if not fts_enabled():
+            self.stdout.write("Full-text search is only available on SQLite; nothing to rebuild.")
+            return
+        start = time.perf_counter()
+        rebuild_index()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {Product.objects.count()} products in {elapsed:.2f}s."
+        ))
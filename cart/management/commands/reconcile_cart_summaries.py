@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from cart.summary import rebuild_summaries
+
+
+class Command(BaseCommand):
+    help = "Rebuild cart summaries from cart items in bulk and report any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Number of carts to reconcile per batch.")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Report drift without repairing it.")
+
+    def handle(self, *args, **options):
+        drift = rebuild_summaries(batch_size=options['batch_size'], dry_run=options['dry_run'])
+        for cart_id, stored, actual in drift:
+            if stored is None:
+                self.stdout.write(f"Cart {cart_id}: missing summary, actual {actual[0]} items / {actual[1]}")
+            else:
+                self.stdout.write(
+                    f"Cart {cart_id}: stored {stored[0]} items / {stored[1]}, "
+                    f"actual {actual[0]} items / {actual[1]}"
+                )
+        verb = "found" if options['dry_run'] else "repaired"
+        self.stdout.write(self.style.SUCCESS(f"{len(drift)} drifted cart summaries {verb}."))
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from cart import tasks
+
+
+class Command(BaseCommand):
+    help = "Run queued background tasks until the queues are empty, or forever with --interval."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queue', action='append', dest='queues',
+                            help="Queue to work on; repeat for several. Defaults to every queue with a handler.")
+        parser.add_argument('--batch-size', type=int, default=tasks.CLAIM_BATCH_SIZE,
+                            help="Number of tasks claimed per queue at a time.")
+        parser.add_argument('--lease', type=float, default=tasks.LEASE_SECONDS,
+                            help="Seconds a claimed task stays reserved for this worker.")
+        parser.add_argument('--interval', type=float, default=0,
+                            help="Keep running and poll every INTERVAL seconds when idle.")
+
+    def handle(self, *args, **options):
+        queues = options['queues'] or sorted({queue for _, queue in tasks.HANDLERS.values()})
+        worker = tasks.worker_id()
+        totals = {}
+        while True:
+            results = tasks.work(queues, worker, options['batch_size'], options['lease'])
+            for status, count in results.items():
+                totals[status] = totals.get(status, 0) + count
+            if results:
+                continue
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(
+            f"Ran {sum(totals.values())} tasks: {totals.get('done', 0)} done, "
+            f"{totals.get('pending', 0)} to retry, {totals.get('failed', 0)} failed."
+        )
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from cart.reservations import SWEEP_BATCH_SIZE, sweep_expired
+
+
+class Command(BaseCommand):
+    help = "Release expired stock reservations in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=SWEEP_BATCH_SIZE,
+                            help="Number of reservations to release per transaction.")
+        parser.add_argument('--interval', type=float, default=0,
+                            help="Keep running and sweep every INTERVAL seconds.")
+
+    def handle(self, *args, **options):
+        while True:
+            released = sweep_expired(batch_size=options['batch_size'])
+            self.stdout.write(f"Released {released} expired reservations.")
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
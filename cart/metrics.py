@@ -0,0 +1,289 @@
+"""
+Per-view request metrics exposed in the Prometheus text format.
+
+``metrics_middleware`` times every request and labels it with the resolved
+URL name. While a request runs, a context variable holds its
+``RequestStats``; the execute wrapper installed on every database
+connection and the instrumented template backend add to it, so the
+bookkeeping per query or render is a context lookup and two clock reads.
+Metrics live in process memory: each worker process exposes its own.
+"""
+import hmac
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.template.backends.django import DjangoTemplates, Template
+from django.utils.decorators import sync_and_async_middleware
+
+
+logger = logging.getLogger(__name__)
+
+# Requests slower than this are logged with their SQL; None disables it
+SLOW_REQUEST_MS = getattr(settings, 'METRICS_SLOW_REQUEST_MS', None)
+# Bearer token the scraper must send; None leaves /metrics/ switched off.
+# The client address is no proof: behind a local proxy it is always 127.0.0.1
+TOKEN = getattr(settings, 'METRICS_TOKEN', None)
+MAX_LOGGED_STATEMENTS = 50
+# Methods reported as labels; everything else is counted as 'other'
+METHODS = frozenset({'GET', 'POST', 'PUT', 'PATCH', 'DELETE', 'HEAD', 'OPTIONS'})
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (1_000, 10_000, 50_000, 100_000, 500_000, 1_000_000)
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class Histogram:
+    """
+    Thread-safe Prometheus histogram keyed by a tuple of label values.
+    """
+
+    def __init__(self, name, documentation, labels, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {labels: (list(counts), total, count) for labels, (counts, total, count) in self._series.items()}
+        for label_values, (counts, total, count) in sorted(series.items()):
+            labels = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.labels, label_values))
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{labels}}} {total}')
+            lines.append(f'{self.name}_count{{{labels}}} {count}')
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+LABELS = ('view', 'method')
+request_duration = Histogram(
+    'view_request_duration_seconds', 'Time spent handling the request.', LABELS, LATENCY_BUCKETS
+)
+db_queries = Histogram('view_db_queries', 'SQL queries run per request.', LABELS, QUERY_BUCKETS)
+db_duration = Histogram(
+    'view_db_duration_seconds', 'Time spent executing SQL per request.', LABELS, LATENCY_BUCKETS
+)
+template_duration = Histogram(
+    'view_template_render_seconds', 'Time spent rendering templates per request.', LABELS, LATENCY_BUCKETS
+)
+response_size = Histogram('view_response_size_bytes', 'Size of the response body.', LABELS, SIZE_BUCKETS)
+HISTOGRAMS = (request_duration, db_queries, db_duration, template_duration, response_size)
+
+
+def reset():
+    for histogram in HISTOGRAMS:
+        histogram.clear()
+
+
+def expose():
+    """
+    Return every metric in the Prometheus text exposition format.
+    """
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.expose())
+    return '\n'.join(lines) + '\n'
+
+
+class RequestStats:
+    __slots__ = ('queries', 'db_time', 'template_time', 'rendering', 'statements')
+
+    def __init__(self, keep_statements):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.rendering = False
+        self.statements = [] if keep_statements else None
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    """
+    Database execute wrapper counting queries and their time for the
+    request that is running, if any.
+    """
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        stats.queries += 1
+        stats.db_time += elapsed
+        if stats.statements is not None and len(stats.statements) < MAX_LOGGED_STATEMENTS:
+            stats.statements.append((elapsed, sql))
+
+
+def install(connection):
+    if execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(execute_wrapper)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        stats = _current.get()
+        # Only the outermost render is timed so nested renders are not counted twice
+        if stats is None or stats.rendering:
+            return super().render(context, request)
+        stats.rendering = True
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_time += time.perf_counter() - start
+            stats.rendering = False
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """
+    The Django template backend, timing renders for the request metrics.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+def _labels(request):
+    match = getattr(request, 'resolver_match', None)
+    method = request.method if request.method in METHODS else 'other'
+    return (match.view_name if match else 'unresolved', method)
+
+
+def _record(request, response, stats, elapsed, size):
+    labels = _labels(request)
+    request_duration.observe(labels, elapsed)
+    db_queries.observe(labels, stats.queries)
+    db_duration.observe(labels, stats.db_time)
+    template_duration.observe(labels, stats.template_time)
+    if size is not None:
+        response_size.observe(labels, size)
+    if SLOW_REQUEST_MS is not None and elapsed * 1000 >= SLOW_REQUEST_MS:
+        logger.warning(
+            "Slow request: %s %s (%s) took %.1fms, %d queries in %.1fms, templates %.1fms\n%s",
+            request.method, request.path, labels[0], elapsed * 1000, stats.queries,
+            stats.db_time * 1000, stats.template_time * 1000,
+            '\n'.join(f'  {duration * 1000:7.2f}ms  {sql}' for duration, sql in stats.statements),
+        )
+
+
+def _finish(request, response, stats, start):
+    if not response.streaming:
+        _record(request, response, stats, time.perf_counter() - start, len(response.content))
+        return response
+    # Streamed bodies are produced after the view returns: each chunk is
+    # generated with the request's stats active and the request is recorded
+    # once the last chunk has gone out.
+    sent = [0]
+
+    def finished():
+        _record(request, response, stats, time.perf_counter() - start, sent[0])
+
+    if response.is_async:
+        async def counted(content):
+            iterator = aiter(content)
+            try:
+                while True:
+                    token = _current.set(stats)
+                    try:
+                        chunk = await anext(iterator)
+                    except StopAsyncIteration:
+                        break
+                    finally:
+                        _current.reset(token)
+                    sent[0] += len(chunk)
+                    yield chunk
+            finally:
+                finished()
+    else:
+        def counted(content):
+            iterator = iter(content)
+            try:
+                while True:
+                    token = _current.set(stats)
+                    try:
+                        chunk = next(iterator)
+                    except StopIteration:
+                        break
+                    finally:
+                        _current.reset(token)
+                    sent[0] += len(chunk)
+                    yield chunk
+            finally:
+                finished()
+    response.streaming_content = counted(response.streaming_content)
+    return response
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    """
+    Record latency, SQL, template time and response size for every request,
+    labelled with the resolved URL name.
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            stats = RequestStats(SLOW_REQUEST_MS is not None)
+            token = _current.set(stats)
+            start = time.perf_counter()
+            try:
+                response = await get_response(request)
+            finally:
+                _current.reset(token)
+            return _finish(request, response, stats, start)
+    else:
+        def middleware(request):
+            stats = RequestStats(SLOW_REQUEST_MS is not None)
+            token = _current.set(stats)
+            start = time.perf_counter()
+            try:
+                response = get_response(request)
+            finally:
+                _current.reset(token)
+            return _finish(request, response, stats, start)
+    return middleware
+
+
+def metrics_view(request):
+    """
+    View to expose the request metrics to a Prometheus scraper that sends
+    ``Authorization: Bearer <METRICS_TOKEN>``.
+    """
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if not TOKEN or scheme.lower() != 'bearer' or not hmac.compare_digest(token.encode(), TOKEN.encode()):
+        raise Http404()
+    return HttpResponse(expose(), content_type='text/plain; version=0.0.4; charset=utf-8')
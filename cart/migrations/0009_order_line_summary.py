@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-18 06:31
+
+from django.db import migrations, models
+
+
+def backfill_line_summaries(apps, schema_editor):
+    Order = apps.get_model('cart', 'Order')
+    OrderItem = apps.get_model('cart', 'OrderItem')
+    last_id = 0
+    while True:
+        orders = list(Order.objects.filter(id__gt=last_id).order_by('id')[:500])
+        if not orders:
+            break
+        last_id = orders[-1].id
+        lines = {}
+        items = OrderItem.objects.filter(order__in=orders).order_by('id').values_list(
+            'order_id', 'product_id', 'product__name', 'quantity', 'price_at_purchase'
+        )
+        for order_id, product_id, name, quantity, price in items:
+            lines.setdefault(order_id, []).append(
+                {'product_id': product_id, 'name': name, 'quantity': quantity, 'price': str(price)}
+            )
+        for order in orders:
+            order.line_summary = lines.get(order.id, [])
+            order.item_count = sum(line['quantity'] for line in order.line_summary)
+        Order.objects.bulk_update(orders, ['item_count', 'line_summary'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0008_stock_reservations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='line_summary',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RunPython(backfill_line_summaries, migrations.RunPython.noop),
+    ]
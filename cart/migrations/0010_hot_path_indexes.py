@@ -0,0 +1,54 @@
+# Generated by Django 4.2.30 on 2026-10-18 06:42
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Sum
+
+
+def remove_duplicates(apps, schema_editor):
+    """
+    Make existing rows satisfy the new unique constraints: duplicate cart
+    lines are folded into the oldest one and only the newest active cart of
+    each user stays active.
+    """
+    Cart = apps.get_model('cart', 'Cart')
+    CartItem = apps.get_model('cart', 'CartItem')
+
+    duplicates = (
+        CartItem.objects.values('cart_id', 'product_id')
+        .annotate(lines=Count('id'), total=Sum('quantity'), keep=Min('id'))
+        .filter(lines__gt=1)
+    )
+    for row in duplicates:
+        CartItem.objects.filter(id=row['keep']).update(quantity=row['total'])
+        CartItem.objects.filter(cart_id=row['cart_id'], product_id=row['product_id']).exclude(id=row['keep']).delete()
+
+    active = (
+        Cart.objects.filter(is_active=True).values('user_id')
+        .annotate(carts=Count('id'), keep=Max('id'))
+        .filter(carts__gt=1)
+    )
+    for row in active:
+        Cart.objects.filter(user_id=row['user_id'], is_active=True).exclude(id=row['keep']).update(is_active=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0009_order_line_summary'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'created_at'], name='order_user_created_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_active', True)), fields=('user',), name='unique_active_cart_per_user'),
+        ),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('cart', 'product'), name='unique_product_per_cart'),
+        ),
+    ]
@@ -6,13 +6,22 @@ class Product(models.Model):
     """
     Model representing a product in the store.
     """
+    # Stable external key used by the catalog import to match rows
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
     name = models.CharField(max_length=255)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField()
+    # Units held by live cart reservations, maintained by cart.reservations
+    # with F() updates; never editable through forms
+    reserved = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.name
 
+    @property
+    def available(self):
+        return max(self.stock - self.reserved, 0)
+
 class Cart(models.Model):
     """
     Model representing a shopping cart associated with a user.
@@ -21,6 +30,14 @@ class Cart(models.Model):
     name = models.CharField(max_length=255, default="Default Cart")
     is_active = models.BooleanField(default=True)
 
+    class Meta:
+        constraints = [
+            # Also the index behind every "active cart of this user" lookup
+            models.UniqueConstraint(
+                fields=['user'], condition=models.Q(is_active=True), name='unique_active_cart_per_user'
+            ),
+        ]
+
     def __str__(self):
         return f"Cart ({self.user.username})"
 
@@ -32,9 +49,46 @@ class CartItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='unique_product_per_cart'),
+        ]
+
     def __str__(self):
         return f"{self.quantity} x {self.product.name}"
 
+class CartSummary(models.Model):
+    """
+    Denormalized totals for a cart, updated incrementally on every cart change.
+    ``price_version`` is bumped whenever the subtotal changes.
+    """
+    cart = models.OneToOneField(Cart, primary_key=True, related_name='summary', on_delete=models.CASCADE)
+    item_count = models.IntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    price_version = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Summary for cart {self.cart_id}"
+
+class StockReservation(models.Model):
+    """
+    Model representing a time-boxed hold on product stock by a cart or a
+    guest session. ``holder`` is ``cart:<id>`` or ``session:<key>``.
+    """
+    holder = models.CharField(max_length=64)
+    product = models.ForeignKey(Product, related_name='reservations', on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['holder', 'product'], name='unique_reservation_per_holder'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} held by {self.holder}"
+
 class DiscountCode(models.Model):
     code = models.CharField(max_length=50, unique=True)
     discount_percent = models.DecimalField(max_digits=5, decimal_places=2)
@@ -66,11 +120,37 @@ class Order(models.Model):
     tax_amount = models.DecimalField(max_digits=10, decimal_places=2)
     shipping_cost = models.DecimalField(max_digits=10, decimal_places=2)
     final_total = models.DecimalField(max_digits=12, decimal_places=2)
+    # Snapshot of the lines taken at checkout so listings never join back
+    # to OrderItem/Product: [{"product_id", "name", "quantity", "price"}, ...]
+    item_count = models.PositiveIntegerField(default=0)
+    line_summary = models.JSONField(default=list, blank=True)
     # Additional fields like shipping address, payment details, I can add here in the future
 
+    class Meta:
+        indexes = [
+            # Order history: a user's orders, newest first
+            models.Index(fields=['user', 'created_at'], name='order_user_created_idx'),
+        ]
+
     def __str__(self):
         return f"Order {self.id} by {self.user.username}"
 
+    @property
+    def product_names(self):
+        return ', '.join(line['name'] for line in self.line_summary)
+
+    @staticmethod
+    def summarize_lines(lines):
+        """
+        Build ``(item_count, line_summary)`` from ``(product_id, name,
+        quantity, price)`` tuples.
+        """
+        line_summary = [
+            {'product_id': product_id, 'name': name, 'quantity': quantity, 'price': str(price)}
+            for product_id, name, quantity, price in lines
+        ]
+        return sum(line['quantity'] for line in line_summary), line_summary
+
 class OrderItem(models.Model):
     """
     Model representing an item within an order.
@@ -83,5 +163,91 @@ class OrderItem(models.Model):
     def __str__(self):
         return f"{self.quantity} x {self.product.name} in Order {self.order.id}"
 
+class DailySales(models.Model):
+    """
+    Rollup of the orders placed on one day, kept up to date by
+    cart.rollups after checkout so reports never aggregate raw orders.
+    """
+    date = models.DateField(unique=True)
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    discount_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"Sales on {self.date}"
+
+class ProductDailySales(models.Model):
+    """
+    Rollup of the units and revenue (before discounts) of one product on one day.
+    """
+    date = models.DateField()
+    product = models.ForeignKey(Product, related_name='daily_sales', on_delete=models.CASCADE)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'product'], name='unique_product_sales_per_day'),
+        ]
+
+    def __str__(self):
+        return f"Sales of {self.product_id} on {self.date}"
 
+class DiscountDailyUsage(models.Model):
+    """
+    Rollup of how often a discount code was used on one day and how much it took off.
+    """
+    date = models.DateField()
+    discount_code = models.ForeignKey(DiscountCode, related_name='daily_usage', on_delete=models.CASCADE)
+    uses = models.PositiveIntegerField(default=0)
+    discount_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'discount_code'], name='unique_discount_usage_per_day'),
+        ]
+
+    def __str__(self):
+        return f"Usage of {self.discount_code_id} on {self.date}"
+
+class Task(models.Model):
+    """
+    Model representing a unit of background work on a queue, run by the
+    ``run_tasks`` worker through cart.tasks. A claimed task is ``running``
+    until ``leased_until``; after that another worker may take it over.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    queue = models.CharField(max_length=64, default='default')
+    name = models.CharField(max_length=128)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    leased_until = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=128, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Claiming: due pending tasks and expired leases of one queue
+            models.Index(fields=['queue', 'status', 'run_after'], name='task_claim_idx'),
+            # The admin's status filter and the retention sweep of old done tasks
+            models.Index(fields=['status', 'finished_at'], name='task_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.status}) on {self.queue}"
@@ -0,0 +1,147 @@
+"""
+``Money``: an immutable amount held as an integer number of cents.
+
+Adding, subtracting and multiplying by a quantity stay in integers, so
+summing many cart lines allocates no ``Decimal`` at all. The one place
+where fractions of a cent appear, taking a percentage, rounds explicitly:
+half a cent rounds away from zero (``ROUND_HALF_UP``), the way tax and
+discounts are rounded on receipts. ``from_decimal`` and ``to_decimal``
+convert losslessly to and from two-decimal ``DecimalField`` values.
+"""
+from decimal import Decimal
+from functools import lru_cache
+
+
+CENTS = 100
+
+
+def _divide_half_up(numerator, denominator):
+    # Integer division rounding halves away from zero; denominator > 0
+    quotient, remainder = divmod(abs(numerator), denominator)
+    if remainder * 2 >= denominator:
+        quotient += 1
+    return quotient if numerator >= 0 else -quotient
+
+
+@lru_cache(maxsize=256)
+def _ratio(percent):
+    # A shop uses a handful of distinct rates, so their exact ratios are cached
+    numerator, denominator = Decimal(percent).as_integer_ratio()
+    return numerator, denominator * 100
+
+
+def percent_of(cents, percent):
+    """
+    Return ``percent`` percent of ``cents``, rounded half up to a whole cent.
+    """
+    numerator, denominator = _ratio(percent)
+    return _divide_half_up(cents * numerator, denominator)
+
+
+class Money:
+    """
+    An amount of money in cents. Instances are immutable and hashable.
+    """
+    __slots__ = ('cents',)
+
+    def __init__(self, cents=0):
+        if not isinstance(cents, int):
+            raise TypeError(f"Money takes whole cents, not {type(cents).__name__}.")
+        _set_cents(self, cents)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Money is immutable.")
+
+    @classmethod
+    def from_decimal(cls, value):
+        """
+        Convert a ``Decimal`` (or a string or int) holding whole cents.
+        Raises ``ValueError`` rather than silently dropping sub-cent digits.
+        """
+        cents = Decimal(value) * CENTS
+        if cents != cents.to_integral_value():
+            raise ValueError(f"{value} is not a whole number of cents.")
+        return cls(int(cents))
+
+    def to_decimal(self):
+        """
+        Return the amount as a ``Decimal`` with exactly two decimal places.
+        """
+        return Decimal(self.cents).scaleb(-2)
+
+    def percent(self, percent):
+        """
+        Return ``percent`` percent of this amount, rounded half up to the cent.
+        ``percent`` may be a ``Decimal``, string or number, and is used exactly.
+        """
+        return _money(percent_of(self.cents, percent))
+
+    def __add__(self, other):
+        if not isinstance(other, Money):
+            return NotImplemented
+        return _money(self.cents + other.cents)
+
+    def __sub__(self, other):
+        if not isinstance(other, Money):
+            return NotImplemented
+        return _money(self.cents - other.cents)
+
+    def __mul__(self, quantity):
+        if not isinstance(quantity, int):
+            return NotImplemented
+        return _money(self.cents * quantity)
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return _money(-self.cents)
+
+    def __bool__(self):
+        return self.cents != 0
+
+    def __eq__(self, other):
+        if not isinstance(other, Money):
+            return NotImplemented
+        return self.cents == other.cents
+
+    def __lt__(self, other):
+        if not isinstance(other, Money):
+            return NotImplemented
+        return self.cents < other.cents
+
+    def __le__(self, other):
+        if not isinstance(other, Money):
+            return NotImplemented
+        return self.cents <= other.cents
+
+    def __gt__(self, other):
+        if not isinstance(other, Money):
+            return NotImplemented
+        return self.cents > other.cents
+
+    def __ge__(self, other):
+        if not isinstance(other, Money):
+            return NotImplemented
+        return self.cents >= other.cents
+
+    def __hash__(self):
+        return hash(self.cents)
+
+    def __str__(self):
+        return str(self.to_decimal())
+
+    def __repr__(self):
+        return f"Money('{self}')"
+
+    def __reduce__(self):
+        return (Money, (self.cents,))
+
+
+# Arithmetic results skip the type check and the immutability guard
+_set_cents = Money.cents.__set__
+
+
+def _money(cents):
+    money = object.__new__(Money)
+    _set_cents(money, cents)
+    return money
@@ -0,0 +1,172 @@
+import base64
+import binascii
+import datetime
+import decimal
+import json
+from collections import namedtuple
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max, Q
+from django.utils.functional import cached_property
+
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# Result sets up to this size are counted exactly; larger ones are estimated
+EXACT_COUNT_LIMIT = 10_000
+
+KeysetPage = namedtuple('KeysetPage', ['items', 'next_cursor'])
+
+
+class InvalidCursor(ValueError):
+    """
+    Raised when a cursor cannot be decoded for the requested ordering.
+    """
+
+
+def _cursor_value(value):
+    # Unlike DjangoJSONEncoder, keep full microsecond precision so that the
+    # decoded value compares equal to the stored one.
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    raise TypeError(f"Cannot encode {type(value).__name__} in a cursor")
+
+
+def encode_cursor(values):
+    """
+    Encode the ordering values of the last row on a page as an opaque token.
+    """
+    raw = json.dumps(list(values), default=_cursor_value, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).rstrip(b'=').decode()
+
+
+def decode_cursor(cursor, model, ordering):
+    """
+    Decode a cursor back into python values for the fields in ``ordering``.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        raise InvalidCursor(cursor)
+    if not isinstance(values, list) or len(values) != len(ordering):
+        raise InvalidCursor(cursor)
+    try:
+        return [
+            model._meta.get_field(field.lstrip('-')).to_python(value)
+            for field, value in zip(ordering, values)
+        ]
+    except ValidationError:
+        raise InvalidCursor(cursor)
+
+
+def after_filter(ordering, values):
+    """
+    Build the filter selecting rows that sort strictly after ``values``,
+    e.g. ``(a < x) OR (a = x AND b < y)`` for ordering ``['-a', '-b']``.
+    """
+    condition = None
+    equal = {}
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        step = Q(**equal, **{f'{name}__{lookup}': value})
+        condition = step if condition is None else condition | step
+        equal[name] = value
+    return condition
+
+
+def keyset_queryset(queryset, ordering, cursor=None):
+    """
+    Order ``queryset`` by ``ordering`` and skip everything up to ``cursor``.
+    """
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        values = decode_cursor(cursor, queryset.model, ordering)
+        queryset = queryset.filter(after_filter(ordering, values))
+    return queryset
+
+
+def _to_page(rows, ordering, page_size):
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, field.lstrip('-')) for field in ordering)
+    return KeysetPage(rows, next_cursor)
+
+
+def keyset_page(queryset, ordering, cursor=None, page_size=PAGE_SIZE):
+    """
+    Return one page of ``queryset`` without counting the table. The last
+    ordering field must be unique so that cursors are unambiguous.
+    """
+    rows = list(keyset_queryset(queryset, ordering, cursor)[:page_size + 1])
+    return _to_page(rows, ordering, page_size)
+
+
+async def akeyset_page(queryset, ordering, cursor=None, page_size=PAGE_SIZE):
+    """
+    Async version of ``keyset_page``.
+    """
+    rows = [row async for row in keyset_queryset(queryset, ordering, cursor)[:page_size + 1]]
+    return _to_page(rows, ordering, page_size)
+
+
+def page_size_from(request):
+    try:
+        size = int(request.GET.get('page_size', PAGE_SIZE))
+    except ValueError:
+        return PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def estimated_row_count(model, using='default'):
+    """
+    Estimate the number of rows of ``model``'s table without scanning it:
+    from the planner statistics, or else from the highest integer primary
+    key. Returns None when neither is available.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone():
+                # Filled in by ANALYZE; the first number is the table's row count
+                cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s ORDER BY idx IS NULL DESC", [table])
+                row = cursor.fetchone()
+                if row:
+                    return int(row[0].split()[0])
+        elif connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples FROM pg_class WHERE relname = %s", [table])
+            row = cursor.fetchone()
+            if row and row[0] >= 0:
+                return int(row[0])
+    if model._meta.pk.get_internal_type() in ('AutoField', 'BigAutoField'):
+        return model._default_manager.using(using).aggregate(last=Max('pk'))['last']
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that never counts more than ``EXACT_COUNT_LIMIT`` rows. A
+    larger unfiltered table reports its estimated size; a larger filtered
+    result reports the limit, so only its first pages can be reached.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        exact = queryset[:EXACT_COUNT_LIMIT + 1].count()
+        if exact <= EXACT_COUNT_LIMIT:
+            return exact
+        if not queryset.query.has_filters():
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate:
+                return max(estimate, exact)
+        return EXACT_COUNT_LIMIT
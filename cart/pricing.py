@@ -0,0 +1,123 @@
+from collections import namedtuple
+from decimal import Decimal
+
+from .models import Product
+from .money import Money, percent_of
+
+
+# Constants for tax and shipping
+TAX_RATE = Decimal('0.10')  # 10% tax as Decimal
+FREE_SHIPPING_THRESHOLD = Decimal('100.00')
+FLAT_SHIPPING_RATE = Decimal('10.00')
+
+# Above this many distinct products it is cheaper to read the whole price
+# column in one pass than to send several ``id IN (...)`` batches.
+PRICE_LOOKUP_BATCH_SIZE = 500
+
+HUNDRED = Decimal('100')
+
+# The constants above as used by the integer-cents path
+TAX_PERCENT = TAX_RATE * HUNDRED
+FREE_SHIPPING_THRESHOLD_CENTS = Money.from_decimal(FREE_SHIPPING_THRESHOLD).cents
+FLAT_SHIPPING_RATE_CENTS = Money.from_decimal(FLAT_SHIPPING_RATE).cents
+
+class PriceBreakdown(namedtuple('PriceBreakdown', [
+    'total_price',
+    'discount_percent',
+    'discount_amount',
+    'price_after_discount',
+    'tax_amount',
+    'shipping_cost',
+    'final_total',
+])):
+    """
+    Cart totals. The amounts are ``Money``; ``discount_percent`` is a ``Decimal``.
+    """
+    __slots__ = ()
+
+    def as_decimals(self):
+        """
+        Return the fields as a dict with every amount as a two-place ``Decimal``.
+        """
+        return {
+            name: value.to_decimal() if isinstance(value, Money) else value
+            for name, value in zip(self._fields, self)
+        }
+
+
+def breakdown(subtotal, discount_percent=0):
+    """
+    Apply discount, tax and shipping to a ``Money`` subtotal. The discount
+    and the tax on the discounted amount are each rounded half up to the
+    cent, so the parts always add up to the final total.
+    """
+    # Worked in plain integer cents; only the results are wrapped as Money
+    discount_percent = Decimal(discount_percent or 0)
+    total_cents = subtotal.cents
+    discount_cents = percent_of(total_cents, discount_percent) if discount_percent else 0
+    after_discount_cents = total_cents - discount_cents
+
+    tax_cents = percent_of(after_discount_cents, TAX_PERCENT)
+
+    # Dynamic shipping cost based on total price after discount
+    if after_discount_cents >= FREE_SHIPPING_THRESHOLD_CENTS:
+        shipping_cents = 0  # Free shipping
+    else:
+        shipping_cents = FLAT_SHIPPING_RATE_CENTS  # Flat rate shipping
+
+    final_cents = after_discount_cents + tax_cents + shipping_cents
+    return PriceBreakdown(
+        subtotal, discount_percent, Money(discount_cents), Money(after_discount_cents),
+        Money(tax_cents), Money(shipping_cents), Money(final_cents),
+    )
+
+
+def price_breakdown(total_price, discount_percent=0):
+    """
+    Apply discount, tax and shipping to a ``Decimal`` cart subtotal.
+    """
+    return breakdown(Money.from_decimal(total_price), discount_percent)
+
+
+def load_prices(product_ids):
+    """
+    Return a product_id -> price dict for the given ids using one query.
+    """
+    product_ids = set(product_ids)
+    if not product_ids:
+        return {}
+    if len(product_ids) <= PRICE_LOOKUP_BATCH_SIZE:
+        rows = Product.objects.filter(id__in=product_ids).values_list('id', 'price')
+        return dict(rows)
+    rows = Product.objects.values_list('id', 'price').iterator(chunk_size=10000)
+    return {product_id: price for product_id, price in rows if product_id in product_ids}
+
+
+def price_carts(lines, discount_percents=None, prices=None):
+    """
+    Price many carts at once.
+
+    ``lines`` is an iterable of ``(cart_id, product_id, quantity)`` tuples and
+    ``discount_percents`` an optional cart_id -> percent mapping. Prices are
+    loaded with ``load_prices`` unless a ready product_id -> price mapping is
+    passed in. Lines for products that no longer exist are ignored.
+    Returns a cart_id -> ``PriceBreakdown`` dict.
+    """
+    lines = list(lines)
+    if prices is None:
+        prices = load_prices(product_id for _, product_id, _ in lines)
+    discount_percents = discount_percents or {}
+    # Lines are summed in integer cents; each price is converted once
+    cents = {product_id: Money.from_decimal(price).cents for product_id, price in prices.items()}
+
+    subtotals = {}
+    for cart_id, product_id, quantity in lines:
+        price = cents.get(product_id)
+        if price is None:
+            continue
+        subtotals[cart_id] = subtotals.get(cart_id, 0) + price * quantity
+
+    return {
+        cart_id: breakdown(Money(subtotal), discount_percents.get(cart_id, 0))
+        for cart_id, subtotal in subtotals.items()
+    }
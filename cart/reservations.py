@@ -0,0 +1,160 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Product, StockReservation
+from . import catalog
+
+
+RESERVATION_TTL = timedelta(seconds=getattr(settings, 'CART_RESERVATION_TTL', 15 * 60))
+SWEEP_BATCH_SIZE = 1000
+
+
+class InsufficientStock(Exception):
+    """
+    Raised when a hold cannot be placed because too few units are available.
+    """
+
+    def __init__(self, products):
+        self.products = products
+        names = ', '.join(product.name for product in products)
+        super().__init__(f"Not enough stock available for: {names}.")
+
+
+def cart_holder(cart_id):
+    return f'cart:{cart_id}'
+
+
+def session_holder(session_key):
+    return f'session:{session_key}'
+
+
+def holder_for(request, cart=None):
+    """
+    Return the holder key for the current cart: the user's active cart, or
+    the guest's session. The guest key is remembered in the session so it
+    survives the key rotation on login.
+    """
+    if cart is not None:
+        return cart_holder(cart.id)
+    holder = request.session.get('reservation_holder')
+    if holder is None:
+        if not request.session.session_key:
+            request.session.save()
+        holder = session_holder(request.session.session_key)
+        request.session['reservation_holder'] = holder
+    return holder
+
+
+def held_quantity(holder):
+    """
+    Expression for the quantity ``holder`` currently holds of the outer product.
+    """
+    held = StockReservation.objects.filter(holder=holder, product=OuterRef('pk')).values('quantity')[:1]
+    return Coalesce(Subquery(held), Value(0))
+
+
+def _per_product(quantities):
+    return Case(
+        *[When(id=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+        output_field=IntegerField(),
+    )
+
+
+def _release_expression(reservations):
+    """
+    Expression for the total quantity of ``reservations`` per outer product.
+    """
+    total = reservations.filter(product=OuterRef('pk')).order_by().values('product').annotate(
+        total=Sum('quantity')
+    ).values('total')
+    return Coalesce(Subquery(total), Value(0))
+
+
+def reserve_many(holder, quantities):
+    """
+    Set the holds of ``holder`` to the given product_id -> quantity amounts
+    and restart their TTL. A quantity of 0 releases the hold.
+
+    Growing holds are guarded by ``stock >= reserved + delta`` in the same
+    UPDATE that applies them, so availability is never oversubscribed. If any
+    product is short, nothing changes and ``InsufficientStock`` is raised.
+    """
+    if not quantities:
+        return
+    with transaction.atomic():
+        delta = _per_product(quantities) - held_quantity(holder)
+        updated = Product.objects.filter(id__in=quantities.keys()).alias(delta=delta).filter(
+            Q(delta__lte=0) | Q(stock__gte=F('reserved') + F('delta'))
+        ).update(reserved=F('reserved') + delta)
+        if updated != len(quantities):
+            products = Product.objects.filter(id__in=quantities.keys()).annotate(held=held_quantity(holder))
+            short = [p for p in products if p.stock - p.reserved + p.held < quantities[p.id]]
+            raise InsufficientStock(short)
+
+        expires_at = timezone.now() + RESERVATION_TTL
+        StockReservation.objects.bulk_create(
+            [
+                StockReservation(holder=holder, product_id=product_id, quantity=quantity, expires_at=expires_at)
+                for product_id, quantity in quantities.items() if quantity > 0
+            ],
+            update_conflicts=True,
+            unique_fields=['holder', 'product'],
+            update_fields=['quantity', 'expires_at'],
+        )
+        released = [product_id for product_id, quantity in quantities.items() if quantity <= 0]
+        if released:
+            StockReservation.objects.filter(holder=holder, product_id__in=released).delete()
+        transaction.on_commit(lambda: catalog.invalidate_products(quantities.keys()))
+
+
+def reserve(holder, product_id, quantity):
+    reserve_many(holder, {product_id: quantity})
+
+
+def _release(reservations):
+    """
+    Delete ``reservations`` and give their units back to the products.
+    """
+    with transaction.atomic():
+        updated = Product.objects.filter(id__in=reservations.values('product_id')).update(
+            reserved=F('reserved') - _release_expression(reservations)
+        )
+        if not updated:
+            return 0
+        # The UPDATE above holds the write lock, so these are exactly the
+        # rows it just accounted for.
+        product_ids = list(reservations.values_list('product_id', flat=True).distinct())
+        deleted, _ = reservations.delete()
+        transaction.on_commit(lambda: catalog.invalidate_products(product_ids))
+    return deleted
+
+
+def release(holder, product_ids=None):
+    """
+    Drop the holds of ``holder``, optionally only for ``product_ids``.
+    """
+    reservations = StockReservation.objects.filter(holder=holder)
+    if product_ids is not None:
+        reservations = reservations.filter(product_id__in=product_ids)
+    return _release(reservations)
+
+
+def sweep_expired(batch_size=SWEEP_BATCH_SIZE, now=None):
+    """
+    Release expired holds in batches of ``batch_size``. Returns the number
+    of holds released.
+    """
+    now = now or timezone.now()
+    released = 0
+    while True:
+        ids = list(
+            StockReservation.objects.filter(expires_at__lt=now).order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return released
+        released += _release(StockReservation.objects.filter(id__in=ids, expires_at__lt=now))
@@ -0,0 +1,96 @@
+"""
+Retention: delete abandoned carts with their items, expired sessions (and
+the guest carts inside them) and finished tasks.
+
+Each target is walked in primary key order ``batch_size`` rows at a time
+and every batch is deleted with one range-bounded DELETE per table in its
+own short transaction, with a pause in between so writers waiting on the
+SQLite lock get their turn.
+"""
+import time
+from datetime import timedelta
+from importlib import import_module
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Cart, Task
+from . import summary
+
+
+CART_RETENTION_DAYS = 30
+TASK_RETENTION_DAYS = 7
+PURGE_BATCH_SIZE = 1000
+PURGE_PAUSE_SECONDS = 0.1
+
+
+def summarize_inactive_carts(batch_size=PURGE_BATCH_SIZE):
+    """
+    Build the missing summaries of inactive carts, so every inactive cart has
+    a last change time; one never summarized counts as changed now. Returns
+    the number of summaries built.
+    """
+    built = 0
+    last_pk = 0
+    while True:
+        keys = list(
+            Cart.objects.filter(is_active=False, summary__isnull=True, pk__gt=last_pk)
+            .order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not keys:
+            return built
+        built += len(summary.rebuild_summaries(keys, batch_size=batch_size))
+        last_pk = keys[-1]
+
+
+def abandoned_carts(days=CART_RETENTION_DAYS, now=None):
+    """
+    Inactive carts nobody changed in ``days`` days: checked-out carts and
+    carts the user switched away from. Their summary records the last change;
+    carts without one are left alone, see ``summarize_inactive_carts``.
+    """
+    cutoff = (now or timezone.now()) - timedelta(days=days)
+    return Cart.objects.filter(is_active=False, summary__updated_at__lt=cutoff)
+
+
+def expired_sessions(now=None):
+    """
+    Expired sessions, or None when sessions are not stored in the database.
+    """
+    store = import_module(settings.SESSION_ENGINE).SessionStore
+    if not hasattr(store, 'get_model_class'):
+        return None
+    return store.get_model_class().objects.filter(expire_date__lt=now or timezone.now())
+
+
+def finished_tasks(days=TASK_RETENTION_DAYS, now=None):
+    cutoff = (now or timezone.now()) - timedelta(days=days)
+    return Task.objects.filter(status=Task.DONE, finished_at__lt=cutoff)
+
+
+def purge(queryset, batch_size=PURGE_BATCH_SIZE, pause=PURGE_PAUSE_SECONDS, dry_run=False, on_batch=None):
+    """
+    Delete the rows of ``queryset`` and whatever cascades from them in
+    primary key ranges of at most ``batch_size`` matching rows. With
+    ``dry_run`` the rows are only counted. Returns a model label -> rows
+    dict; ``on_batch(deleted)`` gets the running totals after each batch.
+    """
+    deleted = {}
+    last_pk = None
+    while True:
+        page = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        keys = list(page.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not keys:
+            return deleted
+        if dry_run:
+            counts = {queryset.model._meta.label: len(keys)}
+        else:
+            _, counts = queryset.filter(pk__gte=keys[0], pk__lte=keys[-1]).delete()
+        for label, count in counts.items():
+            deleted[label] = deleted.get(label, 0) + count
+        last_pk = keys[-1]
+        if on_batch:
+            on_batch(deleted)
+        if len(keys) < batch_size:
+            return deleted
+        time.sleep(pause)
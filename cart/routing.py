@@ -0,0 +1,90 @@
+"""
+Send the queries of read-only views to the ``replica`` database alias.
+
+Views opt in with ``@read_only``. While one runs, reads go to the replica
+if it is configured; writes (sessions, for instance) always go to
+``default``. Without a replica alias everything stays on ``default``.
+"""
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.db import connections
+
+
+REPLICA = 'replica'
+
+_read_only = ContextVar('read_only_view', default=False)
+
+
+def read_only(view):
+    """
+    Decorator routing the reads of a sync or async view to the replica.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(*args, **kwargs):
+            token = _read_only.set(True)
+            try:
+                response = await view(*args, **kwargs)
+            finally:
+                _read_only.reset(token)
+            if response.streaming and response.is_async:
+                response.streaming_content = _aread_only_chunks(response.streaming_content)
+            return response
+    else:
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            token = _read_only.set(True)
+            try:
+                response = view(*args, **kwargs)
+            finally:
+                _read_only.reset(token)
+            if response.streaming and not response.is_async:
+                response.streaming_content = _read_only_chunks(response.streaming_content)
+            return response
+    return wrapper
+
+
+def _read_only_chunks(content):
+    # Streamed rows are queried after the view returns
+    iterator = iter(content)
+    while True:
+        token = _read_only.set(True)
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            _read_only.reset(token)
+        yield chunk
+
+
+async def _aread_only_chunks(content):
+    iterator = aiter(content)
+    while True:
+        token = _read_only.set(True)
+        try:
+            chunk = await anext(iterator)
+        except StopAsyncIteration:
+            return
+        finally:
+            _read_only.reset(token)
+        yield chunk
+
+
+class ReadReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _read_only.get() and REPLICA in connections.settings:
+            return REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica is the same database, so objects from both may relate
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA
@@ -0,0 +1,173 @@
+import re
+import time
+
+from django.core.cache import cache
+from django.db import connection, connections
+from django.db.models.expressions import RawSQL
+
+from .models import Product
+
+
+FTS_TABLE = 'cart_product_fts'
+SEARCH_VERSION_KEY = 'search:version'
+AUTOCOMPLETE_TIMEOUT = 60 * 10
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# SQLite drops a table's triggers whenever a migration rebuilds the table,
+# so these are re-created after every migrate run (see ensure_triggers).
+TRIGGERS = {
+    'cart_product_fts_ai': f"""
+        CREATE TRIGGER IF NOT EXISTS cart_product_fts_ai AFTER INSERT ON cart_product BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, name) VALUES (new.id, new.name);
+        END
+    """,
+    'cart_product_fts_ad': f"""
+        CREATE TRIGGER IF NOT EXISTS cart_product_fts_ad AFTER DELETE ON cart_product BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name) VALUES ('delete', old.id, old.name);
+        END
+    """,
+    'cart_product_fts_au': f"""
+        CREATE TRIGGER IF NOT EXISTS cart_product_fts_au AFTER UPDATE OF name ON cart_product BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name) VALUES ('delete', old.id, old.name);
+            INSERT INTO {FTS_TABLE}(rowid, name) VALUES (new.id, new.name);
+        END
+    """,
+}
+
+
+def fts_enabled():
+    return connection.vendor == 'sqlite'
+
+
+def search_version():
+    version = cache.get(SEARCH_VERSION_KEY)
+    if version is None:
+        cache.add(SEARCH_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(SEARCH_VERSION_KEY)
+    return version
+
+
+def bump_search_version():
+    """
+    Drop cached autocomplete results. The index itself is kept current by
+    database triggers, so this only needs calling once per write batch.
+    """
+    cache.set(SEARCH_VERSION_KEY, time.time_ns(), None)
+
+
+def tokenize(query):
+    return _TOKEN_RE.findall(query.lower())[:8]
+
+
+def match_expression(tokens, prefix=False):
+    """
+    Build an FTS5 MATCH expression that ANDs the tokens together. Tokens are
+    quoted so user input can never be parsed as FTS syntax; with ``prefix``
+    the last token also matches as a prefix.
+    """
+    terms = [f'"{token}"' for token in tokens]
+    if prefix and terms:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def _ranked_rows(tokens, limit, prefix=False):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid, name FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s ORDER BY rank LIMIT %s",
+            [match_expression(tokens, prefix), limit],
+        )
+        return cursor.fetchall()
+
+
+def search_products(query, limit=50):
+    """
+    Return the products matching ``query``, best match first.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+    if not fts_enabled():
+        products = Product.objects.all()
+        for token in tokens:
+            products = products.filter(name__icontains=token)
+        return list(products.order_by('id')[:limit])
+
+    ids = [row[0] for row in _ranked_rows(tokens, limit)]
+    products = Product.objects.in_bulk(ids)
+    return [products[product_id] for product_id in ids if product_id in products]
+
+
+def filter_products(queryset, query):
+    """
+    Narrow a product queryset to the products whose name matches every
+    word of ``query``, the last one as a prefix, through the index.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return queryset
+    if not fts_enabled():
+        for token in tokens:
+            queryset = queryset.filter(name__icontains=token)
+        return queryset
+    return queryset.filter(id__in=RawSQL(
+        f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match_expression(tokens, prefix=True)]
+    ))
+
+
+def autocomplete(query, limit=8):
+    """
+    Return up to ``limit`` ``{'id', 'name'}`` suggestions for a partially
+    typed query, served from the cache when the same prefix was asked for
+    since the last catalog write.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+    key = f"search:complete:{search_version()}:{limit}:{'+'.join(tokens)}"
+    suggestions = cache.get(key)
+    if suggestions is not None:
+        return suggestions
+
+    if fts_enabled():
+        rows = _ranked_rows(tokens, limit, prefix=True)
+    else:
+        products = Product.objects.filter(name__istartswith=tokens[0])
+        rows = products.order_by('name').values_list('id', 'name')[:limit]
+    suggestions = [{'id': product_id, 'name': name} for product_id, name in rows]
+    cache.set(key, suggestions, AUTOCOMPLETE_TIMEOUT)
+    return suggestions
+
+
+def ensure_triggers(using='default'):
+    """
+    Re-create any sync trigger a table rebuild dropped and reindex, since
+    writes made while a trigger was missing never reached the index.
+    """
+    conn = connections[using]
+    if conn.vendor != 'sqlite':
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT type, name FROM sqlite_master WHERE name = %s OR name LIKE 'cart_product_fts_a_'",
+            [FTS_TABLE],
+        )
+        existing = {name for _, name in cursor.fetchall()}
+        if FTS_TABLE not in existing:
+            return
+        missing = [name for name in TRIGGERS if name not in existing]
+        for name in missing:
+            cursor.execute(TRIGGERS[name])
+        if missing:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def rebuild_index():
+    """
+    Rebuild the full-text index from the product table in one statement.
+    """
+    if fts_enabled():
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    bump_search_version()
@@ -0,0 +1,137 @@
+from django.db import transaction
+
+from .models import Product, Cart, CartItem, StockReservation
+from . import reservations, summary
+
+
+SESSION_KEY = 'cart'
+# Older sessions stored {product_id: {'quantity': ..., 'price': ...}} here
+LEGACY_SESSION_KEY = 'cart_items'
+
+
+def pack(items):
+    """
+    Encode a product_id -> quantity dict as ``"12:3,45:1"``.
+    """
+    return ','.join(f'{product_id}:{quantity}' for product_id, quantity in items.items())
+
+
+def unpack(packed):
+    items = {}
+    for pair in filter(None, (packed or '').split(',')):
+        try:
+            product_id, quantity = pair.split(':')
+            items[int(product_id)] = int(quantity)
+        except ValueError:
+            continue
+    return items
+
+
+class SessionCart:
+    """
+    Guest cart kept in the session as packed id:quantity pairs.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self._items = unpack(session.get(SESSION_KEY))
+        legacy = session.get(LEGACY_SESSION_KEY)
+        if legacy is not None:
+            for product_id, item in legacy.items():
+                self._items.setdefault(int(product_id), item['quantity'])
+            del session[LEGACY_SESSION_KEY]
+            self._save()
+
+    def _save(self):
+        if self._items:
+            self.session[SESSION_KEY] = pack(self._items)
+        else:
+            self.session.pop(SESSION_KEY, None)
+
+    def items(self):
+        return dict(self._items)
+
+    def get(self, product_id, default=0):
+        return self._items.get(product_id, default)
+
+    def __contains__(self, product_id):
+        return product_id in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def total_quantity(self):
+        return sum(self._items.values())
+
+    def set(self, product_id, quantity):
+        self._items[product_id] = quantity
+        self._save()
+
+    def remove(self, product_id):
+        if self._items.pop(product_id, None) is not None:
+            self._save()
+
+    def clear(self):
+        self._items = {}
+        self._save()
+
+
+def merge_session_cart(request, user):
+    """
+    Move the guest cart in ``request.session`` into the user's active cart
+    in one transaction: one product query, one cart item query, then bulk
+    updates and inserts. Quantities are clamped to what is available.
+    Returns the list of products whose quantity had to be reduced.
+    """
+    session_cart = SessionCart(request.session)
+    guest_items = session_cart.items()
+    if not guest_items:
+        return []
+
+    guest_holder = request.session.get('reservation_holder')
+    with transaction.atomic():
+        cart = Cart.objects.filter(user=user, is_active=True).first()
+        if cart is None:
+            cart = Cart.objects.create(user=user, is_active=True)
+        cart_holder = reservations.cart_holder(cart.id)
+
+        # Give the guest's own holds back first so they count as available
+        if guest_holder:
+            reservations.release(guest_holder)
+        products = Product.objects.in_bulk(guest_items.keys())
+        existing = {
+            item.product_id: item
+            for item in CartItem.objects.filter(cart=cart, product_id__in=products.keys())
+        }
+        held = dict(
+            StockReservation.objects.filter(holder=cart_holder, product_id__in=products.keys())
+            .values_list('product_id', 'quantity')
+        )
+
+        clamped = []
+        holds = {}
+        to_create = []
+        to_update = []
+        for product_id, product in products.items():
+            current = existing[product_id].quantity if product_id in existing else 0
+            limit = product.available + held.get(product_id, 0)
+            quantity = min(current + guest_items[product_id], limit)
+            if quantity < current + guest_items[product_id]:
+                clamped.append(product)
+            if quantity <= current:
+                continue
+            holds[product_id] = quantity
+            if product_id in existing:
+                existing[product_id].quantity = quantity
+                to_update.append(existing[product_id])
+            else:
+                to_create.append(CartItem(cart=cart, product=product, quantity=quantity))
+
+        reservations.reserve_many(cart_holder, holds)
+        CartItem.objects.bulk_update(to_update, ['quantity'])
+        CartItem.objects.bulk_create(to_create)
+        summary.rebuild_summaries([cart.id])
+
+    session_cart.clear()
+    request.session.pop('reservation_holder', None)
+    return clamped
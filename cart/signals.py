@@ -0,0 +1,111 @@
+import logging
+
+from django.contrib import messages
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Cart, DiscountCode, Product
+from . import active_cart, catalog, discounts, metrics, reservations, search, summary
+from .session_cart import merge_session_cart
+
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(pre_save, sender=Product)
+def remember_old_price(sender, instance, raw=False, **kwargs):
+    """
+    Keep the stored price around so post_save can tell whether it changed.
+    """
+    if raw or instance.pk is None:
+        instance._old_price = None
+        return
+    instance._old_price = Product.objects.filter(pk=instance.pk).values_list('price', flat=True).first()
+
+
+@receiver(post_save, sender=Product)
+def reprice_cart_summaries(sender, instance, created=False, raw=False, **kwargs):
+    """
+    Refresh the summaries of carts holding a product whose price changed.
+    """
+    if raw or created:
+        return
+    old_price = getattr(instance, '_old_price', None)
+    if old_price is not None and old_price != instance.price:
+        summary.reprice_products([instance.pk])
+
+
+def _invalidate_catalog(product_id):
+    catalog.bump_catalog_version()
+    catalog.invalidate_products([product_id])
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_catalog_cache(sender, instance, **kwargs):
+    """
+    Bump the catalog version right away and again once the transaction
+    commits, so a reader that cached the pre-commit row cannot keep it.
+    """
+    _invalidate_catalog(instance.pk)
+    transaction.on_commit(lambda: _invalidate_catalog(instance.pk))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_autocomplete(sender, instance, **kwargs):
+    search.bump_search_version()
+
+
+@receiver(post_migrate)
+def restore_search_triggers(sender, using='default', **kwargs):
+    if sender.name == 'cart':
+        search.ensure_triggers(using)
+
+
+@receiver(post_save, sender=DiscountCode)
+@receiver(post_delete, sender=DiscountCode)
+def invalidate_discount_cache(sender, instance, **kwargs):
+    discounts.invalidate(instance.code)
+    transaction.on_commit(lambda: discounts.invalidate(instance.code))
+
+
+@receiver(post_save, sender=Cart)
+@receiver(post_delete, sender=Cart)
+def invalidate_active_cart(sender, instance, **kwargs):
+    """
+    Make session pointers to the owner's active cart revalidate, now and
+    once the transaction commits.
+    """
+    active_cart.invalidate(instance.user_id)
+    transaction.on_commit(lambda: active_cart.invalidate(instance.user_id))
+
+
+@receiver(user_logged_in)
+def merge_guest_cart(sender, request, user, **kwargs):
+    """
+    Carry the guest's session cart over into their active cart on login.
+    """
+    if request is None or not hasattr(request, 'session'):
+        return
+    try:
+        clamped = merge_session_cart(request, user)
+    except reservations.InsufficientStock:
+        # Stock moved between the availability read and the hold; keep the
+        # guest cart in the session rather than failing the login.
+        logger.warning("Could not merge guest cart for user %s", user.pk, exc_info=True)
+        return
+    if clamped and hasattr(request, '_messages'):
+        names = ', '.join(product.name for product in clamped)
+        messages.warning(request, f"Some quantities were reduced to the available stock: {names}.")
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    """
+    Count every query on every database connection in the request metrics.
+    """
+    metrics.install(connection)
@@ -0,0 +1,105 @@
+import json
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+
+STREAM_CHUNK_SIZE = 500
+ROWS_MARKER = '<!-- stream:rows -->'
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+async def achunked(iterable, size):
+    chunk = []
+    async for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _json_chunk(chunk, serialize, first):
+    body = ','.join(json.dumps(serialize(row), cls=DjangoJSONEncoder) for row in chunk)
+    return body if first else ',' + body
+
+
+def _split_page(request, template_name, context):
+    page = render_to_string(template_name, {**context, 'stream_rows': mark_safe(ROWS_MARKER)}, request)
+    return page.split(ROWS_MARKER, 1)
+
+
+def stream_json(rows, serialize, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Stream ``rows`` as a JSON array, ``chunk_size`` serialized rows at a time.
+    """
+    def generate():
+        yield '['
+        first = True
+        for chunk in chunked(rows, chunk_size):
+            yield _json_chunk(chunk, serialize, first)
+            first = False
+        yield ']'
+    return StreamingHttpResponse(generate(), content_type='application/json')
+
+
+def astream_json(rows, serialize, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    ``stream_json`` for an async iterable of ``rows``, for async views.
+    """
+    async def generate():
+        yield '['
+        first = True
+        async for chunk in achunked(rows, chunk_size):
+            yield _json_chunk(chunk, serialize, first)
+            first = False
+        yield ']'
+    return StreamingHttpResponse(generate(), content_type='application/json')
+
+
+def stream_template(request, template_name, context, rows, rows_template, rows_name,
+                    chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Stream a page whose ``stream_rows`` placeholder is filled with ``rows``.
+
+    The page is rendered once around a marker; the part before the marker is
+    sent straight away and the rows follow in chunks rendered with
+    ``rows_template``, so the first byte leaves before the last row is read.
+    """
+    head, tail = _split_page(request, template_name, context)
+
+    def generate():
+        yield head
+        for chunk in chunked(rows, chunk_size):
+            yield render_to_string(rows_template, {rows_name: chunk})
+        yield tail
+    return StreamingHttpResponse(generate(), content_type='text/html; charset=utf-8')
+
+
+def astream_template(request, template_name, context, rows, rows_template, rows_name,
+                     chunk_size=STREAM_CHUNK_SIZE):
+    """
+    ``stream_template`` for an async iterable of ``rows``, for async views.
+    ``context`` must already hold everything the page needs, since the
+    page is rendered on the event loop.
+    """
+    head, tail = _split_page(request, template_name, context)
+
+    async def generate():
+        yield head
+        async for chunk in achunked(rows, chunk_size):
+            yield render_to_string(rows_template, {rows_name: chunk})
+        yield tail
+    return StreamingHttpResponse(generate(), content_type='text/html; charset=utf-8')
@@ -0,0 +1,139 @@
+from decimal import Decimal
+
+from django.db.models import DecimalField, F, Sum
+from django.utils import timezone
+
+from .models import Cart, CartItem, CartSummary
+
+
+def apply_delta(cart_id, quantity_delta, amount_delta, expected_version=None):
+    """
+    Shift a cart's summary by the given item count and amount. A missing
+    summary is rebuilt from the cart items instead.
+
+    With ``expected_version`` the update only applies while the summary is
+    still at that version; returns False if it has moved on.
+    """
+    summaries = CartSummary.objects.filter(cart_id=cart_id)
+    if expected_version is not None:
+        summaries = summaries.filter(price_version=expected_version)
+    updated = summaries.update(
+        item_count=F('item_count') + quantity_delta,
+        subtotal=F('subtotal') + amount_delta,
+        price_version=F('price_version') + 1,
+        updated_at=timezone.now(),
+    )
+    if not updated:
+        if expected_version is not None:
+            return False
+        rebuild_summaries([cart_id])
+    return True
+
+
+def reset(cart_id):
+    """
+    Mark a cart's summary as empty, e.g. after it was cleared or checked out.
+    """
+    updated = CartSummary.objects.filter(cart_id=cart_id).update(
+        item_count=0,
+        subtotal=Decimal('0.00'),
+        price_version=F('price_version') + 1,
+        updated_at=timezone.now(),
+    )
+    if not updated:
+        CartSummary.objects.create(cart_id=cart_id)
+
+
+def get_summary(cart):
+    """
+    Return the summary for a cart, building it on first access.
+    """
+    try:
+        return CartSummary.objects.get(cart_id=cart.id)
+    except CartSummary.DoesNotExist:
+        rebuild_summaries([cart.id])
+        return CartSummary.objects.get(cart_id=cart.id)
+
+
+def compute_totals(cart_ids):
+    """
+    Aggregate the real item count and subtotal for the given carts.
+    Returns a cart_id -> (item_count, subtotal) dict; empty carts are omitted.
+    """
+    rows = CartItem.objects.filter(cart_id__in=cart_ids).values('cart_id').annotate(
+        item_count=Sum('quantity'),
+        subtotal=Sum(
+            F('quantity') * F('product__price'),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+    ).order_by()
+    return {row['cart_id']: (row['item_count'], row['subtotal']) for row in rows}
+
+
+def _cart_batches(cart_ids, batch_size):
+    """
+    Yield lists of existing cart ids, at most ``batch_size`` at a time.
+    """
+    if cart_ids is None:
+        last_id = 0
+        while True:
+            batch = list(
+                Cart.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size]
+            )
+            if not batch:
+                return
+            last_id = batch[-1]
+            yield batch
+    else:
+        cart_ids = sorted(set(cart_ids))
+        for start in range(0, len(cart_ids), batch_size):
+            chunk = cart_ids[start:start + batch_size]
+            yield list(Cart.objects.filter(id__in=chunk).order_by('id').values_list('id', flat=True))
+
+
+def rebuild_summaries(cart_ids=None, batch_size=1000, dry_run=False):
+    """
+    Recompute summaries from the cart items in batches of ``batch_size`` carts.
+
+    With ``cart_ids=None`` every cart is checked. Returns a list of
+    ``(cart_id, stored, actual)`` tuples for summaries that had drifted or
+    were missing; with ``dry_run`` nothing is written.
+    """
+    drift = []
+    for batch in _cart_batches(cart_ids, batch_size):
+        actual = compute_totals(batch)
+        stored = {summary.cart_id: summary for summary in CartSummary.objects.filter(cart_id__in=batch)}
+        to_create = []
+        to_update = []
+        for cart_id in batch:
+            item_count, subtotal = actual.get(cart_id, (0, Decimal('0.00')))
+            summary = stored.get(cart_id)
+            if summary is None:
+                drift.append((cart_id, None, (item_count, subtotal)))
+                to_create.append(CartSummary(cart_id=cart_id, item_count=item_count, subtotal=subtotal))
+            elif summary.item_count != item_count or summary.subtotal != subtotal:
+                drift.append((cart_id, (summary.item_count, summary.subtotal), (item_count, subtotal)))
+                summary.item_count = item_count
+                summary.subtotal = subtotal
+                summary.price_version += 1
+                summary.updated_at = timezone.now()
+                to_update.append(summary)
+
+        if not dry_run:
+            CartSummary.objects.bulk_create(to_create, ignore_conflicts=True)
+            CartSummary.objects.bulk_update(
+                to_update, ['item_count', 'subtotal', 'price_version', 'updated_at']
+            )
+    return drift
+
+
+def reprice_products(product_ids):
+    """
+    Refresh the summaries of every cart holding one of ``product_ids``.
+    Called after product prices change.
+    """
+    cart_ids = set(
+        CartItem.objects.filter(product_id__in=product_ids).values_list('cart_id', flat=True)
+    )
+    if cart_ids:
+        rebuild_summaries(cart_ids)
@@ -0,0 +1,174 @@
+"""
+A small durable task queue backed by the ``Task`` table.
+
+``enqueue`` inserts the task in the caller's transaction, so it becomes
+visible to workers only when that transaction commits and disappears with
+it on rollback. The ``run_tasks`` worker claims due tasks in batches with
+one guarded UPDATE that also enforces the queue's concurrency limit, and
+holds them under a lease. A worker that dies mid-task leaves a lease that
+runs out; the task is then claimed again. Failed tasks are retried with
+exponential backoff until ``max_attempts``.
+
+A handler runs in one transaction with the update that marks its task
+done, and that update only applies while the worker still holds the lease.
+Handlers that only write to the database therefore take effect once;
+anything else they do must be safe to repeat.
+"""
+import os
+import socket
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Task
+
+
+DEFAULT_QUEUE = 'default'
+DEFAULT_CONCURRENCY = 4
+CLAIM_BATCH_SIZE = 10
+LEASE_SECONDS = 60
+RETRY_BASE_SECONDS = 5
+RETRY_MAX_SECONDS = 3600
+
+HANDLERS = {}
+
+
+class LeaseLost(Exception):
+    """
+    Raised when a worker finishes a task whose lease another worker took over.
+    """
+
+
+def register(name, queue=DEFAULT_QUEUE):
+    """
+    Register the decorated function as the handler of tasks called
+    ``name``. It is called with the task's payload as keyword arguments.
+    """
+    def decorator(func):
+        HANDLERS[name] = (func, queue)
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, delay=0, max_attempts=5):
+    """
+    Queue a task for the registered handler ``name``. Call it inside the
+    transaction that makes the task necessary.
+    """
+    if name not in HANDLERS:
+        raise ValueError(f"No task handler registered as {name!r}.")
+    return Task.objects.create(
+        queue=HANDLERS[name][1],
+        name=name,
+        payload=payload or {},
+        max_attempts=max_attempts,
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def concurrency(queue):
+    return getattr(settings, 'TASK_QUEUE_CONCURRENCY', {}).get(queue, DEFAULT_CONCURRENCY)
+
+
+def worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+def _claimable(now):
+    return Q(status=Task.PENDING, run_after__lte=now) | Q(status=Task.RUNNING, leased_until__lt=now)
+
+
+def claim(queue, worker, batch_size=CLAIM_BATCH_SIZE, lease_seconds=LEASE_SECONDS):
+    """
+    Lease up to ``batch_size`` due tasks of ``queue`` to ``worker``, never
+    more than the queue's concurrency limit allows to run at once.
+    """
+    now = timezone.now()
+    running = Task.objects.filter(queue=queue, status=Task.RUNNING, leased_until__gte=now)
+    slots = min(batch_size, concurrency(queue) - running.count())
+    if slots <= 0:
+        return []
+    ids = list(
+        Task.objects.filter(_claimable(now), queue=queue).order_by('run_after', 'id').values_list('id', flat=True)[:slots]
+    )
+    if not ids:
+        return []
+    # The running count is taken again inside the UPDATE, so workers racing
+    # for the same queue cannot claim past the limit between the two reads
+    running_now = Coalesce(
+        Subquery(running.order_by().values('queue').annotate(count=Count('id')).values('count')),
+        Value(0),
+        output_field=IntegerField(),
+    )
+    Task.objects.filter(_claimable(now), id__in=ids).alias(running=running_now).filter(
+        running__lte=concurrency(queue) - len(ids)
+    ).update(
+        status=Task.RUNNING,
+        locked_by=worker,
+        leased_until=now + timedelta(seconds=lease_seconds),
+        attempts=F('attempts') + 1,
+    )
+    return list(Task.objects.filter(id__in=ids, status=Task.RUNNING, locked_by=worker).order_by('run_after', 'id'))
+
+
+def backoff(attempts):
+    return min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+
+
+def _held(task, worker):
+    return Task.objects.filter(id=task.id, status=Task.RUNNING, locked_by=worker)
+
+
+def _fail(task, worker, error):
+    now = timezone.now()
+    if task.attempts >= task.max_attempts:
+        changes = {'status': Task.FAILED, 'finished_at': now}
+    else:
+        changes = {'status': Task.PENDING, 'run_after': now + timedelta(seconds=backoff(task.attempts))}
+    _held(task, worker).update(leased_until=None, last_error=error, **changes)
+    return changes['status']
+
+
+def execute(task, worker):
+    """
+    Run one claimed task. Returns its new status, or None if the lease
+    was lost and the task's work was rolled back.
+    """
+    if task.attempts > task.max_attempts:
+        # Leases kept running out, e.g. the handler crashes its worker
+        return _fail(task, worker, "Lease expired too many times.")
+    handler = HANDLERS.get(task.name)
+    if handler is None:
+        return _fail(task, worker, f"No task handler registered as {task.name!r}.")
+    try:
+        with transaction.atomic():
+            handler[0](**task.payload)
+            finished = _held(task, worker).update(
+                status=Task.DONE, leased_until=None, finished_at=timezone.now(),
+            )
+            if not finished:
+                raise LeaseLost()
+    except LeaseLost:
+        return None
+    except Exception:
+        return _fail(task, worker, traceback.format_exc())
+    return Task.DONE
+
+
+def work(queues, worker, batch_size=CLAIM_BATCH_SIZE, lease_seconds=LEASE_SECONDS):
+    """
+    Claim and run one batch from each of ``queues``. Returns a status ->
+    count dict of the tasks run.
+    """
+    results = {}
+    for queue in queues:
+        for task in claim(queue, worker, batch_size, lease_seconds):
+            status = execute(task, worker)
+            results[status] = results.get(status, 0) + 1
+    return results
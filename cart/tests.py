@@ -1,7 +1,8 @@
-from django.test import TestCase, Client
+from asgiref.sync import sync_to_async
+from django.test import AsyncClient, TestCase, Client, override_settings
 from django.contrib.auth.models import User
 from decimal import Decimal
-from .models import Product, Cart, CartItem, DiscountCode
+from .models import Product, Cart, CartItem, DiscountCode, Order, OrderItem
 from django.urls import reverse
 
 
@@ -90,6 +91,9 @@ class CartTests(TestCase):
     def test_select_cart(self):
         # Create additional carts for testing selection
         cart1 = Cart.objects.create(user=self.user, name="Cart 1", is_active=False)
+        # A user has at most one active cart
+        self.cart.is_active = False
+        self.cart.save()
         cart2 = Cart.objects.create(user=self.user, name="Cart 2", is_active=True)
 
         # Select cart1 to activate it
@@ -99,3 +103,1600 @@ class CartTests(TestCase):
 
         self.assertTrue(cart1.is_active)
         self.assertFalse(cart2.is_active)
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='buyer', password='password')
+        self.client.login(username='buyer', password='password')
+        self.cart = Cart.objects.create(user=self.user, is_active=True)
+        self.product = Product.objects.create(name='Widget', price=Decimal('10.00'), stock=5)
+
+    def test_checkout_creates_order_and_deducts_stock(self):
+        CartItem.objects.create(cart=self.cart, product=self.product, quantity=3)
+        # A GET, e.g. from a cross-site <img>, never places an order
+        self.assertEqual(self.client.get(reverse('checkout')).status_code, 405)
+        self.assertFalse(Order.objects.exists())
+
+        response = self.client.post(reverse('checkout'))
+        self.assertEqual(response.status_code, 302)
+
+        order = Order.objects.get(user=self.user)
+        self.assertEqual(order.total_amount, Decimal('30.00'))
+        self.assertEqual(order.items.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 2)
+        self.cart.refresh_from_db()
+        self.assertFalse(self.cart.is_active)
+        self.assertFalse(CartItem.objects.filter(cart=self.cart).exists())
+
+    def test_checkout_reports_a_locked_database_as_busy(self):
+        from unittest import mock
+        from django.db import OperationalError
+        from . import checkout
+        CartItem.objects.create(cart=self.cart, product=self.product, quantity=1)
+        with mock.patch.object(checkout, '_decrement_stock', side_effect=OperationalError('database is locked')):
+            response = self.client.post(reverse('checkout'), follow=True)
+        self.assertRedirects(response, reverse('cart_detail'))
+        self.assertContains(response, 'The shop is busy right now.')
+        self.assertFalse(Order.objects.exists())
+        self.assertTrue(CartItem.objects.filter(cart=self.cart).exists())
+
+    def test_checkout_rejects_order_when_stock_ran_out(self):
+        other = Product.objects.create(name='Gadget', price=Decimal('5.00'), stock=10)
+        CartItem.objects.create(cart=self.cart, product=other, quantity=2)
+        CartItem.objects.create(cart=self.cart, product=self.product, quantity=3)
+        # Another buyer took the stock after the item was added to the cart
+        Product.objects.filter(id=self.product.id).update(stock=1)
+
+        response = self.client.post(reverse('checkout'))
+        self.assertRedirects(response, reverse('cart_detail'), fetch_redirect_response=False)
+        self.assertFalse(Order.objects.exists())
+        other.refresh_from_db()
+        self.assertEqual(other.stock, 10)
+        self.assertEqual(CartItem.objects.filter(cart=self.cart).count(), 2)
+
+    def test_checkout_query_count_does_not_grow_with_cart_size(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .checkout import place_order
+
+        def queries_for(lines):
+            user = User.objects.create_user(username=f'user{lines}', password='password')
+            cart = Cart.objects.create(user=user, is_active=True)
+            for i in range(lines):
+                product = Product.objects.create(name=f'P{lines}-{i}', price=Decimal('1.00'), stock=10)
+                CartItem.objects.create(cart=cart, product=product, quantity=1)
+            with CaptureQueriesContext(connection) as ctx:
+                place_order(user, cart)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(queries_for(1), queries_for(20))
+
+
+class PricingTests(TestCase):
+    def setUp(self):
+        self.cheap = Product.objects.create(name='Cheap', price=Decimal('10.00'), stock=10)
+        self.pricey = Product.objects.create(name='Pricey', price=Decimal('60.00'), stock=10)
+
+    def test_price_breakdown(self):
+        from .pricing import price_breakdown
+        totals = price_breakdown(Decimal('20.00'), '10.00').as_decimals()
+        self.assertEqual(totals['discount_amount'], Decimal('2.00'))
+        self.assertEqual(totals['tax_amount'], Decimal('1.80'))
+        self.assertEqual(totals['shipping_cost'], Decimal('10.00'))
+        self.assertEqual(totals['final_total'], Decimal('29.80'))
+
+    def test_price_carts_batches_many_carts_in_one_query(self):
+        from .pricing import price_carts
+        lines = [
+            (1, self.cheap.id, 2),
+            (2, self.pricey.id, 2),
+            (2, self.cheap.id, 1),
+            (3, 999999, 1),  # product no longer exists
+        ]
+        with self.assertNumQueries(1):
+            result = price_carts(lines, {2: Decimal('50')})
+        self.assertEqual(set(result), {1, 2})
+        self.assertEqual(result[1].final_total.to_decimal(), Decimal('32.00'))
+        self.assertEqual(result[2].total_price.to_decimal(), Decimal('130.00'))
+        self.assertEqual(result[2].price_after_discount.to_decimal(), Decimal('65.00'))
+        self.assertEqual(result[2].shipping_cost.to_decimal(), Decimal('10.00'))
+
+    def test_tax_and_discount_are_rounded_half_up_to_the_cent(self):
+        from .pricing import price_breakdown
+        # 10% off 12.35 is 1.235; tax on 11.11 is 1.111
+        totals = price_breakdown(Decimal('12.35'), '10').as_decimals()
+        self.assertEqual(totals['discount_amount'], Decimal('1.24'))
+        self.assertEqual(totals['tax_amount'], Decimal('1.11'))
+        self.assertEqual(totals['final_total'], Decimal('22.22'))
+        self.assertEqual(totals['tax_amount'].as_tuple().exponent, -2)
+
+
+class MoneyTests(TestCase):
+    def test_decimal_round_trip_is_lossless(self):
+        import random
+        from .money import Money
+        rng = random.Random(7)
+        for _ in range(1000):
+            cents = rng.randint(-10 ** 9, 10 ** 9)
+            value = Money(cents).to_decimal()
+            self.assertEqual(value.as_tuple().exponent, -2)
+            self.assertEqual(Money.from_decimal(value), Money(cents))
+            self.assertEqual(Money.from_decimal(str(value)).cents, cents)
+        with self.assertRaises(ValueError):
+            Money.from_decimal(Decimal('1.005'))
+        with self.assertRaises(TypeError):
+            Money(Decimal('1.00'))
+
+    def test_money_is_immutable_and_rounds_halves_away_from_zero(self):
+        from .money import Money
+        price = Money(1999)
+        with self.assertRaises(AttributeError):
+            price.cents = 1
+        self.assertEqual(price * 3 + Money(3) - Money(1000), Money(5000))
+        self.assertEqual(Money(5).percent(10), Money(1))
+        self.assertEqual(Money(4).percent(10), Money(0))
+        self.assertEqual(Money(-5).percent(10), Money(-1))
+        self.assertEqual(Money(1000).percent(Decimal('12.5')), Money(125))
+        self.assertEqual(str(Money(-1050)), '-10.50')
+
+    def test_totals_match_rounded_decimal_arithmetic_to_the_cent(self):
+        import random
+        from decimal import ROUND_HALF_UP
+        from .pricing import FLAT_SHIPPING_RATE, FREE_SHIPPING_THRESHOLD, TAX_RATE, price_carts
+        rng = random.Random(2024)
+        cent = Decimal('0.01')
+        prices = {product_id: Decimal(rng.randint(1, 99999)) / 100 for product_id in range(200)}
+        lines = [
+            (cart_id, product_id, rng.randint(1, 9))
+            for cart_id in range(500)
+            for product_id in rng.sample(range(200), rng.randint(1, 12))
+        ]
+        discounts = {cart_id: Decimal(rng.randint(0, 10000)) / 100 for cart_id in range(500)}
+        result = price_carts(lines, discounts, prices=prices)
+
+        expected = {}
+        for cart_id, product_id, quantity in lines:
+            expected[cart_id] = expected.get(cart_id, Decimal('0.00')) + prices[product_id] * quantity
+        for cart_id, subtotal in expected.items():
+            discount = (subtotal * discounts[cart_id] / 100).quantize(cent, ROUND_HALF_UP)
+            after_discount = subtotal - discount
+            tax = (after_discount * TAX_RATE).quantize(cent, ROUND_HALF_UP)
+            shipping = Decimal('0.00') if after_discount >= FREE_SHIPPING_THRESHOLD else FLAT_SHIPPING_RATE
+            totals = result[cart_id].as_decimals()
+            self.assertEqual(
+                (totals['total_price'], totals['discount_amount'], totals['tax_amount'], totals['final_total']),
+                (subtotal, discount, tax, after_discount + tax + shipping),
+            )
+            self.assertEqual(
+                result[cart_id].final_total,
+                result[cart_id].price_after_discount + result[cart_id].tax_amount + result[cart_id].shipping_cost,
+            )
+
+
+class CartSummaryTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='shopper', password='password')
+        self.client.login(username='shopper', password='password')
+        self.cart = Cart.objects.create(user=self.user, is_active=True)
+        self.product = Product.objects.create(name='Mug', price=Decimal('7.50'), stock=20)
+
+    def summary(self):
+        from .models import CartSummary
+        return CartSummary.objects.get(cart=self.cart)
+
+    def test_summary_follows_cart_mutations(self):
+        self.client.post(reverse('add_to_cart', args=[self.product.id]), {'quantity': 3})
+        self.assertEqual((self.summary().item_count, self.summary().subtotal), (3, Decimal('22.50')))
+
+        self.client.post(reverse('update_cart', args=[self.product.id]), {'quantity': 1})
+        self.assertEqual((self.summary().item_count, self.summary().subtotal), (1, Decimal('7.50')))
+
+        self.client.get(reverse('remove_from_cart', args=[self.product.id]))
+        self.assertEqual((self.summary().item_count, self.summary().subtotal), (0, Decimal('0.00')))
+
+        self.client.post(reverse('add_to_cart', args=[self.product.id]), {'quantity': 2})
+        self.client.get(reverse('clear_cart'))
+        self.assertEqual(self.summary().item_count, 0)
+
+    def test_badge_and_price_change(self):
+        self.client.post(reverse('add_to_cart', args=[self.product.id]), {'quantity': 2})
+        self.product.price = Decimal('10.00')
+        self.product.save()
+        self.assertEqual(self.summary().subtotal, Decimal('20.00'))
+
+        response = self.client.get(reverse('cart_detail'))
+        self.assertContains(response, 'Cart (2)')
+        self.assertContains(response, 'Subtotal: $20.00')
+
+    def test_cart_detail_queries_do_not_grow_with_items(self):
+        def render_queries():
+            from django.db import connection
+            from django.test.utils import CaptureQueriesContext
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get(reverse('cart_detail'))
+            return len(ctx.captured_queries)
+
+        self.client.post(reverse('add_to_cart', args=[self.product.id]), {'quantity': 1})
+        render_queries()
+        one_item = render_queries()
+        for i in range(5):
+            product = Product.objects.create(name=f'Extra {i}', price=Decimal('1.00'), stock=5)
+            self.client.post(reverse('add_to_cart', args=[product.id]), {'quantity': 1})
+        render_queries()  # consumes the flash messages
+        self.assertEqual(render_queries(), one_item)
+
+    def test_reconcile_command_repairs_drift(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from .models import CartSummary
+
+        self.client.post(reverse('add_to_cart', args=[self.product.id]), {'quantity': 2})
+        CartSummary.objects.filter(cart=self.cart).update(item_count=99)
+
+        out = StringIO()
+        call_command('reconcile_cart_summaries', '--dry-run', stdout=out)
+        self.assertIn('1 drifted cart summaries found', out.getvalue())
+        self.assertEqual(self.summary().item_count, 99)
+
+        call_command('reconcile_cart_summaries', stdout=StringIO())
+        self.assertEqual(self.summary().item_count, 2)
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from . import catalog
+        cache.clear()
+        catalog.local_cache.clear()
+        catalog.reset_stats()
+        self.client = Client()
+        self.product = Product.objects.create(name='Lamp', price=Decimal('25.00'), stock=4)
+
+    def test_home_page_served_from_cache(self):
+        from . import catalog
+        self.client.get(reverse('home'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('home'))
+        self.assertContains(response, 'Lamp')
+        self.assertEqual(catalog.stats()['misses'], 1)
+        self.assertEqual(catalog.stats()['local_hits'], 1)
+
+    def test_product_save_invalidates_list_and_detail(self):
+        self.client.get(reverse('home'))
+        self.client.get(reverse('product_detail', args=[self.product.id]))
+
+        self.product.name = 'Desk Lamp'
+        self.product.save()
+
+        self.assertContains(self.client.get(reverse('home')), 'Desk Lamp')
+        self.assertContains(self.client.get(reverse('product_detail', args=[self.product.id])), 'Desk Lamp')
+
+    def test_checkout_refreshes_cached_stock(self):
+        user = User.objects.create_user(username='lampfan', password='password')
+        self.client.login(username='lampfan', password='password')
+        cart = Cart.objects.create(user=user, is_active=True)
+        CartItem.objects.create(cart=cart, product=self.product, quantity=3)
+        self.client.get(reverse('product_detail', args=[self.product.id]))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('checkout'))
+
+        response = self.client.get(reverse('product_detail', args=[self.product.id]))
+        self.assertContains(response, 'Stock: 1')
+
+
+class PaginationTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from . import catalog
+        cache.clear()
+        catalog.local_cache.clear()
+        self.client = Client()
+        Product.objects.bulk_create([
+            Product(name=f'Item {i:02d}', price=Decimal('1.00'), stock=1) for i in range(5)
+        ])
+
+    def test_product_list_keyset_pages(self):
+        response = self.client.get(reverse('product_list'), {'page_size': 2})
+        self.assertContains(response, 'Item 00')
+        self.assertContains(response, 'Item 01')
+        self.assertNotContains(response, 'Item 02')
+
+        seen = []
+        cursor = None
+        while True:
+            params = {'page_size': 2}
+            if cursor:
+                params['after'] = cursor
+            response = self.client.get(reverse('product_list'), params)
+            seen.extend(p.name for p in Product.objects.all() if p.name in response.content.decode())
+            cursor = response.context['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(seen, [f'Item {i:02d}' for i in range(5)])
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(reverse('product_list'), {'after': 'not a cursor'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_streaming_modes(self):
+        import json
+        response = self.client.get(reverse('product_list'), {'format': 'json'})
+        self.assertTrue(response.streaming)
+        rows = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([row['name'] for row in rows], [f'Item {i:02d}' for i in range(5)])
+
+        response = self.client.get(reverse('product_list'), {'stream': '1'})
+        html = b''.join(response.streaming_content).decode()
+        self.assertIn('Item 04', html)
+        self.assertIn('</html>', html)
+
+    def test_order_history_pages_newest_first(self):
+        user = User.objects.create_user(username='historian', password='password')
+        self.client.login(username='historian', password='password')
+        orders = [
+            Order.objects.create(
+                user=user, total_amount=1, tax_amount=0, shipping_cost=0, final_total=1
+            )
+            for _ in range(3)
+        ]
+        # Orders placed in the same instant must still page deterministically
+        Order.objects.update(created_at=orders[0].created_at)
+
+        response = self.client.get(reverse('order_history'), {'page_size': 2})
+        self.assertEqual([o.id for o in response.context['orders']], [orders[2].id, orders[1].id])
+        response = self.client.get(reverse('order_history'), {'after': response.context['next_cursor']})
+        self.assertEqual([o.id for o in response.context['orders']], [orders[0].id])
+        self.assertIsNone(response.context['next_cursor'])
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.client = Client()
+        self.kettle = Product.objects.create(name='Electric Kettle', price=Decimal('30.00'), stock=3)
+        self.teapot = Product.objects.create(name='Ceramic Teapot', price=Decimal('20.00'), stock=3)
+        self.kettlebell = Product.objects.create(name='Kettlebell 16kg', price=Decimal('45.00'), stock=3)
+
+    def test_search_is_ranked_and_tracks_renames(self):
+        response = self.client.get(reverse('product_search'), {'q': 'kettle'})
+        self.assertEqual(list(response.context['products']), [self.kettle])
+
+        self.teapot.name = 'Ceramic Kettle'
+        self.teapot.save()
+        response = self.client.get(reverse('product_search'), {'q': 'ceramic kettle'})
+        self.assertEqual(list(response.context['products']), [self.teapot])
+
+        self.kettle.delete()
+        response = self.client.get(reverse('product_search'), {'q': 'electric'})
+        self.assertEqual(list(response.context['products']), [])
+
+    def test_autocomplete_matches_prefixes(self):
+        response = self.client.get(reverse('product_autocomplete'), {'q': 'Kett'})
+        names = {row['name'] for row in response.json()['results']}
+        self.assertEqual(names, {'Electric Kettle', 'Kettlebell 16kg'})
+
+        # Cached until the catalog changes
+        with self.assertNumQueries(0):
+            self.client.get(reverse('product_autocomplete'), {'q': 'Kett'})
+        Product.objects.create(name='Kettle Descaler', price=Decimal('5.00'), stock=3)
+        response = self.client.get(reverse('product_autocomplete'), {'q': 'Kett'})
+        self.assertEqual(len(response.json()['results']), 3)
+
+    def test_fts_syntax_in_query_is_treated_as_text(self):
+        response = self.client.get(reverse('product_autocomplete'), {'q': '"kettle OR NEAR('})
+        self.assertEqual(response.status_code, 200)
+
+    def test_rebuild_command(self):
+        from io import StringIO
+        from django.core.management import call_command
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('Indexed 3 products', out.getvalue())
+
+
+class ReservationTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='holder', password='password')
+        self.client.login(username='holder', password='password')
+        self.cart = Cart.objects.create(user=self.user, is_active=True)
+        self.product = Product.objects.create(name='Last Units', price=Decimal('5.00'), stock=3)
+
+    def test_add_to_cart_holds_stock_against_other_shoppers(self):
+        self.client.post(reverse('add_to_cart', args=[self.product.id]), {'quantity': 2})
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.reserved, self.product.available), (2, 1))
+
+        guest = Client()
+        guest.post(reverse('add_to_cart', args=[self.product.id]), {'quantity': 2})
+        self.assertNotIn('cart', guest.session)
+
+        # Growing your own hold only needs the extra units
+        self.client.post(reverse('update_cart', args=[self.product.id]), {'quantity': 3})
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved, 3)
+
+        self.client.get(reverse('remove_from_cart', args=[self.product.id]))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved, 0)
+
+    def test_rejected_add_leaves_no_line_behind(self):
+        guest = Client()
+        guest.post(reverse('add_to_cart', args=[self.product.id]), {'quantity': 2})
+        response = self.client.post(reverse('add_to_cart', args=[self.product.id]), {'quantity': 2})
+        self.assertEqual(response.url, reverse('product_detail', args=[self.product.id]))
+        self.assertFalse(CartItem.objects.filter(cart=self.cart).exists())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved, 2)
+
+    def test_checkout_consumes_hold(self):
+        self.client.post(reverse('add_to_cart', args=[self.product.id]), {'quantity': 3})
+        self.client.post(reverse('checkout'))
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.reserved), (0, 0))
+        self.assertTrue(Order.objects.filter(user=self.user).exists())
+
+    def test_sweeper_releases_expired_holds(self):
+        from datetime import timedelta
+        from io import StringIO
+        from django.core.management import call_command
+        from django.utils import timezone
+        from .models import StockReservation
+        from . import reservations
+
+        reservations.reserve('session:abc', self.product.id, 2)
+        reservations.reserve('session:def', self.product.id, 1)
+        StockReservation.objects.filter(holder='session:abc').update(
+            expires_at=timezone.now() - timedelta(minutes=1)
+        )
+        out = StringIO()
+        call_command('sweep_reservations', '--batch-size', '1', stdout=out)
+        self.assertIn('Released 1 expired reservations', out.getvalue())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved, 1)
+        self.assertEqual(StockReservation.objects.count(), 1)
+
+    def test_reserve_is_all_or_nothing(self):
+        from . import reservations
+        other = Product.objects.create(name='Plenty', price=Decimal('1.00'), stock=100)
+        with self.assertRaises(reservations.InsufficientStock) as ctx:
+            reservations.reserve_many('session:xyz', {other.id: 10, self.product.id: 4})
+        self.assertEqual(ctx.exception.products, [self.product])
+        other.refresh_from_db()
+        self.assertEqual(other.reserved, 0)
+
+
+class DiscountCacheTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.client = Client()
+        self.code = DiscountCode.objects.create(code='ONCE', discount_percent=10, usage_limit=1)
+
+    def test_unknown_codes_never_reach_the_database(self):
+        from . import discounts
+        discounts.lookup('warm-up')
+        with self.assertNumQueries(0):
+            for guess in ('AAAA', 'BBBB', 'x' * 500, ''):
+                self.assertIsNone(discounts.lookup(guess))
+
+    def test_known_code_is_cached_until_it_changes(self):
+        from . import discounts
+        self.assertEqual(discounts.lookup('ONCE'), self.code)
+        with self.assertNumQueries(0):
+            self.assertEqual(discounts.lookup('ONCE').discount_percent, 10)
+
+        self.code.discount_percent = 20
+        self.code.save()
+        self.assertEqual(discounts.lookup('ONCE').discount_percent, 20)
+        self.code.delete()
+        self.assertIsNone(discounts.lookup('ONCE'))
+
+    def test_consume_respects_usage_limit(self):
+        from . import discounts
+        self.assertTrue(discounts.consume(self.code))
+        self.assertFalse(discounts.consume(self.code))
+        self.code.refresh_from_db()
+        self.assertEqual(self.code.times_used, 1)
+
+    def test_consume_keeps_the_code_index(self):
+        from . import discounts
+        discounts.lookup('ONCE')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(discounts.consume(self.code))
+        with self.assertNumQueries(0):
+            self.assertIsNone(discounts.lookup('GUESS'))
+        self.assertEqual(discounts.lookup('ONCE').times_used, 1)
+
+    def test_checkout_rejects_used_up_code(self):
+        user = User.objects.create_user(username='saver', password='password')
+        self.client.login(username='saver', password='password')
+        cart = Cart.objects.create(user=user, is_active=True)
+        product = Product.objects.create(name='Thing', price=Decimal('10.00'), stock=5)
+        CartItem.objects.create(cart=cart, product=product, quantity=1)
+        DiscountCode.objects.filter(pk=self.code.pk).update(times_used=1)
+
+        # The code was applied while it still had a use left
+        session = self.client.session
+        session['discount'] = '10.00'
+        session['discount_code'] = 'ONCE'
+        session.save()
+        self.client.post(reverse('checkout'))
+
+        self.assertFalse(Order.objects.exists())
+        self.assertNotIn('discount_code', self.client.session)
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 5)
+
+
+class GuestCartMergeTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='returning', password='password')
+        self.cart = Cart.objects.create(user=self.user, is_active=True)
+        self.scarce = Product.objects.create(name='Scarce', price=Decimal('10.00'), stock=2)
+        self.plenty = Product.objects.create(name='Plenty', price=Decimal('1.00'), stock=50)
+
+    def test_guest_cart_is_merged_on_login(self):
+        from .models import CartSummary, StockReservation
+        CartItem.objects.create(cart=self.cart, product=self.scarce, quantity=1)
+        self.client.post(reverse('add_to_cart', args=[self.scarce.id]), {'quantity': 2})
+        self.client.post(reverse('add_to_cart', args=[self.plenty.id]), {'quantity': 3})
+        self.assertEqual(self.client.session['cart'], f'{self.scarce.id}:2,{self.plenty.id}:3')
+
+        self.client.login(username='returning', password='password')
+
+        quantities = dict(CartItem.objects.filter(cart=self.cart).values_list('product_id', 'quantity'))
+        self.assertEqual(quantities, {self.scarce.id: 2, self.plenty.id: 3})
+        self.assertNotIn('cart', self.client.session)
+        holders = set(StockReservation.objects.values_list('holder', flat=True))
+        self.assertEqual(holders, {f'cart:{self.cart.id}'})
+        self.scarce.refresh_from_db()
+        self.assertEqual(self.scarce.reserved, 2)
+        self.assertEqual(CartSummary.objects.get(cart=self.cart).item_count, 5)
+
+    def test_legacy_session_format_is_read(self):
+        from .session_cart import SessionCart
+        session = self.client.session
+        session['cart_items'] = {str(self.plenty.id): {'quantity': 4, 'price': '1.00'}}
+        session.save()
+
+        cart = SessionCart(self.client.session)
+        self.assertEqual(cart.items(), {self.plenty.id: 4})
+        response = self.client.get(reverse('cart_detail'))
+        self.assertContains(response, 'Subtotal: $4.00')
+
+
+class CartBatchApiTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='mobile', password='password')
+        self.client.login(username='mobile', password='password')
+        self.cart = Cart.objects.create(user=self.user, is_active=True)
+        self.pen = Product.objects.create(name='Pen', price=Decimal('2.00'), stock=10)
+        self.ink = Product.objects.create(name='Ink', price=Decimal('5.00'), stock=1)
+
+    def post(self, payload):
+        import json
+        return self.client.post(reverse('cart_batch_api'), json.dumps(payload), content_type='application/json')
+
+    def test_batch_applies_all_operations(self):
+        version = self.client.get(reverse('cart_batch_api')).json()['version']
+        response = self.post({'version': version, 'operations': [
+            {'op': 'add', 'product_id': self.pen.id, 'quantity': 3},
+            {'op': 'add', 'product_id': self.ink.id},
+            {'op': 'set', 'product_id': self.pen.id, 'quantity': 4},
+        ]})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual({item['name']: item['quantity'] for item in data['items']}, {'Pen': 4, 'Ink': 1})
+        self.assertEqual(data['totals']['total_price'], '13.00')
+        self.assertEqual(data['version'], version + 1)
+
+        response = self.post({'operations': [{'op': 'remove', 'product_id': self.ink.id}]})
+        self.assertEqual([item['name'] for item in response.json()['items']], ['Pen'])
+        self.ink.refresh_from_db()
+        self.assertEqual(self.ink.reserved, 0)
+
+    def test_stale_version_is_rejected(self):
+        version = self.client.get(reverse('cart_batch_api')).json()['version']
+        self.post({'operations': [{'op': 'add', 'product_id': self.pen.id}]})
+        response = self.post({'version': version, 'operations': [{'op': 'add', 'product_id': self.pen.id}]})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['error'], 'version_conflict')
+        self.assertEqual(CartItem.objects.get(cart=self.cart).quantity, 1)
+
+        # Even when the batch would change nothing
+        response = self.post({'version': version, 'operations': [{'op': 'set', 'product_id': self.pen.id, 'quantity': 1}]})
+        self.assertEqual(response.status_code, 409)
+        current = self.client.get(reverse('cart_batch_api')).json()['version']
+        response = self.post({'version': current, 'operations': [{'op': 'set', 'product_id': self.pen.id, 'quantity': 1}]})
+        self.assertEqual(response.status_code, 200)
+
+    def test_batch_is_all_or_nothing(self):
+        response = self.post({'operations': [
+            {'op': 'add', 'product_id': self.pen.id, 'quantity': 2},
+            {'op': 'add', 'product_id': self.ink.id, 'quantity': 2},
+        ]})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['products'], [self.ink.id])
+        self.assertFalse(CartItem.objects.filter(cart=self.cart).exists())
+        self.pen.refresh_from_db()
+        self.assertEqual(self.pen.reserved, 0)
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.post({'operations': [{'op': 'explode', 'product_id': 1}]}).status_code, 400)
+        response = self.post({'operations': [{'op': 'add', 'product_id': 999999}]})
+        self.assertEqual(response.json()['error'], 'unknown_products')
+        self.client.logout()
+        self.assertEqual(self.post({'operations': []}).status_code, 401)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(username='revalidator', password='password')
+        self.client.login(username='revalidator', password='password')
+        self.cart = Cart.objects.create(user=self.user, is_active=True)
+        self.product = Product.objects.create(name='Clock', price=Decimal('12.00'), stock=9)
+
+    def revalidate(self, url):
+        etag = self.client.get(url)['ETag']
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_product_pages_return_not_modified(self):
+        for url in (reverse('home'), reverse('product_detail', args=[self.product.id])):
+            self.assertEqual(self.revalidate(url).status_code, 304)
+
+        url = reverse('product_detail', args=[self.product.id])
+        etag = self.client.get(url)['ETag']
+        self.product.price = Decimal('13.00')
+        self.product.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_cart_etag_changes_with_cart_contents(self):
+        url = reverse('cart_detail')
+        self.client.get(url)  # builds the cart summary
+        self.assertEqual(self.revalidate(url).status_code, 304)
+
+        etag = self.client.get(url)['ETag']
+        self.client.post(reverse('add_to_cart', args=[self.product.id]), {'quantity': 1})
+        # The flash message is shown in full, then the new state is cacheable again
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertNotEqual(self.client.get(url)['ETag'], etag)
+
+    def test_order_detail_revalidates_without_rendering(self):
+        order = Order.objects.create(
+            user=self.user, total_amount=12, tax_amount=0, shipping_cost=0, final_total=12
+        )
+        url = reverse('order_detail', args=[order.id])
+        response = self.client.get(url)
+        self.assertIn('Last-Modified', response)
+        # Session, user, order timestamp and cart version; no order row or items
+        with self.assertNumQueries(4):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+
+class OrderQueryCountTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='collector', password='password')
+        self.client.login(username='collector', password='password')
+
+    def place_order(self, lines):
+        from .checkout import place_order
+        cart = Cart.objects.create(user=self.user, is_active=True)
+        for i in range(lines):
+            product = Product.objects.create(name=f'Part {lines}-{i}', price=Decimal('3.00'), stock=10)
+            CartItem.objects.create(cart=cart, product=product, quantity=2)
+        return place_order(self.user, cart)
+
+    def count_queries(self, url):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_checkout_stores_line_summary(self):
+        order = self.place_order(2)
+        self.assertEqual(order.item_count, 4)
+        self.assertEqual(order.product_names, 'Part 2-0, Part 2-1')
+        self.assertEqual(order.line_summary[0]['price'], '3.00')
+
+    def test_order_detail_query_count_is_constant(self):
+        small = self.place_order(1)
+        large = self.place_order(15)
+        # Checkout changed the active cart; let the session pointer settle first
+        self.client.get(reverse('order_history'))
+        small_queries = self.count_queries(reverse('order_detail', args=[small.id]))
+        large_queries = self.count_queries(reverse('order_detail', args=[large.id]))
+        self.assertEqual(small_queries, large_queries)
+        self.assertContains(self.client.get(reverse('order_detail', args=[large.id])), 'Part 15-14')
+
+    def test_order_history_query_count_is_constant(self):
+        self.place_order(1)
+        baseline = self.count_queries(reverse('order_history'))
+        for lines in (5, 12):
+            self.place_order(lines)
+        self.assertEqual(self.count_queries(reverse('order_history')), baseline)
+        self.assertContains(self.client.get(reverse('order_history')), '24 items')
+
+
+@override_settings(ROOT_URLCONF='ecommerce_site.asgi_urls')
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.user = User.objects.create_user(username='asyncuser', password='password')
+        self.cart = Cart.objects.create(user=self.user, is_active=True)
+        self.product = Product.objects.create(name='Async Lamp', price=Decimal('15.00'), stock=8)
+        CartItem.objects.create(cart=self.cart, product=self.product, quantity=2)
+
+    async def test_catalog_views(self):
+        client = AsyncClient()
+        response = await client.get(reverse('home'))
+        self.assertContains(response, 'Async Lamp')
+        response = await client.get(reverse('product_detail', args=[self.product.id]))
+        self.assertContains(response, 'Stock: 8')
+        response = await client.get(reverse('product_detail', args=[999999]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_cart_and_orders_for_logged_in_user(self):
+        client = AsyncClient()
+        await sync_to_async(client.force_login)(self.user)
+        response = await client.get(reverse('cart_detail'))
+        self.assertContains(response, 'Subtotal: $30.00')
+        self.assertContains(response, 'Cart (2)')
+        response = await client.get(reverse('order_history'))
+        self.assertContains(response, 'You have no orders.')
+
+    async def test_guest_cart_and_login_redirect(self):
+        client = AsyncClient()
+        response = await client.get(reverse('order_history'))
+        self.assertEqual(response.status_code, 302)
+        response = await client.get(reverse('cart_detail'))
+        self.assertContains(response, 'Your cart is empty.')
+
+    async def test_streaming_modes_match_the_sync_views(self):
+        import json
+        client = AsyncClient()
+        await sync_to_async(client.force_login)(self.user)
+        await Order.objects.acreate(
+            user=self.user, total_amount=Decimal('30.00'), tax_amount=Decimal('0.00'),
+            shipping_cost=Decimal('0.00'), final_total=Decimal('30.00'), item_count=2,
+        )
+        for name in ('home', 'order_history'):
+            response = await client.get(reverse(name), {'format': 'json'})
+            self.assertEqual(response['Content-Type'], 'application/json')
+            rows = json.loads(b''.join([chunk async for chunk in response.streaming_content]))
+            self.assertEqual(len(rows), 1)
+
+            response = await client.get(reverse(name), {'stream': '1'})
+            self.assertTrue(response.streaming)
+            page = b''.join([chunk async for chunk in response.streaming_content]).decode()
+            self.assertIn('Async Lamp' if name == 'home' else 'Order #', page)
+
+        response = await client.get(reverse('home'), {'format': 'json', 'after': 'garbage'})
+        self.assertEqual(response.status_code, 400)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from . import metrics
+        cache.clear()
+        metrics.reset()
+        self.product = Product.objects.create(name='Metered Lamp', price=Decimal('12.00'), stock=4)
+
+    def series(self, name, view):
+        from . import metrics
+        prefix = f'{name}{{view="{view}",method="GET"}} '
+        for line in metrics.expose().splitlines():
+            if line.startswith(prefix):
+                return float(line[len(prefix):])
+        return None
+
+    def test_unknown_methods_share_one_series(self):
+        from . import metrics
+        url = reverse('product_detail', args=[self.product.id])
+        for method in ('BREW', 'PROPFIND', 'X' * 50):
+            self.client.generic(method, url)
+        exposed = metrics.expose()
+        self.assertIn('view_request_duration_seconds_count{view="product_detail",method="other"} 3', exposed)
+        self.assertNotIn('BREW', exposed)
+
+    def test_records_per_view_metrics(self):
+        from unittest import mock
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from . import metrics
+        url = reverse('product_detail', args=[self.product.id])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(self.series('view_request_duration_seconds_count', 'product_detail'), 1)
+        self.assertEqual(self.series('view_db_queries_sum', 'product_detail'), len(queries.captured_queries))
+        self.assertGreater(self.series('view_template_render_seconds_sum', 'product_detail'), 0)
+        self.assertEqual(self.series('view_response_size_bytes_sum', 'product_detail'), len(response.content))
+
+        with mock.patch.object(metrics, 'TOKEN', 'scrape-secret'):
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('# TYPE view_request_duration_seconds histogram', response.content.decode())
+        self.assertIn('view="product_detail",method="GET",le="+Inf"} 1', response.content.decode())
+
+    def test_endpoint_requires_the_token(self):
+        from unittest import mock
+        from . import metrics
+        # Behind a proxy on the same host every request comes from localhost
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url, REMOTE_ADDR='127.0.0.1').status_code, 404)
+        with mock.patch.object(metrics, 'TOKEN', 'scrape-secret'):
+            self.assertEqual(self.client.get(url, REMOTE_ADDR='127.0.0.1').status_code, 404)
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer guess').status_code, 404)
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer scrape-secret').status_code, 200)
+
+    def test_slow_requests_are_logged_with_sql(self):
+        from unittest import mock
+        from . import metrics
+        with mock.patch.object(metrics, 'SLOW_REQUEST_MS', 0), self.assertLogs('cart.metrics', 'WARNING') as logs:
+            self.client.get(reverse('product_detail', args=[self.product.id]))
+        self.assertIn('product_detail', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+
+class DatabaseRoutingTests(TestCase):
+    def test_read_only_views_read_from_the_replica(self):
+        from unittest import mock
+        from django.http import HttpResponse, StreamingHttpResponse
+        from . import routing
+
+        router = routing.ReadReplicaRouter()
+        seen = []
+
+        @routing.read_only
+        def view(request):
+            seen.append(router.db_for_read(Product))
+            return HttpResponse()
+
+        @routing.read_only
+        def streaming_view(request):
+            return StreamingHttpResponse(seen.append(router.db_for_read(Product)) or 'x' for _ in range(1))
+
+        with mock.patch.object(routing, 'REPLICA', 'default'):
+            view(None)
+            seen.append(router.db_for_read(Product))
+            list(streaming_view(None))
+        self.assertEqual(seen, ['default', None, 'default'])
+        self.assertEqual(router.db_for_write(Product), 'default')
+        # Without a replica alias reads stay on the default database
+        view(None)
+        self.assertIsNone(seen[-1])
+
+    def test_production_backend_applies_pragmas_and_immediate_transactions(self):
+        import os
+        import sqlite3
+        import tempfile
+        from django.db.utils import ConnectionHandler
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'production.sqlite3')
+            handler = ConnectionHandler({'default': {
+                'ENGINE': 'ecommerce_site.sqlite_backend',
+                'NAME': path,
+                'OPTIONS': {
+                    'pragmas': {'journal_mode': 'WAL', 'busy_timeout': 1234},
+                    'transaction_mode': 'IMMEDIATE',
+                },
+            }})
+            wrapper = handler['default']
+            try:
+                with wrapper.cursor() as cursor:
+                    self.assertEqual(cursor.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+                    self.assertEqual(cursor.execute('PRAGMA busy_timeout').fetchone()[0], 1234)
+                wrapper._start_transaction_under_autocommit()
+                # The write lock is taken before anything has been written
+                other = sqlite3.connect(path, timeout=0)
+                with self.assertRaisesMessage(sqlite3.OperationalError, 'locked'):
+                    other.execute('CREATE TABLE blocked (id INTEGER)')
+                other.close()
+                wrapper.cursor().execute('ROLLBACK')
+            finally:
+                wrapper.close()
+
+
+class QueryPlanTests(TestCase):
+    """
+    The hot queries must be answered from an index; any full table scan in
+    their EXPLAIN QUERY PLAN output fails the test, as does a sort for
+    queries whose index is supposed to provide the order.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='planner', password='password')
+        self.cart = Cart.objects.create(user=self.user, is_active=True)
+        self.product = Product.objects.create(name='Plan', price=Decimal('1.00'), stock=5)
+
+    def assertNoFullScan(self, queryset, allow_sort=True):
+        from django.db import connection
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN output is SQLite specific')
+        plan = queryset.explain()
+        problems = [
+            line for line in plan.splitlines()
+            if ' SCAN ' in f' {line} ' or (not allow_sort and 'TEMP B-TREE' in line)
+        ]
+        self.assertEqual(problems, [], f"{queryset.query}\n{plan}")
+
+    def test_active_cart_lookup(self):
+        self.assertNoFullScan(Cart.objects.filter(user=self.user, is_active=True).order_by('pk')[:1])
+
+    def test_cart_line_lookups(self):
+        self.assertNoFullScan(CartItem.objects.filter(cart=self.cart, product=self.product))
+        self.assertNoFullScan(CartItem.objects.filter(cart=self.cart).select_related('product'))
+
+    def test_cart_badge_lookup(self):
+        from .models import CartSummary
+        self.assertNoFullScan(
+            CartSummary.objects.filter(cart__user=self.user, cart__is_active=True).values_list('item_count')[:1]
+        )
+
+    def test_order_history_pages(self):
+        from django.utils import timezone
+        from .pagination import encode_cursor, keyset_queryset
+        from .views import ORDER_ORDERING
+
+        orders = Order.objects.filter(user=self.user)
+        self.assertNoFullScan(keyset_queryset(orders, ORDER_ORDERING)[:51], allow_sort=False)
+        cursor = encode_cursor([timezone.now(), 10])
+        self.assertNoFullScan(keyset_queryset(orders, ORDER_ORDERING, cursor)[:51], allow_sort=False)
+
+    def test_task_status_lookups(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .models import Task
+        from . import retention
+        self.assertNoFullScan(Task.objects.filter(status=Task.FAILED).order_by('-pk')[:50])
+        self.assertNoFullScan(retention.finished_tasks(now=timezone.now() + timedelta(days=30)).values('pk'))
+
+    def test_constraints_reject_duplicates(self):
+        from django.db import IntegrityError, transaction
+        CartItem.objects.create(cart=self.cart, product=self.product, quantity=1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            CartItem.objects.create(cart=self.cart, product=self.product, quantity=1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Cart.objects.create(user=self.user, is_active=True)
+        # Any number of inactive carts is fine
+        Cart.objects.create(user=self.user, is_active=False)
+        Cart.objects.create(user=self.user, is_active=False)
+
+
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.user = User.objects.create_user(username='buyer', password='password')
+        self.lamp = Product.objects.create(name='Lamp', price=Decimal('20.00'), stock=50)
+        self.chair = Product.objects.create(name='Chair', price=Decimal('45.50'), stock=50)
+        self.code = DiscountCode.objects.create(code='ROLL10', discount_percent=10)
+
+    def place_order(self, lines, discount_code=None):
+        from io import StringIO
+        from django.core.management import call_command
+        from .checkout import place_order
+        cart = Cart.objects.create(user=self.user, is_active=True)
+        for product, quantity in lines:
+            CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+        order = place_order(self.user, cart, discount_code=discount_code)
+        call_command('run_tasks', stdout=StringIO())
+        return order
+
+    def rollup_rows(self):
+        from .models import DailySales, DiscountDailyUsage, ProductDailySales
+        return (
+            list(DailySales.objects.values_list('date', 'orders', 'units', 'revenue', 'discount_total')),
+            sorted(ProductDailySales.objects.values_list('date', 'product_id', 'units', 'revenue')),
+            list(DiscountDailyUsage.objects.values_list('date', 'discount_code_id', 'uses', 'discount_total')),
+        )
+
+    def test_checkout_updates_rollups(self):
+        from django.utils import timezone
+        first = self.place_order([(self.lamp, 2), (self.chair, 1)], discount_code='ROLL10')
+        second = self.place_order([(self.lamp, 1)])
+        first.refresh_from_db()
+        second.refresh_from_db()
+        today = timezone.localdate()
+
+        days, products, usage = self.rollup_rows()
+        discount = first.total_amount - (first.final_total - first.tax_amount - first.shipping_cost)
+        self.assertEqual(days, [(today, 2, 4, first.final_total + second.final_total, discount)])
+        self.assertEqual(products, sorted([
+            (today, self.lamp.id, 3, Decimal('60.00')),
+            (today, self.chair.id, 1, Decimal('45.50')),
+        ]))
+        self.assertEqual(usage, [(today, self.code.id, 1, discount)])
+
+    def test_rebuild_command_matches_incremental_rollups(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from .models import DailySales
+        self.place_order([(self.lamp, 2), (self.chair, 1)], discount_code='ROLL10')
+        self.place_order([(self.chair, 3)])
+        self.place_order([(self.lamp, 1)])
+        incremental = self.rollup_rows()
+
+        DailySales.objects.update(orders=99)
+        out = StringIO()
+        call_command('rebuild_sales_rollups', '--batch-size', '2', stdout=out)
+        self.assertIn('3 orders', out.getvalue())
+        self.assertEqual(self.rollup_rows(), incremental)
+
+    def test_rebuild_takes_over_queued_rollup_tasks(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from .checkout import place_order
+        from .models import DailySales, Task
+        self.place_order([(self.lamp, 1)])
+        cart = Cart.objects.create(user=self.user, is_active=True)
+        CartItem.objects.create(cart=cart, product=self.chair, quantity=2)
+        place_order(self.user, cart)
+        self.assertEqual(Task.objects.filter(status=Task.PENDING).count(), 1)
+
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+        self.assertFalse(Task.objects.filter(status=Task.PENDING).exists())
+        self.assertEqual(DailySales.objects.get().units, 3)
+
+    def test_report_is_staff_only_and_reads_rollups(self):
+        from .models import Order, OrderItem
+        self.place_order([(self.lamp, 2)], discount_code='ROLL10')
+        response = self.client.get(reverse('sales_report'))
+        self.assertEqual(response.status_code, 302)
+
+        User.objects.create_user(username='boss', password='password', is_staff=True)
+        self.client.login(username='boss', password='password')
+        # Raw orders are never touched: the report still works without them
+        OrderItem.objects.all().delete()
+        Order.objects.all().delete()
+        response = self.client.get(reverse('sales_report'))
+        self.assertContains(response, 'Units sold: 2')
+        self.assertContains(response, 'Lamp: 2 units, $40.00')
+        self.assertContains(response, 'ROLL10: 1 uses, $4.00 off')
+
+
+class ProductImportTests(TestCase):
+    def write(self, name, content):
+        import os
+        import shutil
+        import tempfile
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, name)
+        with open(path, 'w') as source:
+            source.write(content)
+        return path
+
+    def test_csv_import_upserts_by_sku_once_per_batch(self):
+        from io import StringIO
+        from unittest import mock
+        from django.core.management import call_command
+        from . import catalog, search
+
+        Product.objects.create(sku='A-1', name='Old name', price=Decimal('1.00'), stock=1)
+        path = self.write('products.csv', (
+            'sku,name,price,stock\n'
+            'A-1,Lamp,19.99,10\n'
+            'B-2,Chair,45,3\n'
+            'C-3,,5,1\n'
+            'D-4,Desk,120.5,2\n'
+        ))
+        out, err = StringIO(), StringIO()
+        with mock.patch.object(catalog, 'bump_catalog_version') as bump, \
+                mock.patch.object(search, 'bump_search_version') as bump_search, \
+                self.captureOnCommitCallbacks(execute=True):
+            call_command('import_products', path, '--batch-size', '2', stdout=out, stderr=err)
+
+        self.assertEqual(bump.call_count, 2)
+        self.assertEqual(bump_search.call_count, 2)
+        self.assertIn('2 created, 1 updated, 1 invalid', out.getvalue())
+        self.assertIn("Line 4: 'name' is required.", err.getvalue())
+        self.assertEqual(
+            sorted(Product.objects.values_list('sku', 'name', 'price', 'stock')),
+            [('A-1', 'Lamp', Decimal('19.99'), 10), ('B-2', 'Chair', Decimal('45.00'), 3),
+             ('D-4', 'Desk', Decimal('120.50'), 2)],
+        )
+
+    def test_rows_the_database_would_reject_are_invalid(self):
+        from io import StringIO
+        from django.core.management import call_command
+        path = self.write('products.csv', (
+            'sku,name,price,stock\n'
+            'A-1,Lamp,123456789012.00,1\n'
+            'B-2,Chair,45,99999999999999999999999\n'
+            f'C-3,{"x" * 300},5,1\n'
+            'D-4,Desk,120.5,2\n'
+        ))
+        out, err = StringIO(), StringIO()
+        call_command('import_products', path, stdout=out, stderr=err)
+        self.assertIn('1 created, 0 updated, 3 invalid', out.getvalue())
+        self.assertIn("Line 2: 'price': Ensure that there are no more than 10 digits in total.", err.getvalue())
+        self.assertEqual(list(Product.objects.values_list('sku', flat=True)), ['D-4'])
+
+    def test_jsonl_import_reprices_carts_and_resumes_from_checkpoint(self):
+        import json
+        import os
+        from io import StringIO
+        from django.core.management import call_command
+        from .models import CartSummary
+        from . import summary
+
+        user = User.objects.create_user(username='importer', password='password')
+        cart = Cart.objects.create(user=user, is_active=True)
+        lamp = Product.objects.create(sku='LAMP', name='Lamp', price=Decimal('10.00'), stock=5)
+        CartItem.objects.create(cart=cart, product=lamp, quantity=2)
+        summary.rebuild_summaries([cart.id])
+
+        path = self.write('products.jsonl', '\n'.join([
+            json.dumps({'sku': 'SKIPPED', 'name': 'Imported before the crash', 'price': '1', 'stock': 1}),
+            json.dumps({'sku': 'LAMP', 'name': 'Lamp', 'price': '12.50', 'stock': 5}),
+            'not json',
+        ]) + '\n')
+        checkpoint = path + '.checkpoint'
+        with open(checkpoint, 'w') as state:
+            json.dump({'source': os.path.abspath(path), 'line': 1}, state)
+
+        out, err = StringIO(), StringIO()
+        call_command('import_products', path, '--checkpoint', checkpoint, stdout=out, stderr=err)
+        self.assertIn('Resuming after line 1.', out.getvalue())
+        self.assertIn('Line 3:', err.getvalue())
+        self.assertFalse(Product.objects.filter(sku='SKIPPED').exists())
+        self.assertEqual(CartSummary.objects.get(cart=cart).subtotal, Decimal('25.00'))
+        # A finished import removes its checkpoint
+        self.assertFalse(os.path.exists(checkpoint))
+
+    def test_imported_products_are_searchable(self):
+        from django.core.management import call_command
+        from io import StringIO
+        from . import search
+        if not search.fts_enabled():
+            self.skipTest('full-text search needs SQLite')
+        path = self.write('products.csv', 'sku,name,price,stock\nZ-1,Walnut Bookshelf,80,4\n')
+        call_command('import_products', path, stdout=StringIO())
+        self.assertEqual([p.name for p in search.search_products('walnut')], ['Walnut Bookshelf'])
+
+
+class OrderExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', password='password')
+        self.lamp = Product.objects.create(name='Lamp', price=Decimal('10.00'), stock=10)
+        self.chair = Product.objects.create(name='Chair, oak', price=Decimal('45.00'), stock=10)
+        self.orders = []
+        for lines in ([(self.lamp, 2), (self.chair, 1)], [(self.lamp, 1)], []):
+            total = sum(product.price * quantity for product, quantity in lines)
+            order = Order.objects.create(
+                user=self.user, total_amount=total, tax_amount=Decimal('0.00'),
+                shipping_cost=Decimal('0.00'), final_total=total,
+            )
+            for product, quantity in lines:
+                OrderItem.objects.create(
+                    order=order, product=product, quantity=quantity, price_at_purchase=product.price,
+                )
+            self.orders.append(order)
+        User.objects.create_user(username='finance', password='password', is_staff=True)
+
+    def export(self, **params):
+        client = Client()
+        client.login(username='finance', password='password')
+        response = client.get(reverse('order_export'), params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_export_is_staff_only(self):
+        self.client.login(username='buyer', password='password')
+        response = self.client.get(reverse('order_export'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_csv_export_has_a_row_per_line(self):
+        import csv
+        rows = list(csv.DictReader(self.export(format='csv').splitlines()))
+        self.assertEqual(
+            [(int(row['order_id']), row['product_name'], row['quantity']) for row in rows],
+            [(self.orders[0].id, 'Lamp', '2'), (self.orders[0].id, 'Chair, oak', '1'),
+             (self.orders[1].id, 'Lamp', '1'), (self.orders[2].id, '', '')],
+        )
+        self.assertEqual(rows[0]['final_total'], '65.00')
+
+    def test_jsonl_export_filters_by_date_and_after_id(self):
+        import json
+        from datetime import timedelta
+        from django.utils import timezone
+        Order.objects.filter(id=self.orders[0].id).update(created_at=timezone.now() - timedelta(days=10))
+        today = timezone.localdate()
+
+        records = [json.loads(line) for line in self.export(format='jsonl', start=today.isoformat()).splitlines()]
+        self.assertEqual([record['id'] for record in records], [self.orders[1].id, self.orders[2].id])
+        self.assertEqual(records[0]['lines'], [
+            {'product_id': self.lamp.id, 'product_name': 'Lamp', 'quantity': 1, 'price_at_purchase': '10.00'},
+        ])
+        records = self.export(format='jsonl', after_id=self.orders[1].id).splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in records], [self.orders[2].id])
+
+    def test_bad_filters_are_rejected(self):
+        self.client.login(username='finance', password='password')
+        self.assertEqual(self.client.get(reverse('order_export'), {'start': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('order_export'), {'format': 'xml'}).status_code, 400)
+
+    def test_lines_are_fetched_once_per_batch(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from . import exports
+        with CaptureQueriesContext(connection) as queries:
+            exported = list(exports.export_orders(batch_size=2))
+        self.assertEqual(len(exported), 3)
+        # One query for the orders, one for the lines of each batch of two
+        self.assertEqual(len(queries), 3)
+
+    def test_command_exports_since_last_run(self):
+        import json
+        import os
+        import shutil
+        import tempfile
+        from io import StringIO
+        from django.core.management import call_command
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        output, state = os.path.join(directory, 'orders.jsonl'), os.path.join(directory, 'state.json')
+
+        call_command('export_orders', '--format', 'jsonl', '--output', output, '--since-last', state,
+                     stderr=StringIO())
+        with open(output) as exported:
+            self.assertEqual(len(exported.readlines()), 3)
+        with open(state) as saved:
+            self.assertEqual(json.load(saved), {'last_order_id': self.orders[2].id})
+
+        newer = Order.objects.create(
+            user=self.user, total_amount=Decimal('5.00'), tax_amount=Decimal('0.00'),
+            shipping_cost=Decimal('0.00'), final_total=Decimal('5.00'),
+        )
+        call_command('export_orders', '--format', 'jsonl', '--output', output, '--since-last', state,
+                     stderr=StringIO())
+        with open(output) as exported:
+            self.assertEqual([json.loads(line)['id'] for line in exported], [newer.id])
+
+
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        from unittest import mock
+        from . import tasks
+        self.calls = []
+        handlers = mock.patch.dict(tasks.HANDLERS, {
+            'test.record': (lambda value: self.calls.append(value), 'default'),
+            'test.explode': (self.explode, 'default'),
+        })
+        handlers.start()
+        self.addCleanup(handlers.stop)
+
+    def explode(self):
+        raise RuntimeError('boom')
+
+    def test_checkout_queues_rollups_in_its_transaction(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from .checkout import CheckoutError, place_order
+        from .models import DailySales, Task
+        user = User.objects.create_user(username='buyer', password='password')
+        product = Product.objects.create(name='Lamp', price=Decimal('20.00'), stock=5)
+        cart = Cart.objects.create(user=user, is_active=True)
+        # A failed checkout leaves no task behind
+        with self.assertRaises(CheckoutError):
+            place_order(user, cart)
+        self.assertFalse(Task.objects.exists())
+
+        CartItem.objects.create(cart=cart, product=product, quantity=2)
+        order = place_order(user, cart)
+        task = Task.objects.get()
+        self.assertEqual((task.queue, task.payload), ('rollups', {'order_id': order.id}))
+        self.assertFalse(DailySales.objects.exists())
+
+        out = StringIO()
+        call_command('run_tasks', stdout=out)
+        self.assertIn('1 done', out.getvalue())
+        self.assertEqual(DailySales.objects.get().units, 2)
+        self.assertEqual(Task.objects.get().status, Task.DONE)
+
+    def test_failures_back_off_then_fail(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .models import Task
+        from . import tasks
+        task = tasks.enqueue('test.explode', max_attempts=2)
+
+        self.assertEqual(tasks.work(['default'], 'worker-1'), {Task.PENDING: 1})
+        task.refresh_from_db()
+        self.assertEqual(task.attempts, 1)
+        self.assertIn('RuntimeError: boom', task.last_error)
+        self.assertGreater(task.run_after, timezone.now() + timedelta(seconds=tasks.RETRY_BASE_SECONDS - 1))
+        # Not due yet
+        self.assertEqual(tasks.work(['default'], 'worker-1'), {})
+
+        Task.objects.update(run_after=timezone.now())
+        self.assertEqual(tasks.work(['default'], 'worker-1'), {Task.FAILED: 1})
+        self.assertEqual(Task.objects.get().status, Task.FAILED)
+
+    def test_concurrency_limit_and_expired_leases(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .models import Task
+        from . import tasks
+        for value in range(3):
+            tasks.enqueue('test.record', {'value': value})
+        with self.settings(TASK_QUEUE_CONCURRENCY={'default': 2}):
+            claimed = tasks.claim('default', 'worker-1', batch_size=10)
+            self.assertEqual([task.payload['value'] for task in claimed], [0, 1])
+            self.assertEqual(tasks.claim('default', 'worker-2'), [])
+
+            # worker-1 died: once its leases run out another worker takes over
+            Task.objects.filter(locked_by='worker-1').update(leased_until=timezone.now() - timedelta(seconds=1))
+            self.assertEqual(tasks.work(['default'], 'worker-2'), {Task.DONE: 2})
+            self.assertEqual(tasks.work(['default'], 'worker-2'), {Task.DONE: 1})
+        self.assertEqual(sorted(self.calls), [0, 1, 2])
+
+        # A late finish by the worker that lost its lease is rolled back
+        self.calls.clear()
+        self.assertIsNone(tasks.execute(claimed[0], 'worker-1'))
+        self.assertEqual(Task.objects.filter(status=Task.DONE).count(), 3)
+
+    def test_unknown_task_names_are_rejected(self):
+        from . import tasks
+        with self.assertRaises(ValueError):
+            tasks.enqueue('test.missing')
+
+
+class RetentionTests(TestCase):
+    def setUp(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .models import CartSummary
+        from . import summary
+        self.user = User.objects.create_user(username='shopper', password='password')
+        product = Product.objects.create(name='Lamp', price=Decimal('10.00'), stock=10)
+        old = timezone.now() - timedelta(days=40)
+        self.abandoned = []
+        for index in range(3):
+            cart = Cart.objects.create(user=self.user, is_active=False, name=f'Old {index}')
+            CartItem.objects.create(cart=cart, product=product, quantity=1)
+            self.abandoned.append(cart)
+        summary.rebuild_summaries([cart.id for cart in self.abandoned])
+        CartSummary.objects.update(updated_at=old)
+        # Switched away from before it was ever summarized: its age is unknown
+        self.unsummarized = Cart.objects.create(user=self.user, is_active=False, name='Empty')
+        self.recent = Cart.objects.create(user=self.user, is_active=False, name='Recent')
+        summary.reset(self.recent.id)
+        self.active = Cart.objects.create(user=self.user, is_active=True)
+
+    def test_dry_run_counts_without_deleting(self):
+        from io import StringIO
+        from django.core.management import call_command
+        out = StringIO()
+        call_command('prune_stale_data', '--only', 'carts', '--dry-run', '--pause', '0', stdout=out)
+        self.assertIn('Would delete 3 carts rows', out.getvalue())
+        self.assertEqual(Cart.objects.count(), 6)
+
+    def test_abandoned_carts_are_deleted_in_batches(self):
+        from io import StringIO
+        from unittest import mock
+        from django.core.management import call_command
+        from .models import CartSummary
+        from . import retention
+        out = StringIO()
+        with mock.patch.object(retention.time, 'sleep') as sleep:
+            call_command('prune_stale_data', '--only', 'carts', '--batch-size', '2', stdout=out)
+        self.assertEqual(sleep.call_count, 1)
+        self.assertIn('Summarized 1 inactive carts', out.getvalue())
+        self.assertIn('Deleted 9 carts rows', out.getvalue())
+        self.assertIn('3 cart.Cart, 3 cart.CartItem, 3 cart.CartSummary', out.getvalue())
+        self.assertEqual(
+            set(Cart.objects.values_list('id', flat=True)), {self.unsummarized.id, self.recent.id, self.active.id}
+        )
+        # The new summary starts the unsummarized cart's clock
+        self.assertEqual(
+            set(CartSummary.objects.values_list('cart_id', flat=True)), {self.unsummarized.id, self.recent.id}
+        )
+
+    def test_expired_sessions_and_finished_tasks_are_deleted(self):
+        from datetime import timedelta
+        from io import StringIO
+        from django.contrib.sessions.backends.db import SessionStore
+        from django.contrib.sessions.models import Session
+        from django.core.management import call_command
+        from django.utils import timezone
+        from .models import Task
+        for _ in range(3):
+            session = SessionStore()
+            session['cart'] = '1:2'
+            session.create()
+        Session.objects.filter(pk__in=list(Session.objects.values_list('pk', flat=True)[:2])).update(
+            expire_date=timezone.now() - timedelta(days=1)
+        )
+        old = timezone.now() - timedelta(days=10)
+        Task.objects.create(name='old', status=Task.DONE, finished_at=old)
+        Task.objects.create(name='failed', status=Task.FAILED, finished_at=old)
+        Task.objects.create(name='recent', status=Task.DONE, finished_at=timezone.now())
+
+        out = StringIO()
+        call_command('prune_stale_data', '--only', 'sessions', '--only', 'tasks', '--pause', '0', stdout=out)
+        self.assertIn('Deleted 2 sessions rows', out.getvalue())
+        self.assertEqual(Session.objects.count(), 1)
+        self.assertEqual(sorted(Task.objects.values_list('name', flat=True)), ['failed', 'recent'])
+
+
+class AdminTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.staff = User.objects.create_superuser(username='admin', password='password', email='a@example.com')
+        self.client.login(username='admin', password='password')
+
+    def add_rows(self, count):
+        start = Product.objects.count()
+        for index in range(start, start + count):
+            user = User.objects.create_user(username=f'user{index}', password='password')
+            product = Product.objects.create(name=f'Widget {index}', sku=f'W-{index}', price=Decimal('5.00'), stock=5)
+            cart = Cart.objects.create(user=user, is_active=True)
+            CartItem.objects.create(cart=cart, product=product, quantity=1)
+            order = Order.objects.create(
+                user=user, total_amount=Decimal('5.00'), tax_amount=Decimal('0.00'),
+                shipping_cost=Decimal('0.00'), final_total=Decimal('5.00'), item_count=1,
+            )
+            OrderItem.objects.create(order=order, product=product, quantity=1, price_at_purchase=Decimal('5.00'))
+
+    def test_saving_a_product_keeps_live_holds(self):
+        from unittest import mock
+        from django.db.models import F
+        from .admin import ProductAdmin
+        product = Product.objects.create(name='Lamp', sku='L-1', price=Decimal('10.00'), stock=5, reserved=1)
+        save_form = ProductAdmin.save_form
+
+        def hold_while_saving(admin, request, form, change):
+            # A cart takes a hold between loading the product and saving it
+            Product.objects.filter(pk=product.pk).update(reserved=F('reserved') + 2)
+            return save_form(admin, request, form, change)
+
+        with mock.patch.object(ProductAdmin, 'save_form', hold_while_saving):
+            response = self.client.post(reverse('admin:cart_product_change', args=[product.pk]), {
+                'sku': 'L-1', 'name': 'Lamp', 'price': '12.00', 'stock': '8', 'reserved': '0',
+            })
+        self.assertEqual(response.status_code, 302)
+        product.refresh_from_db()
+        self.assertEqual((product.price, product.stock, product.reserved), (Decimal('12.00'), 8, 3))
+
+    def count_queries(self, url):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        urls = [reverse(f'admin:cart_{name}_changelist') for name in ('cart', 'cartitem', 'order', 'product')]
+        self.add_rows(2)
+        baseline = [self.count_queries(url) for url in urls]
+        self.add_rows(10)
+        self.assertEqual([self.count_queries(url) for url in urls], baseline)
+
+    def test_order_change_page_lists_items_inline(self):
+        self.add_rows(6)
+        order = Order.objects.first()
+        url = reverse('admin:cart_order_change', args=[order.id])
+        response = self.client.get(url)
+        self.assertContains(response, 'Widget 0')
+        self.assertContains(response, 'id="id_user"')
+        baseline = self.count_queries(url)
+        for product in Product.objects.exclude(name='Widget 0'):
+            OrderItem.objects.create(order=order, product=product, quantity=2, price_at_purchase=product.price)
+        self.assertEqual(self.count_queries(url), baseline)
+        self.assertContains(self.client.get(url), 'Widget 5')
+
+    def test_product_search_uses_sku_or_name_index(self):
+        self.add_rows(3)
+        url = reverse('admin:cart_product_changelist')
+        self.assertContains(self.client.get(url, {'q': 'W-1'}), '1 result')
+        response = self.client.get(url, {'q': 'widg'})
+        self.assertContains(response, '3 results')
+
+    def test_large_tables_report_an_estimated_count(self):
+        from unittest import mock
+        from . import pagination
+        self.add_rows(4)
+        with mock.patch.object(pagination, 'EXACT_COUNT_LIMIT', 2):
+            paginator = pagination.EstimatedCountPaginator(Product.objects.order_by('id'), 2)
+            self.assertEqual(paginator.count, Product.objects.order_by('-id').first().id)
+            filtered = pagination.EstimatedCountPaginator(Product.objects.filter(stock=5).order_by('id'), 2)
+            self.assertEqual(filtered.count, 2)
+        self.assertEqual(pagination.EstimatedCountPaginator(Product.objects.order_by('id'), 2).count, 4)
+
+
+class ActiveCartTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.user = User.objects.create_user(username='shopper', password='password')
+        self.product = Product.objects.create(name='Lamp', price=Decimal('10.00'), stock=50)
+        self.first = Cart.objects.create(user=self.user, name='First', is_active=True)
+        self.second = Cart.objects.create(user=self.user, name='Second', is_active=False)
+        self.client.login(username='shopper', password='password')
+
+    def active_cart_queries(self, send):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as queries:
+            send()
+        return [query['sql'] for query in queries if query['sql'].startswith(('SELECT "cart_cart"', 'UPDATE "cart_cart"'))
+                and '"is_active"' in query['sql']]
+
+    def add(self):
+        return self.client.post(reverse('add_to_cart', args=[self.product.id]), {'quantity': 1})
+
+    def test_returning_users_resolve_the_cart_from_the_session(self):
+        self.assertEqual(len(self.active_cart_queries(self.add)), 1)
+        self.assertEqual(self.active_cart_queries(self.add), [])
+        self.assertEqual(self.active_cart_queries(lambda: self.client.post(reverse('clear_cart'))), [])
+        self.assertEqual(CartItem.objects.filter(cart=self.first).count(), 0)
+
+    def test_switching_writes_only_the_old_and_new_active_rows(self):
+        third = Cart.objects.create(user=self.user, name='Third', is_active=False)
+        self.add()
+        queries = self.active_cart_queries(lambda: self.client.get(reverse('select_cart', args=[self.second.id])))
+        updates = [sql for sql in queries if sql.startswith('UPDATE')]
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(list(Cart.objects.filter(is_active=True)), [self.second])
+        self.assertFalse(Cart.objects.get(id=third.id).is_active)
+        # The new pointer is already current, and the item goes to the new cart
+        self.assertEqual(self.active_cart_queries(self.add), [])
+        self.assertEqual(CartItem.objects.get(cart=self.second).quantity, 1)
+
+    def test_pointers_are_revalidated_after_changes_elsewhere(self):
+        from .checkout import place_order
+        other_device = Client()
+        other_device.login(username='shopper', password='password')
+        self.add()
+        other_device.get(reverse('select_cart', args=[self.second.id]))
+
+        self.add()
+        self.assertEqual(CartItem.objects.get(cart=self.second).quantity, 1)
+
+        place_order(self.user, Cart.objects.get(id=self.second.id))
+        response = self.add()
+        self.assertEqual(response.url, reverse('cart_detail'))
+        self.assertFalse(CartItem.objects.filter(cart=self.second).exists())
+
+    def test_create_cart_switches_to_the_new_cart(self):
+        self.add()
+        self.client.post(reverse('create_cart'), {'name': 'Gifts'})
+        created = Cart.objects.get(name='Gifts')
+        self.assertEqual(list(Cart.objects.filter(is_active=True)), [created])
+        self.add()
+        self.assertTrue(CartItem.objects.filter(cart=created).exists())
+
+    def test_checkout_forgets_the_cart_without_a_version_bump(self):
+        # As when the bump lands in another worker's cache: this session must
+        # still stop using the cart it just ordered
+        from unittest import mock
+        from . import active_cart
+        self.add()
+        with mock.patch.object(active_cart, 'invalidate'):
+            self.client.post(reverse('checkout'))
+            self.assertEqual(self.client.session[active_cart.SESSION_KEY][:2], [self.user.pk, None])
+            response = self.add()
+        self.assertEqual(response.url, reverse('cart_detail'))
+        self.assertFalse(CartItem.objects.filter(cart=self.first).exists())
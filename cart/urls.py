@@ -1,10 +1,12 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     # Product URLs
     path('products/', views.product_list, name='product_list'),
     path('products/<int:product_id>/', views.product_detail, name='product_detail'),
+    path('search/', views.product_search, name='product_search'),
+    path('search/autocomplete/', views.product_autocomplete, name='product_autocomplete'),
     # Cart URLs
     path('add/<int:product_id>/', views.add_to_cart, name='add_to_cart'),
     path('remove/<int:product_id>/', views.remove_from_cart, name='remove_from_cart'),
@@ -13,7 +15,11 @@ urlpatterns = [
     path('create_cart/', views.create_cart, name='create_cart'),
     path('select_cart/<int:cart_id>/', views.select_cart, name='select_cart'),
     path('clear_cart/', views.clear_cart, name='clear_cart'),
+    path('checkout/', views.checkout, name='checkout'),
+    path('api/cart/', api.cart_batch, name='cart_batch_api'),
     path('orders/', views.order_history, name='order_history'),
     path('orders/<int:order_id>/', views.order_detail, name='order_detail'),
+    path('reports/sales/', views.sales_report, name='sales_report'),
+    path('reports/orders/export/', views.order_export, name='order_export'),
     path('', views.cart_detail, name='cart_detail'),
 ]
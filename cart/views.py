@@ -1,16 +1,37 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
-from .models import Product, DiscountCode, Cart, CartItem, Order, OrderItem
+from .models import Product, Cart, CartItem, Order, OrderItem, DailySales, DiscountDailyUsage, ProductDailySales
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
+from datetime import date, timedelta
 from decimal import Decimal
 from django.urls import reverse
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from django.http import HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import condition, require_POST
+from django.db import transaction
+from django.db.models import Prefetch, Sum
+from django.utils import timezone
+from .checkout import CheckoutError, DiscountUnavailableError, place_order
+from .pricing import price_breakdown
+from .pagination import (
+    InvalidCursor, decode_cursor, encode_cursor, keyset_page, keyset_queryset, page_size_from,
+)
+from .session_cart import SessionCart
+from .streaming import STREAM_CHUNK_SIZE, stream_json, stream_template
+from .routing import read_only
+from . import active_cart, catalog, conditional, discounts, exports, reservations, search, summary
+
+
+PRODUCT_ORDERING = ['id']
+ORDER_ORDERING = ['-created_at', '-id']
+# Columns of each order in the streamed JSON history
+ORDER_JSON_FIELDS = ('id', 'created_at', 'final_total', 'item_count', 'line_summary')
+REPORT_DAYS = 30
+MAX_REPORT_DAYS = 366
 
 
-# Constants for tax and shipping
-TAX_RATE = Decimal('0.10')  # 10% tax as Decimal
-FREE_SHIPPING_THRESHOLD = Decimal('100.00')
-FLAT_SHIPPING_RATE = Decimal('10.00')
-
 def add_to_cart(request, product_id):
     """
     View to add a product to the cart with quantity selection.
@@ -31,42 +52,49 @@ def add_to_cart(request, product_id):
 
     if request.user.is_authenticated:
         # Get the active cart for the user
-        cart = Cart.objects.filter(user=request.user, is_active=True).first()
+        cart = active_cart.get_active_cart(request)
         if not cart:
             messages.error(request, "No active cart found. Please select or create a cart.")
             return redirect('cart_detail')
 
-        # Get or create CartItem with initial quantity=0
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=cart,
-            product=product,
-            defaults={'quantity': 0}
-        )
-
-        # Calculate new total quantity
-        total_quantity = cart_item.quantity + quantity
-        if total_quantity > product.stock:
+        try:
+            # A failed hold rolls back the line created for it
+            with transaction.atomic():
+                # Get or create CartItem with initial quantity=0
+                cart_item, created = CartItem.objects.get_or_create(
+                    cart=cart,
+                    product=product,
+                    defaults={'quantity': 0}
+                )
+
+                # Calculate new total quantity and hold it against stock
+                total_quantity = cart_item.quantity + quantity
+                reservations.reserve(reservations.holder_for(request, cart), product.id, total_quantity)
+
+                # Update the quantity
+                cart_item.quantity = total_quantity
+                cart_item.save()
+                summary.apply_delta(cart.id, quantity, product.price * quantity)
+        except reservations.InsufficientStock:
             messages.error(request, "Not enough stock available.")
             return redirect('product_detail', product_id=product_id)
-
-        # Update the quantity
-        cart_item.quantity = total_quantity
-        cart_item.save()
     else:
         # Session-based cart for guest users
-        cart_items = request.session.get('cart_items', {})
-        current_quantity = cart_items.get(str(product_id), {}).get('quantity', 0)
+        session_cart = SessionCart(request.session)
+        current_quantity = session_cart.get(product_id)
         total_quantity = current_quantity + quantity
-        if total_quantity > product.stock:
+        try:
+            reservations.reserve(reservations.holder_for(request), product.id, total_quantity)
+        except reservations.InsufficientStock:
             messages.error(request, "Not enough stock available.")
             return redirect('product_detail', product_id=product_id)
-        cart_items[str(product_id)] = {'quantity': total_quantity, 'price': str(product.price)}
-        request.session['cart_items'] = cart_items
+        session_cart.set(product_id, total_quantity)
 
     messages.success(request, "Product added to cart.")
     return redirect(reverse('cart_detail'))
 
 
+@condition(etag_func=conditional.cart_etag)
 def cart_detail(request):
     """
     View to display items in the cart and the total price, including shipping calculation.
@@ -78,27 +106,26 @@ def cart_detail(request):
         # Retrieve all carts for the user
         carts = Cart.objects.filter(user=request.user)
         # Retrieve items from the active cart
-        cart = carts.filter(is_active=True).first()
+        cart = active_cart.get_active_cart(request)
         if cart:
-            cart_items = CartItem.objects.filter(cart=cart)
+            cart_items = CartItem.objects.filter(cart=cart).select_related('product')
             for item in cart_items:
-                subtotal = item.product.price * item.quantity
-                total_price += subtotal
                 cart_products.append({
                     'product': item.product,
                     'quantity': item.quantity,
-                    'subtotal': subtotal
+                    'subtotal': item.product.price * item.quantity
                 })
+            total_price = summary.get_summary(cart).subtotal
         else:
             cart_items = []
             messages.error(request, "No active cart found. Please select or create a cart.")
     else:
         carts = None
         # Retrieve cart items from session for guest users
-        cart_items = request.session.get('cart_items', {})
-        products = Product.objects.filter(id__in=cart_items.keys())
+        session_items = SessionCart(request.session).items()
+        products = Product.objects.filter(id__in=session_items.keys())
         for product in products:
-            quantity = cart_items[str(product.id)]['quantity']
+            quantity = session_items[product.id]
             subtotal = product.price * quantity
             total_price += subtotal
             cart_products.append({
@@ -107,29 +134,11 @@ def cart_detail(request):
                 'subtotal': subtotal
             })
 
-    discount_percent = Decimal(request.session.get('discount', 0))
-    discount_amount = total_price * (discount_percent / Decimal('100'))
-    price_after_discount = total_price - discount_amount
-
-    tax_amount = price_after_discount * TAX_RATE
-
-    # Dynamic shipping cost based on total price after discount
-    if price_after_discount >= FREE_SHIPPING_THRESHOLD:
-        shipping_cost = Decimal('0.00')  # Free shipping
-    else:
-        shipping_cost = FLAT_SHIPPING_RATE  # Flat rate shipping
-
-    final_total = price_after_discount + tax_amount + shipping_cost
+    totals = price_breakdown(total_price, request.session.get('discount', 0))
 
     context = {
         'cart_products': cart_products,
-        'total_price': total_price,
-        'discount_percent': discount_percent,
-        'discount_amount': discount_amount,
-        'price_after_discount': price_after_discount,
-        'tax_amount': tax_amount,
-        'shipping_cost': shipping_cost,
-        'final_total': final_total,
+        **totals.as_decimals(),
         'carts': carts,
     }
     return render(request, 'cart/cart_detail.html', context)
@@ -139,14 +148,20 @@ def remove_from_cart(request, product_id):
     View to remove a product from the cart.
     """
     if request.user.is_authenticated:
-        cart = Cart.objects.filter(user=request.user, is_active=True).first()
+        cart = active_cart.get_active_cart(request)
         if cart:
-            CartItem.objects.filter(cart=cart, product_id=product_id).delete()
+            cart_item = CartItem.objects.filter(cart=cart, product_id=product_id).select_related('product').first()
+            if cart_item:
+                cart_item.delete()
+                reservations.release(reservations.holder_for(request, cart), [product_id])
+                summary.apply_delta(
+                    cart.id, -cart_item.quantity, -cart_item.product.price * cart_item.quantity
+                )
     else:
-        cart_items = request.session.get('cart_items', {})
-        if str(product_id) in cart_items:
-            del cart_items[str(product_id)]
-            request.session['cart_items'] = cart_items
+        session_cart = SessionCart(request.session)
+        if product_id in session_cart:
+            session_cart.remove(product_id)
+            reservations.release(reservations.holder_for(request), [product_id])
 
     messages.success(request, "Item removed from cart.")
     return redirect('cart_detail')
@@ -164,17 +179,28 @@ def update_cart(request, product_id):
         return redirect('cart_detail')
 
     if request.user.is_authenticated:
-        cart = Cart.objects.filter(user=request.user, is_active=True).first()
+        cart = active_cart.get_active_cart(request)
         if cart:
             cart_item = CartItem.objects.filter(cart=cart, product=product).first()
             if cart_item:
+                try:
+                    reservations.reserve(reservations.holder_for(request, cart), product.id, quantity)
+                except reservations.InsufficientStock:
+                    messages.error(request, "Not enough stock available.")
+                    return redirect('cart_detail')
+                delta = quantity - cart_item.quantity
                 cart_item.quantity = quantity
                 cart_item.save()
+                summary.apply_delta(cart.id, delta, product.price * delta)
     else:
-        cart_items = request.session.get('cart_items', {})
-        if str(product_id) in cart_items:
-            cart_items[str(product_id)]['quantity'] = quantity
-            request.session['cart_items'] = cart_items
+        session_cart = SessionCart(request.session)
+        if product_id in session_cart:
+            try:
+                reservations.reserve(reservations.holder_for(request), product.id, quantity)
+            except reservations.InsufficientStock:
+                messages.error(request, "Not enough stock available.")
+                return redirect('cart_detail')
+            session_cart.set(product_id, quantity)
 
     messages.success(request, "Cart updated.")
     return redirect('cart_detail')
@@ -183,17 +209,15 @@ def apply_discount(request):
     """
     View to apply a discount code during checkout.
     """
-    code = request.POST.get('code')
-    try:
-        discount = DiscountCode.objects.get(code=code)
-        if discount.is_valid():
-            request.session['discount'] = str(discount.discount_percent)
-            request.session['discount_code'] = discount.code
-            messages.success(request, "Discount code applied.")
-        else:
-            messages.error(request, "Discount code is invalid or expired.")
-    except DiscountCode.DoesNotExist:
+    discount = discounts.lookup(request.POST.get('code'))
+    if discount is None:
         messages.error(request, "Invalid discount code.")
+    elif discount.is_valid():
+        request.session['discount'] = str(discount.discount_percent)
+        request.session['discount_code'] = discount.code
+        messages.success(request, "Discount code applied.")
+    else:
+        messages.error(request, "Discount code is invalid or expired.")
     return redirect('cart_detail')
 
 @login_required
@@ -203,9 +227,8 @@ def create_cart(request):
     """
     if request.method == 'POST':
         name = request.POST.get('name', 'New Cart')
-        # Deactivate all other carts
-        Cart.objects.filter(user=request.user).update(is_active=False)
-        cart = Cart.objects.create(user=request.user, name=name, is_active=True)
+        cart = Cart.objects.create(user=request.user, name=name, is_active=False)
+        active_cart.switch_cart(request, cart)
         messages.success(request, f"Cart '{name}' created and set as active.")
         return redirect('cart_detail')
     return render(request, 'cart/create_cart.html')
@@ -215,73 +238,34 @@ def select_cart(request, cart_id):
     """
     View to allow users to select an existing cart as active.
     """
-    # Deactivate all other carts
-    Cart.objects.filter(user=request.user).update(is_active=False)
     cart = get_object_or_404(Cart, id=cart_id, user=request.user)
-    cart.is_active = True
-    cart.save()
+    active_cart.switch_cart(request, cart)
     messages.success(request, f"Cart '{cart.name}' is now active.")
     return redirect('cart_detail')
 
+@require_POST
 @login_required
 def checkout(request):
-    cart = Cart.objects.filter(user=request.user, is_active=True).first()
+    """
+    View to turn the active cart into an order.
+    """
+    cart = active_cart.get_active_cart(request)
     if not cart:
         messages.error(request, "No active cart to checkout.")
         return redirect('cart_detail')
 
-    cart_items = CartItem.objects.filter(cart=cart)
-    if not cart_items.exists():
-        messages.error(request, "Your cart is empty.")
+    try:
+        place_order(request.user, cart, discount_code=request.session.get('discount_code'))
+    except DiscountUnavailableError as exc:
+        request.session.pop('discount', None)
+        request.session.pop('discount_code', None)
+        messages.error(request, str(exc))
+        return redirect('cart_detail')
+    except CheckoutError as exc:
+        messages.error(request, str(exc))
         return redirect('cart_detail')
 
-    # Calculate totals
-    total_price = Decimal('0.00')
-    for item in cart_items:
-        total_price += item.product.price * item.quantity
-
-    discount_percent = Decimal(request.session.get('discount', '0'))
-    discount_amount = total_price * (discount_percent / Decimal('100'))
-    price_after_discount = total_price - discount_amount
-
-    tax_amount = price_after_discount * TAX_RATE
-
-    if price_after_discount >= FREE_SHIPPING_THRESHOLD:
-        shipping_cost = Decimal('0.00')
-    else:
-        shipping_cost = FLAT_SHIPPING_RATE
-
-    final_total = price_after_discount + tax_amount + shipping_cost
-
-    # Create Order
-    order = Order.objects.create(
-        user=request.user,
-        total_amount=total_price,
-        discount_code=DiscountCode.objects.filter(code=request.session.get('discount_code')).first(),
-        tax_amount=tax_amount,
-        shipping_cost=shipping_cost,
-        final_total=final_total
-    )
-    if order.discount_code:
-        order.discount_code.times_used += 1
-        order.discount_code.save()
-
-    # Create OrderItems and deduct stock
-    for item in cart_items:
-        OrderItem.objects.create(
-            order=order,
-            product=item.product,
-            quantity=item.quantity,
-            price_at_purchase=item.product.price
-        )
-        # Deduct stock
-        item.product.stock -= item.quantity
-        item.product.save()
-
-    # Clear cart
-    cart_items.delete()
-    cart.is_active = False
-    cart.save()
+    active_cart.forget_cart(request)
     request.session.pop('discount', None)
     request.session.pop('discount_code', None)
 
@@ -294,39 +278,186 @@ def clear_cart(request):
     View to clear all items from the cart.
     """
     if request.user.is_authenticated:
-        cart = Cart.objects.filter(user=request.user, is_active=True).first()
+        cart = active_cart.get_active_cart(request)
         if cart:
             # Delete all items in the active cart
             CartItem.objects.filter(cart=cart).delete()
+            summary.reset(cart.id)
+            reservations.release(reservations.holder_for(request, cart))
             messages.success(request, "Your cart has been cleared.")
         else:
             messages.error(request, "No active cart found to clear.")
     else:
         # Clear session-based cart for guest users
-        request.session['cart_items'] = {}
+        SessionCart(request.session).clear()
+        reservations.release(reservations.holder_for(request))
         messages.success(request, "Your cart has been cleared.")
     return redirect('cart_detail')
 
+@read_only
+@condition(etag_func=conditional.product_list_etag)
 def product_list(request):
     """
-    View to display a list of all products.
+    View to display the product catalog one keyset page at a time.
+    Pass ``?format=json`` or ``?stream=1`` to stream the whole catalog instead.
     """
+    cursor = request.GET.get('after') or None
     products = Product.objects.all()
-    return render(request, 'cart/product_list.html', {'products': products})
-
+    try:
+        if request.GET.get('format') == 'json':
+            rows = keyset_queryset(products, PRODUCT_ORDERING, cursor)
+            return stream_json(
+                rows.values('id', 'name', 'price', 'stock').iterator(chunk_size=STREAM_CHUNK_SIZE),
+                lambda row: row,
+            )
+        if request.GET.get('stream'):
+            rows = keyset_queryset(products, PRODUCT_ORDERING, cursor)
+            return stream_template(
+                request, 'cart/product_list.html', {},
+                rows.iterator(chunk_size=STREAM_CHUNK_SIZE), 'cart/includes/product_rows.html', 'products',
+            )
+        if cursor:
+            # Canonicalize before the cursor becomes part of a cache key
+            cursor = encode_cursor(decode_cursor(cursor, Product, PRODUCT_ORDERING))
+        page_size = page_size_from(request)
+        products_html, next_cursor = catalog.get_or_build(
+            catalog.product_list_key(cursor, page_size),
+            lambda: _render_product_page(cursor, page_size),
+        )
+    except InvalidCursor:
+        return HttpResponseBadRequest("Invalid cursor.")
+    return render(request, 'cart/product_list.html', {
+        'products_html': mark_safe(products_html),
+        'next_cursor': next_cursor,
+    })
+
+def _render_product_page(cursor, page_size):
+    page = keyset_page(Product.objects.all(), PRODUCT_ORDERING, cursor, page_size)
+    html = render_to_string('cart/includes/product_rows.html', {'products': page.items})
+    return html, page.next_cursor
+
+@read_only
+@condition(etag_func=conditional.product_detail_etag)
 def product_detail(request, product_id):
     """
     View to display the details of a single product.
     """
-    product = get_object_or_404(Product, id=product_id)
+    product = catalog.get_or_build(
+        catalog.product_key(product_id),
+        lambda: get_object_or_404(Product, id=product_id),
+    )
     return render(request, 'cart/product_detail.html', {'product': product})
 
+def product_search(request):
+    """
+    View to search the catalog by product name, best matches first.
+    """
+    query = request.GET.get('q', '').strip()
+    products = search.search_products(query) if query else []
+    return render(request, 'cart/product_search.html', {'query': query, 'products': products})
+
+def product_autocomplete(request):
+    """
+    View returning name suggestions for a partially typed search query.
+    """
+    suggestions = search.autocomplete(request.GET.get('q', ''))
+    return JsonResponse({'results': suggestions})
+
+@read_only
 @login_required
 def order_history(request):
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')
-    return render(request, 'cart/order_history.html', {'orders': orders})
+    """
+    View to list the user's orders, newest first, one keyset page at a time.
+    Pass ``?format=json`` or ``?stream=1`` to stream the full history instead.
+    """
+    cursor = request.GET.get('after') or None
+    orders = Order.objects.filter(user=request.user)
+    try:
+        if request.GET.get('format') == 'json':
+            rows = keyset_queryset(orders, ORDER_ORDERING, cursor)
+            return stream_json(
+                rows.values(*ORDER_JSON_FIELDS).iterator(chunk_size=STREAM_CHUNK_SIZE),
+                lambda row: row,
+            )
+        if request.GET.get('stream'):
+            rows = keyset_queryset(orders, ORDER_ORDERING, cursor)
+            return stream_template(
+                request, 'cart/order_history.html', {},
+                rows.iterator(chunk_size=STREAM_CHUNK_SIZE), 'cart/includes/order_rows.html', 'orders',
+            )
+        page = keyset_page(orders, ORDER_ORDERING, cursor, page_size_from(request))
+    except InvalidCursor:
+        return HttpResponseBadRequest("Invalid cursor.")
+    return render(request, 'cart/order_history.html', {
+        'orders': page.items,
+        'next_cursor': page.next_cursor,
+    })
 
 @login_required
+@condition(etag_func=conditional.order_etag, last_modified_func=conditional.order_last_modified)
 def order_detail(request, order_id):
-    order = get_object_or_404(Order, id=order_id, user=request.user)
-    return render(request, 'cart/order_detail.html', {'order': order})
\ No newline at end of file
+    orders = Order.objects.select_related('discount_code').prefetch_related(
+        Prefetch('items', queryset=OrderItem.objects.select_related('product').order_by('id'))
+    )
+    order = get_object_or_404(orders, id=order_id, user=request.user)
+    return render(request, 'cart/order_detail.html', {'order': order})
+
+@staff_member_required
+def sales_report(request):
+    """
+    View for staff to see sales over the last ``?days=`` days (30 by
+    default), read from the rollup tables only.
+    """
+    try:
+        days = min(max(int(request.GET.get('days', REPORT_DAYS)), 1), MAX_REPORT_DAYS)
+    except ValueError:
+        days = REPORT_DAYS
+    start = timezone.localdate() - timedelta(days=days - 1)
+    daily = list(DailySales.objects.filter(date__gte=start).order_by('-date'))
+    top_products = (
+        ProductDailySales.objects.filter(date__gte=start)
+        .values('product_id', 'product__name')
+        .annotate(units=Sum('units'), revenue=Sum('revenue'))
+        .order_by('-revenue')[:10]
+    )
+    discount_usage = (
+        DiscountDailyUsage.objects.filter(date__gte=start)
+        .values('discount_code__code')
+        .annotate(uses=Sum('uses'), discount_total=Sum('discount_total'))
+        .order_by('-uses')
+    )
+    return render(request, 'cart/sales_report.html', {
+        'days': days,
+        'daily': daily,
+        'totals': {
+            'orders': sum(day.orders for day in daily),
+            'units': sum(day.units for day in daily),
+            'revenue': sum((day.revenue for day in daily), Decimal('0.00')),
+            'discount_total': sum((day.discount_total for day in daily), Decimal('0.00')),
+        },
+        'top_products': top_products,
+        'discount_usage': discount_usage,
+    })
+
+@staff_member_required
+def order_export(request):
+    """
+    View for staff to download orders with their lines as a streamed CSV
+    (``?format=csv``, the default) or JSONL (``?format=jsonl``) file.
+    Filter with ``?start=`` and ``?end=`` (YYYY-MM-DD, inclusive) and
+    ``?after_id=`` to fetch only orders newer than a previous export.
+    """
+    file_format = request.GET.get('format', 'csv')
+    if file_format not in exports.FORMATS:
+        return HttpResponseBadRequest("Unknown export format.")
+    try:
+        start = date.fromisoformat(request.GET['start']) if request.GET.get('start') else None
+        end = date.fromisoformat(request.GET['end']) if request.GET.get('end') else None
+        after_id = int(request.GET.get('after_id') or 0)
+    except ValueError:
+        return HttpResponseBadRequest("Invalid export filter.")
+    lines = exports.render_lines(file_format, exports.export_orders(start, end, after_id))
+    content_type = 'text/csv' if file_format == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(lines, content_type=f'{content_type}; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="orders.{file_format}"'
+    return response
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecommerce_site.settings')
+# Route the read-heavy views to their native async versions
+os.environ.setdefault('ROOT_URLCONF', 'ecommerce_site.asgi_urls')
 
 application = get_asgi_application()
@@ -0,0 +1,13 @@
+from django.contrib import admin
+from django.urls import path, include
+from cart import async_views as cart_async_views
+from cart.metrics import metrics_view
+
+# URL configuration used when serving through ASGI (see asgi.py)
+urlpatterns = [
+    path('admin/', admin.site.urls),
+    path('cart/', include('cart.async_urls')),
+    path('accounts/', include('django.contrib.auth.urls')),
+    path('metrics/', metrics_view, name='metrics'),
+    path('', cart_async_views.product_list, name='home'),
+]
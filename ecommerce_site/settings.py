@@ -34,6 +34,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so the request metrics cover the whole middleware stack
+    'cart.metrics.metrics_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -43,11 +45,13 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'ecommerce_site.urls'
+# asgi.py switches this to ecommerce_site.asgi_urls for the async views
+ROOT_URLCONF = env('ROOT_URLCONF', default='ecommerce_site.urls')
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates with render timing for the request metrics
+        'BACKEND': 'cart.metrics.InstrumentedDjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')]
         ,
         'APP_DIRS': True,
@@ -57,6 +61,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'cart.context_processors.cart_summary',
             ],
         },
     },
@@ -75,6 +80,60 @@ DATABASES = {
     }
 }
 
+# DB_PROFILE=production switches to WAL journaling, persistent connections
+# and a read-only alias for the views decorated with cart.routing.read_only
+DB_PROFILE = env('DB_PROFILE', default='development')
+
+if DB_PROFILE == 'production':
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': env.int('SQLITE_BUSY_TIMEOUT_MS', default=5000),
+        'cache_size': -env.int('SQLITE_CACHE_KB', default=64000),
+        'temp_store': 'MEMORY',
+    }
+    _production_db = {
+        'ENGINE': 'ecommerce_site.sqlite_backend',
+        'NAME': env('DATABASE_PATH', default=str(BASE_DIR / 'db.sqlite3')),
+        'CONN_MAX_AGE': env.int('CONN_MAX_AGE', default=600),
+        'CONN_HEALTH_CHECKS': True,
+    }
+    DATABASES = {
+        'default': {
+            **_production_db,
+            'OPTIONS': {'pragmas': SQLITE_PRAGMAS, 'transaction_mode': 'IMMEDIATE'},
+        },
+        # A second connection to the same file; WAL lets it read while
+        # 'default' writes
+        'replica': {
+            **_production_db,
+            'OPTIONS': {'pragmas': {**SQLITE_PRAGMAS, 'query_only': 1}},
+            'TEST': {'MIRROR': 'default'},
+        },
+    }
+
+DATABASE_ROUTERS = ['cart.routing.ReadReplicaRouter']
+
+# The catalog, discount and active cart version keys must be seen by every
+# worker process, so set CACHE_URL to a shared cache (Redis or Memcached)
+# whenever more than one runs. The per-process default suits the dev server,
+# the tests and the benchmarks.
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
+# Log requests slower than this many milliseconds with the SQL they ran
+METRICS_SLOW_REQUEST_MS = env.int('METRICS_SLOW_REQUEST_MS', default=None)
+
+# Bearer token Prometheus sends to scrape /metrics/; unset disables it
+METRICS_TOKEN = env('METRICS_TOKEN', default=None)
+
+# Tasks of each queue that may run at once across all run_tasks workers
+TASK_QUEUE_CONCURRENCY = {
+    'default': env.int('TASK_CONCURRENCY', default=4),
+    'rollups': 1,
+}
+
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
@@ -0,0 +1,40 @@
+"""
+SQLite backend for the production database profile.
+
+On top of Django's SQLite backend it understands two extra ``OPTIONS``:
+
+``pragmas``
+    ``{name: value}`` applied to every new connection, e.g. WAL journaling
+    and ``busy_timeout``.
+``transaction_mode``
+    How ``atomic()`` starts its transaction. ``IMMEDIATE`` takes the write
+    lock up front, so a transaction that reads before it writes waits for
+    ``busy_timeout`` instead of failing with "database is locked" when
+    another writer got in first.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        self.pragmas = kwargs.pop('pragmas', {})
+        self.transaction_mode = kwargs.pop('transaction_mode', 'DEFERRED').upper()
+        if self.transaction_mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f"transaction_mode must be one of {', '.join(TRANSACTION_MODES)}."
+            )
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f'BEGIN {self.transaction_mode}')
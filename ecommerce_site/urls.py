@@ -1,10 +1,12 @@
 from django.contrib import admin
 from django.urls import path, include
 from cart import views as cart_views
+from cart.metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('cart/', include('cart.urls')),
     path('accounts/', include('django.contrib.auth.urls')),
+    path('metrics/', metrics_view, name='metrics'),
     path('', cart_views.product_list, name='home'),
 ]